@@ -1,13 +1,20 @@
 import chromadb
+import os
+import sys
 
 from sentence_transformers import SentenceTransformer
 
+# Repo root on the path for agent_tools (index profiles)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_tools.index_profiles import open_collection
+
 # Initialize sentence transformer model for embeddings (used explicitly)
 model = SentenceTransformer('all-MiniLM-L6-v2')
 
 # Connect explicitly to local ChromaDB instance (change settings for cloud later easily)
-client = chromadb.PersistentClient(persist_directory="../data/vector_store"))
-collection = client.get_or_create_collection(name="chattr_vectors")
+client = chromadb.PersistentClient(path="../data/vector_store")
+# HNSW settings from the "chattr_vectors" index profile (OMNI_INDEX_PROFILES)
+collection = open_collection(client, "chattr_vectors")
 
 # Explicitly defined function clearly for adding documents to vector store:
 def add_document(text, metadata=None):
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from chroma_db import add_document, query_documents
@@ -6,12 +7,38 @@ from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 from passlib.hash import bcrypt
 import os
+import sys
+import time
+
+# Shared event log with the agent (repo root on the path for agent_tools)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from agent_tools.ragis_logger import RagisLogger
+from agent_tools import metrics
 
 load_dotenv()
 
+# Multiprocess sink: uvicorn workers and the agent append to one ragis_events.log
+logger = RagisLogger(
+    log_path=os.getenv("RAGIS_LOG_PATH", os.path.join(REPO_ROOT, "ragis_events.log")),
+    pii_mask_fields=['text', 'query_text'],
+    multiprocess=True,
+)
+
 # Initialize explicitly the FastAPI app
 app = FastAPI()
 
+# Per-process metrics (with several uvicorn workers, each scrape sees one worker)
+REQUEST_SECONDS = metrics.histogram("backend_request_duration_seconds", "Backend request latency.", ["route", "method", "status"])
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method, status=response.status_code)
+    return response
+
 # Allow clearly CORS from frontend localhost explicitly:
 app.add_middleware(
     CORSMiddleware,
@@ -39,13 +66,22 @@ async def read_root():
 # Endpoint explicitly defined for adding new embeddings clearly:
 @app.post("/embed")
 async def embed_document(req: EmbedRequest):
-    doc_id = add_document(req.text, req.metadata)
+    with metrics.EMBEDDING_SECONDS.time(source="backend"):
+        doc_id = add_document(req.text, req.metadata)
+    logger.log("backend_embed", {"doc_id": doc_id, "text": req.text})
     return {"status": "success", "doc_id": doc_id}
 
 # Endpoint explicitly defined for querying vectors clearly:
 @app.post("/query")
 async def query_embeddings(query: ChatQuery):
-    results = query_documents(query.query_text, query.n_results)
+    with metrics.RETRIEVAL_SECONDS.time(source="backend"):
+        results = query_documents(query.query_text, query.n_results)
+    logger.log("backend_query", {"query_text": query.query_text, "n_results": query.n_results})
     return {"status": "success", "results": results}
 
+# Prometheus scrape endpoint:
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # Additional endpoints explicitly for authentication will be added explicitly in next stage (auth.py)
\ No newline at end of file
@@ -4,9 +4,27 @@ import requests
 import datetime
 from typing import Any, Dict, Optional
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.retry import RetryPolicy, status_in
+from agent_tools.pending import register_pending, set_pending, peek_pending, pop_pending
 
 MAX_API_RESPONSE = 2500
 
+# Connection errors, timeouts, 429 and 5xx are retried; POST only when the
+# server signals it did not process the request (429/503).
+API_RETRY = RetryPolicy(
+    name="api", max_attempts=3, base_delay=1.0, max_delay=20.0,
+    retry_on=(requests.ConnectionError, requests.Timeout),
+    retry_if_result=status_in(), breaker=True,
+)
+API_POST_RETRY = RetryPolicy(
+    name="api_post", max_attempts=3, base_delay=1.0, max_delay=20.0,
+    retry_on=(requests.ConnectionError,),
+    retry_if_result=status_in((429, 503)), breaker=True,
+)
+
+def _host(url: str) -> str:
+    return url.split("/")[2] if "://" in url else url
+
 # Instantiate a central logger for this module (adjust path/PII as needed)
 logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['payload', 'url'])
 
@@ -22,7 +40,7 @@ def api_get(args: Dict[str, Any], session_state: dict) -> str:
     url = args.get("url", "")
     if not url:
         return "No URL provided."
-    session_state['pending_api_call'] = ("GET", url)
+    set_pending(session_state, "api_call", ("GET", url))
     return f"Agent wants to call GET {url} — ok to run? (yes/ok/approve)"
 
 def api_post(args: Dict[str, Any], session_state: dict) -> str:
@@ -33,22 +51,23 @@ def api_post(args: Dict[str, Any], session_state: dict) -> str:
     payload = args.get("payload", {})
     if not url:
         return "No URL provided."
-    session_state['pending_api_call'] = ("POST", url, payload)
+    set_pending(session_state, "api_call", ("POST", url, payload))
     return f"Agent wants to call POST {url} with payload {payload} — ok to run? (yes/ok/approve)"
 
+@register_pending("api_call")
 def handle_pending_api_call(user_message: str, session_state: dict) -> Optional[str]:
     """
     Handle approval and execution of a pending API call (GET or POST).
     """
-    if session_state.get('pending_api_call'):
+    if peek_pending(session_state, "api_call"):
         auto_approve = session_state.get("global_approval", False)
-        call_info = session_state.pop('pending_api_call')
+        call_info = pop_pending(session_state, "api_call")
 
         if auto_approve or is_affirmative(user_message):
             try:
                 if call_info[0] == "GET":
                     method, url = call_info
-                    result = requests.get(url, timeout=20)
+                    result = API_RETRY.call(lambda: requests.get(url, timeout=20), target=_host(url))
                     logger.log("api_get", {
                         "url": url,
                         "status_code": result.status_code,
@@ -57,7 +76,7 @@ def handle_pending_api_call(user_message: str, session_state: dict) -> Optional[
                     return f"GET {url} response:\n{result.text[:MAX_API_RESPONSE]}"
                 elif call_info[0] == "POST":
                     method, url, payload = call_info
-                    result = requests.post(url, json=payload, timeout=20)
+                    result = API_POST_RETRY.call(lambda: requests.post(url, json=payload, timeout=20), target=_host(url))
                     logger.log("api_post", {
                         "url": url,
                         "status_code": result.status_code,
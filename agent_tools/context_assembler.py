@@ -0,0 +1,199 @@
+import threading
+from collections import OrderedDict
+from agent_tools.ragis_logger import RagisLogger
+
+try:
+    import tiktoken  # installed with langchain-openai
+except ImportError:  # pragma: no cover - fall back to a character estimate
+    tiktoken = None
+
+# Central logger for prompt/context assembly
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=[])
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken when available, else estimate (~4 chars/token).
+    """
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def _content(msg) -> str:
+    if isinstance(msg, dict):
+        content = msg.get("content", "")
+    else:
+        content = getattr(msg, "content", msg)
+    return content if isinstance(content, str) else str(content)
+
+def _role(msg) -> str:
+    if isinstance(msg, dict):
+        return msg.get("role", "user")
+    return getattr(msg, "role", "user")
+
+def message_tokens(msg) -> int:
+    """Tokens for one chat message, including a small per-message overhead."""
+    return count_tokens(_content(msg)) + 4
+
+def extractive_summary(previous: str, turns: list, max_tokens: int = 400) -> str:
+    """
+    Cheap, deterministic summary: one clipped line per turn appended to the
+    previous summary, keeping the most recent lines within max_tokens.
+    """
+    lines = previous.splitlines() if previous else []
+    for msg in turns:
+        text = " ".join(_content(msg).split())
+        if text:
+            lines.append(f"{_role(msg)}: {text[:160]}")
+    while lines and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+class PreparedContext:
+    """Output of ContextAssembler.prepare(); completed by finalize()."""
+    def __init__(self, session_id, system_prompt, message, summary, recent, memory_budget, baseline_tokens, summarized_turns):
+        self.session_id = session_id
+        self.system_prompt = system_prompt
+        self.message = message
+        self.summary = summary
+        self.recent = recent
+        self.memory_budget = memory_budget
+        self.baseline_tokens = baseline_tokens
+        self.summarized_turns = summarized_turns
+
+class ContextAssembler:
+    """
+    Fit system prompt, recalled memories and chat history into a token budget.
+
+    Recent turns are sent verbatim; older turns are folded into a rolling summary
+    cached per session. The summary is extended incrementally, in blocks of
+    `summary_block` turns, so the summarizer runs only every few turns. At
+    most `max_sessions` summaries are cached (least recently used dropped;
+    a dropped session's summary is rebuilt from its history on next use).
+    """
+    def __init__(self, token_budget=6000, memory_budget=1200, recent_turns=12,
+                 summary_block=6, summary_max_tokens=400, summarize_fn=None, max_sessions=1024):
+        self.token_budget = token_budget
+        self.memory_budget = memory_budget
+        self.recent_turns = recent_turns
+        self.summary_block = summary_block
+        self.summary_max_tokens = summary_max_tokens
+        self.summarize_fn = summarize_fn
+        self.max_sessions = max_sessions
+        # session_id -> {"upto": number of history messages folded, "summary": text}, LRU order
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reset(self, session_id):
+        """Drop the cached summary for a session."""
+        with self._lock:
+            self._summaries.pop(session_id, None)
+
+    def prepare(self, session_id, system_prompt, message, history) -> PreparedContext:
+        """
+        Update the session summary and pick the verbatim history tail.
+        Budget for memories is reserved; they are added in finalize().
+        """
+        history = list(history or [])
+        with self._lock:
+            cached = dict(self._summaries.get(session_id) or {"upto": 0, "summary": ""})
+        if cached["upto"] > len(history):
+            # History was cleared or replaced: start over.
+            cached = {"upto": 0, "summary": ""}
+
+        unsummarized = history[cached["upto"]:]
+        if len(unsummarized) >= self.recent_turns + self.summary_block:
+            fold = len(unsummarized) - self.recent_turns
+            cached = self._fold(cached, unsummarized[:fold])
+            unsummarized = unsummarized[fold:]
+
+        fixed = count_tokens(system_prompt) + count_tokens(message) + 8
+        summary_reserve = count_tokens(cached["summary"])
+        recent = list(unsummarized)
+        dropped = []
+        while True:
+            available = self.token_budget - fixed - self.memory_budget - summary_reserve
+            while recent and sum(message_tokens(m) for m in recent) > available:
+                dropped.append(recent.pop(0))
+            # Dropped turns grow the summary; leave room for it at full size.
+            if not dropped or summary_reserve >= self.summary_max_tokens:
+                break
+            summary_reserve = self.summary_max_tokens
+        if dropped:
+            cached = self._fold(cached, dropped)
+
+        with self._lock:
+            self._summaries[session_id] = cached
+            self._summaries.move_to_end(session_id)
+            while len(self._summaries) > self.max_sessions:
+                self._summaries.popitem(last=False)
+
+        baseline = fixed + sum(message_tokens(m) for m in history[-20:])
+        return PreparedContext(
+            session_id, system_prompt, message, cached["summary"], recent,
+            self.memory_budget, baseline, cached["upto"],
+        )
+
+    def finalize(self, prepared: PreparedContext, recalled_docs=()) -> list:
+        """
+        Add recalled memories into the reserved budget and return the message list.
+        Logs tokens sent vs. the previous verbatim-history prompt.
+        """
+        memories, used = [], 0
+        seen = {prepared.message.strip()}
+        for doc in recalled_docs or []:
+            doc = (doc or "").strip()
+            if not doc or doc in seen:
+                continue
+            cost = count_tokens(doc) + 2
+            if used + cost > prepared.memory_budget:
+                break
+            seen.add(doc)
+            memories.append(doc)
+            used += cost
+
+        messages = [{"role": "system", "content": prepared.system_prompt}]
+        if memories:
+            messages.append({
+                "role": "system",
+                "content": "Relevant memories:\n" + "\n".join(f"- {m}" for m in memories),
+            })
+        if prepared.summary:
+            messages.append({
+                "role": "system",
+                "content": "Summary of earlier conversation:\n" + prepared.summary,
+            })
+        messages.extend({"role": _role(m), "content": _content(m)} for m in prepared.recent)
+        messages.append({"role": "user", "content": prepared.message})
+
+        prompt_tokens = sum(message_tokens(m) for m in messages)
+        logger.log("context_assembly", {
+            "session_id": prepared.session_id,
+            "prompt_tokens": prompt_tokens,
+            "baseline_tokens": prepared.baseline_tokens,
+            "saved_tokens": prepared.baseline_tokens - prompt_tokens,
+            "token_budget": self.token_budget,
+            "recent_turns": len(prepared.recent),
+            "summarized_turns": prepared.summarized_turns,
+            "memories_used": len(memories),
+        })
+        return messages
+
+    def _fold(self, cached, turns):
+        """Extend the cached summary with `turns` (which directly follow it)."""
+        summary = cached["summary"]
+        if self.summarize_fn is not None:
+            try:
+                summary = self.summarize_fn(summary, turns)
+            except Exception as e:
+                logger.log("context_summary_error", {"error": str(e), "turns": len(turns)})
+                summary = extractive_summary(summary, turns, self.summary_max_tokens)
+        else:
+            summary = extractive_summary(summary, turns, self.summary_max_tokens)
+        return {"upto": cached["upto"] + len(turns), "summary": summary}
@@ -5,6 +5,7 @@ import subprocess
 import datetime
 from typing import Any, Dict, Optional
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.pending import register_pending, set_pending, peek_pending, pop_pending
 
 MAX_DOC_STDOUT = 2000
 MAX_DOC_STDERR = 800
@@ -29,15 +30,16 @@ def generate_docstrings(args: Dict[str, Any], session_state: dict) -> str:
     if not os.path.exists(abs_target):
         return f"Target file does not exist: {abs_target}"
 
-    session_state['pending_doc_gen'] = abs_target
+    set_pending(session_state, "doc_gen", abs_target)
     return f"Agent wants to auto-generate/fix docstrings for {abs_target}. Proceed? (yes/ok/approve)"
 
+@register_pending("doc_gen")
 def handle_pending_doc_gen(user_message: str, session_state: dict) -> Optional[str]:
     """
     Actually run the docstring generation/fix if approved.
     """
-    if session_state.get('pending_doc_gen'):
-        abs_target = session_state.pop('pending_doc_gen')
+    if peek_pending(session_state, "doc_gen"):
+        abs_target = pop_pending(session_state, "doc_gen")
         auto_approve = session_state.get("global_approval", False)
 
         if auto_approve or is_affirmative(user_message):
@@ -0,0 +1,273 @@
+import argparse
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+from agent_tools.ragis_logger import AsyncLogWriter, MASKED
+from agent_tools.metrics import QUEUE_DEPTH
+
+# RagisLogger backend selection:
+#   RAGIS_LOG_BACKEND=file|sqlite|both   JSONL file (default), event store, or both
+#   RAGIS_EVENT_DB=ragis_events.db        event store path
+DEFAULT_DB_PATH = "ragis_events.db"
+
+# Batches hitting "database is locked" (another process holds the write lock
+# past the busy timeout) are retried this many times before being skipped
+LOCKED_RETRIES = 3
+
+# Data keys naming what an event acted on (same order as the Action Timeline);
+# PII-masked values are skipped, so the column never holds "[MASKED]"
+_TARGET_KEYS = ("abs_path", "file", "target", "script_path", "project_path", "backup_path")
+
+def _epoch(value) -> Optional[float]:
+    """ISO string / datetime / epoch seconds -> epoch seconds (naive times are UTC)."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class SQLiteEventStore:
+    """
+    Indexed event store (SQLite, WAL) behind RagisLogger.
+
+    Each event is one row: indexed ts (epoch seconds), event_type, action,
+    session_id, doc_id and target columns, plus the full record as JSON.
+    Writes go through an AsyncLogWriter, so a batch of events is one
+    transaction; a batch that cannot be committed is skipped and counted
+    (see stats()). Several processes may share a database file.
+    """
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_queue=10000, backpressure="block", batch_size=512):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, event_type TEXT NOT NULL,"
+            " action TEXT, session_id TEXT, doc_id TEXT, target TEXT, record TEXT NOT NULL)"
+        )
+        for name, cols in (("ts", "ts"), ("type_ts", "event_type, ts"), ("action", "action, ts"),
+                           ("session", "session_id, ts"), ("doc", "doc_id"), ("target", "target, ts")):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS events_{name} ON events ({cols})")
+        self._writer = AsyncLogWriter(self, max_queue=max_queue, batch_size=batch_size, backpressure=backpressure)
+
+    @staticmethod
+    def _row(record: dict, line: Optional[str] = None) -> tuple:
+        data = record.get("data")
+        data = data if isinstance(data, dict) else {}
+        target = next((data[k] for k in _TARGET_KEYS if data.get(k) and data[k] != MASKED), None)
+        session_id = data.get("session_id")
+        return (
+            _epoch(record.get("ts")) or 0.0,
+            record.get("event_type", ""),
+            str(data["action"]) if data.get("action") is not None else None,
+            str(session_id) if session_id is not None else None,
+            str(data["doc_id"]) if data.get("doc_id") is not None else None,
+            str(target) if target is not None else None,
+            line.rstrip("\n") if line is not None else json.dumps(record),
+        )
+
+    def write(self, record: dict, line: Optional[str] = None):
+        """Queue one event (`line` is its already-serialized JSON, if any)."""
+        self._writer.put((record, line))
+
+    def write_lines(self, items):
+        """
+        Insert a batch in one transaction (called by the writer thread).
+        A locked database is retried with backoff; other errors (disk full,
+        ...) propagate, and the writer counts the batch as lost and goes on.
+        """
+        rows = [self._row(*item) if isinstance(item, tuple) else self._row(json.loads(item), item) for item in items]
+        for attempt in range(LOCKED_RETRIES + 1):
+            try:
+                return self._insert(rows)
+            except sqlite3.OperationalError as e:
+                if attempt == LOCKED_RETRIES or "locked" not in str(e).lower():
+                    raise
+                time.sleep(0.2 * 2 ** attempt)
+
+    def _insert(self, rows):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO events (ts, event_type, action, session_id, doc_id, target, record)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> dict:
+        """Writer counters: queued, written, dropped, write_errors, lost, last_error."""
+        return self._writer.stats()
+
+    def flush(self):
+        """Wait until queued events are committed."""
+        self._writer.flush()
+
+    def close(self):
+        self._writer.close()
+        with self._lock:
+            self._conn.close()
+
+    # --- queries ---
+
+    def _where(self, event_types=None, since=None, until=None, action=None, session_id=None,
+               doc_id=None, target=None):
+        clauses, args = [], []
+        if event_types:
+            event_types = [event_types] if isinstance(event_types, str) else list(event_types)
+            clauses.append(f"event_type IN ({','.join('?' * len(event_types))})")
+            args += event_types
+        if since is not None:
+            clauses.append("ts >= ?")
+            args.append(_epoch(since))
+        if until is not None:
+            clauses.append("ts <= ?")
+            args.append(_epoch(until))
+        for column, value in (("action", action), ("session_id", session_id), ("doc_id", doc_id), ("target", target)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(str(value))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def query(self, event_types: Optional[Iterable[str]] = None, since=None, until=None, action=None,
+              session_id=None, doc_id=None, target=None, limit: Optional[int] = 1000,
+              newest_first: bool = False) -> list:
+        """
+        Events matching every given filter, as logged (dicts with ts, event_type, data, ...).
+        `since` / `until` take datetimes, ISO strings or epoch seconds.
+        """
+        where, args = self._where(event_types, since, until, action, session_id, doc_id, target)
+        order = "DESC" if newest_first else "ASC"
+        sql = f"SELECT record FROM events{where} ORDER BY ts {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [json.loads(record) for (record,) in rows]
+
+    def count(self, **filters) -> int:
+        """Number of events matching the same filters as query()."""
+        where, args = self._where(**filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM events{where}", args).fetchone()[0]
+
+    def counts_by_type(self, since=None, until=None) -> dict:
+        """{event_type: count} over a time range."""
+        where, args = self._where(since=since, until=until)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT event_type, COUNT(*) FROM events{where} GROUP BY event_type"
+                                      " ORDER BY COUNT(*) DESC", args).fetchall()
+        return dict(rows)
+
+    def tail(self, n: int = 100) -> list:
+        """The last `n` events, oldest first."""
+        return self.query(limit=n, newest_first=True)[::-1]
+
+    def purge(self, before) -> int:
+        """Delete events older than `before`; returns the number removed."""
+        self.flush()
+        with self._lock:
+            return self._conn.execute("DELETE FROM events WHERE ts < ?", (_epoch(before),)).rowcount
+
+    def backfill(self, log_path="ragis_events.log") -> int:
+        """Import an existing JSONL log (and its rotated segments) into the store."""
+        from agent_tools.log_reader import iter_events
+        batch, total = [], 0
+        for ev in iter_events(log_path):
+            batch.append(self._row(ev))
+            if len(batch) >= 5000:
+                self._insert(batch)
+                total, batch = total + len(batch), []
+        if batch:
+            self._insert(batch)
+            total += len(batch)
+        return total
+
+_stores: dict = {}
+_stores_lock = threading.Lock()
+
+def get_event_store(db_path=None) -> SQLiteEventStore:
+    """Return the process-wide store for `db_path` (default RAGIS_EVENT_DB), creating it on first use."""
+    key = os.path.abspath(db_path or os.getenv("RAGIS_EVENT_DB", DEFAULT_DB_PATH))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SQLiteEventStore(
+                key,
+                max_queue=int(os.getenv("RAGIS_LOG_QUEUE_SIZE", "10000")),
+                backpressure=os.getenv("RAGIS_LOG_BACKPRESSURE", "block"),
+            )
+        return store
+
+def _store_queue_depths() -> dict:
+    with _stores_lock:
+        stores = list(_stores.values())
+    return {f"event_store:{os.path.basename(s.db_path)}": s._writer._queue.qsize() for s in stores}
+
+QUEUE_DEPTH.add_callback(_store_queue_depths)
+
+def configured_event_store() -> Optional[SQLiteEventStore]:
+    """The event store if RAGIS_LOG_BACKEND enables it, else None."""
+    if os.getenv("RAGIS_LOG_BACKEND", "file").lower() in ("sqlite", "both"):
+        return get_event_store()
+    return None
+
+@atexit.register
+def close_all_stores():
+    """Commit queued events and close every store (runs at interpreter exit)."""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.close()
+
+# --- CLI: python -m agent_tools.event_store ---
+
+def _since(value: str):
+    """'2d', '12h', '30m' or an ISO timestamp."""
+    units = {"d": "days", "h": "hours", "m": "minutes"}
+    if value and value[-1] in units and value[:-1].isdigit():
+        return datetime.now(timezone.utc) - timedelta(**{units[value[-1]]: int(value[:-1])})
+    return value
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the RagisLogger event store.")
+    parser.add_argument("--db", default=None, help="Event store path (default RAGIS_EVENT_DB or ragis_events.db)")
+    parser.add_argument("--type", action="append", dest="event_types", help="Event type (repeatable)")
+    parser.add_argument("--since", type=_since, help="e.g. 1d, 12h or an ISO timestamp")
+    parser.add_argument("--until", type=_since)
+    parser.add_argument("--action")
+    parser.add_argument("--session")
+    parser.add_argument("--doc")
+    parser.add_argument("--target", help="File/URL/path the event acted on")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--counts", action="store_true", help="Only print counts per event type")
+    parser.add_argument("--backfill", metavar="LOG", help="Import a JSONL log (with rotated segments) first")
+    args = parser.parse_args(argv)
+
+    store = get_event_store(args.db)
+    if args.backfill:
+        print(f"Imported {store.backfill(args.backfill)} events from {args.backfill}", file=sys.stderr)
+    if args.counts:
+        for event_type, n in store.counts_by_type(args.since, args.until).items():
+            print(f"{n:>9}  {event_type}")
+        return
+    for ev in store.query(args.event_types, args.since, args.until, args.action, args.session,
+                          args.doc, args.target, limit=args.limit, newest_first=True)[::-1]:
+        print(json.dumps(ev))
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ import difflib
 import glob
 from typing import Optional, Dict, Any
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.pending import register_pending, set_pending, peek_pending, pop_pending
 
 # Central logger for all file actions
 logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['content', 'abs_path', 'temp_path', 'backup_path'])
@@ -85,7 +86,7 @@ def edit_or_create_file(args: Dict[str, Any], session_state: dict) -> str:
     elif os.path.exists(abs_path):
         diff_text = show_diff(abs_path, temp_path)
     summary = f"Diff preview:\n{diff_text[:2000]}" if diff_text else "(No diff preview available.)"
-    session_state['pending_file_change'] = (abs_path, content, op_type, backup_path, temp_path)
+    set_pending(session_state, "file_change", (abs_path, content, op_type, backup_path, temp_path))
     snippet = content if len(content) < 80 else content[:77] + "..."
     logger.log("prepare_edit_or_create", {
         "action": op_type.upper(),
@@ -99,13 +100,14 @@ def edit_or_create_file(args: Dict[str, Any], session_state: dict) -> str:
         "Is that OK? (Reply yes/ok/approve or similar to allow, or no to cancel.)"
     )
 
+@register_pending("file_change")
 def handle_pending_file_change(user_message: str, session_state: dict) -> Optional[str]:
     """
     Handle approval or rejection of a pending file edit/create.
     Cleans up temp files and logs all actions.
     """
-    if session_state.get('pending_file_change'):
-        abs_path, content, op_type, backup_path, temp_path = session_state['pending_file_change']
+    if peek_pending(session_state, "file_change"):
+        abs_path, content, op_type, backup_path, temp_path = peek_pending(session_state, "file_change")
         auto_approve = session_state.get("global_approval", False)
 
         if auto_approve or is_affirmative(user_message):
@@ -116,14 +118,14 @@ def handle_pending_file_change(user_message: str, session_state: dict) -> Option
                     "action": "WRITE_FILE", "abs_path": abs_path,
                     "summary": f"User approved; {op_type} (backup in {backup_path if backup_path else 'N/A'})"
                 })
-                session_state.pop('pending_file_change')
+                pop_pending(session_state, "file_change")
                 try:
                     os.remove(temp_path)
                 except Exception as e:
                     logger.log("tempfile_remove_fail", {"file": temp_path, "error": str(e)})
                 return f"File '{abs_path}' {op_type}d successfully. (Backup: {backup_path})"
             except Exception as e:
-                session_state.pop('pending_file_change')
+                pop_pending(session_state, "file_change")
                 try:
                     os.remove(temp_path)
                 except Exception as e2:
@@ -133,7 +135,7 @@ def handle_pending_file_change(user_message: str, session_state: dict) -> Option
                 })
                 return f"Error editing/creating file: {e}"
         else:
-            session_state.pop('pending_file_change')
+            pop_pending(session_state, "file_change")
             try:
                 os.remove(temp_path)
             except Exception as e:
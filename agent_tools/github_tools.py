@@ -2,13 +2,29 @@ import os
 import subprocess
 from datetime import datetime
 from .utils import stream_progress_update  # if you want to show streaming later
-from .task_manager import with_retry
+from agent_tools.retry import RetryPolicy, exit_code_in
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.pending import register_pending, set_pending, peek_pending, pop_pending
 
 MAX_CLONE_STDOUT = 2000
 MAX_CLONE_STDERR = 800
 MAX_PUSH_LOG = 2500
 
+# git exits non-zero instead of raising, so transient failures are recognised
+# from stderr; auth errors, conflicts and "nothing to commit" are not retried
+# and leave the remote's breaker alone (neither a failure nor a success).
+GIT_TRANSIENT_ERRORS = (
+    "could not resolve host", "connection timed out", "connection reset", "operation timed out",
+    "early eof", "rpc failed", "remote end hung up", "the requested url returned error: 5",
+    "gnutls_handshake", "ssl_read",
+)
+GIT_RETRY = RetryPolicy(
+    name="git", max_attempts=3, base_delay=2.0, max_delay=30.0,
+    retry_on=(),  # a timed-out clone leaves a partial checkout; don't re-run it blindly
+    retry_if_result=exit_code_in(stderr_patterns=GIT_TRANSIENT_ERRORS),
+    breaker=True, breaker_ignore_if_result=lambda result: result.returncode != 0,
+)
+
 # Central logger for all git actions
 logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['repo_url', 'dest_dir', 'local_dir', 'commit_msg'])
 
@@ -26,26 +42,28 @@ def github_clone(args, session_state, get_secret):
     user_home = os.path.expanduser("~")
     if not dest_dir.startswith(user_home):
         return "Permission denied: Only clone under your user directory."
-    session_state['pending_github_clone'] = (repo_url, dest_dir)
+    set_pending(session_state, "github_clone", (repo_url, dest_dir))
     return f"Clone repo {repo_url} to {dest_dir}? (yes/ok/approve)"
 
+@register_pending("github_clone", needs_secret=True)
 def handle_pending_github_clone(user_message, session_state, get_secret):
     """
     Handle approval and execution of a pending GitHub clone.
     """
-    if session_state.get('pending_github_clone'):
-        repo_url, dest_dir = session_state.pop('pending_github_clone')
+    if peek_pending(session_state, "github_clone"):
+        repo_url, dest_dir = pop_pending(session_state, "github_clone")
         auto_approve = session_state.get("global_approval", False)
 
         if auto_approve or is_affirmative(user_message):
             try:
-                result = with_retry(lambda: subprocess.run(
+                result = GIT_RETRY.call(lambda: subprocess.run(
                     ["git", "clone", repo_url, dest_dir], capture_output=True, text=True, timeout=90
-                ))
+                ), target=f"git:{repo_url.split('/')[2] if '://' in repo_url else 'remote'}")
                 logger.log("github_clone", {
                     "action": "GITHUB_CLONE",
                     "dest_dir": dest_dir,
                     "repo_url": repo_url,
+                    "returncode": result.returncode,
                     "stdout_sample": result.stdout[:500],
                     "stderr_sample": result.stderr[:300]
                 })
@@ -76,15 +94,16 @@ def github_push(args, session_state, get_secret):
     user_home = os.path.expanduser("~")
     if not local_dir.startswith(user_home):
         return "Permission denied: Only push from user directory."
-    session_state['pending_github_push'] = (local_dir, commit_msg, remote, branch)
+    set_pending(session_state, "github_push", (local_dir, commit_msg, remote, branch))
     return f"Push {local_dir} with commit '{commit_msg}' to {remote}/{branch}? (yes/ok/approve)"
 
+@register_pending("github_push", needs_secret=True)
 def handle_pending_github_push(user_message, session_state, get_secret):
     """
     Handle approval and execution of a pending GitHub push.
     """
-    if session_state.get('pending_github_push'):
-        local_dir, commit_msg, remote, branch = session_state.pop('pending_github_push')
+    if peek_pending(session_state, "github_push"):
+        local_dir, commit_msg, remote, branch = pop_pending(session_state, "github_push")
         auto_approve = session_state.get("global_approval", False)
 
         if auto_approve or is_affirmative(user_message):
@@ -97,7 +116,10 @@ def handle_pending_github_push(user_message, session_state, get_secret):
                 outputs = []
                 for cmd in cmds:
                     try:
-                        result = with_retry(lambda: subprocess.run(cmd, capture_output=True, text=True, cwd=local_dir, timeout=90))
+                        result = GIT_RETRY.call(
+                            lambda: subprocess.run(cmd, capture_output=True, text=True, cwd=local_dir, timeout=90),
+                            target=f"git:{remote}" if cmd[1] == "push" else "git:local",
+                        )
                         outputs.append(result.stdout + "\n" + result.stderr)
                     except Exception as e:
                         # Special handling for "nothing to commit" on git commit
@@ -0,0 +1,398 @@
+import argparse
+import json
+import os
+import threading
+import time
+from agent_tools.ragis_logger import RagisLogger
+
+# Central logger for index changes
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=[])
+
+# HNSW profiles per collection, JSON: {"default": {...}, "memory": {"space": "cosine", "M": 32, ...}}
+#   OMNI_INDEX_PROFILES=index_profiles.json   profile file (written by `tune --apply`)
+DEFAULT_PROFILES_PATH = "index_profiles.json"
+PROFILE_KEYS = ("space", "M", "construction_ef", "search_ef")
+SPACES = ("l2", "cosine", "ip")
+
+# Chroma metadata keys (accepted by every Chroma version the repo runs on)
+_METADATA_KEYS = {"space": "hnsw:space", "M": "hnsw:M", "construction_ef": "hnsw:construction_ef",
+                  "search_ef": "hnsw:search_ef"}
+# Chroma >= 1.0 collection configuration keys
+_CONFIG_KEYS = {"space": "space", "M": "max_neighbors", "construction_ef": "ef_construction", "search_ef": "ef_search"}
+
+_profiles_lock = threading.Lock()
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: no store lock, rebuild only warns
+    fcntl = None
+
+# Every process using a store holds a shared flock on <store>/.omni_store.lock
+# (taken by open_collection); a rebuild needs it exclusively.
+STORE_LOCK_FILE = ".omni_store.lock"
+_store_locks: dict = {}  # store dir -> fd holding the shared lock
+_store_locks_lock = threading.Lock()
+
+def _store_dir(client) -> str:
+    settings = client.get_settings()
+    return os.path.abspath(settings.persist_directory) if settings.is_persistent else None
+
+def hold_store(client):
+    """Mark the store as in use by this process (shared lock, held until exit)."""
+    store = _store_dir(client)
+    if store is None or fcntl is None:
+        return
+    with _store_locks_lock:
+        if store in _store_locks:
+            return
+        fd = os.open(os.path.join(store, STORE_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        _store_locks[store] = fd
+
+class StoreInUseError(RuntimeError):
+    """Raised by rebuild_collection while other processes have the store open."""
+
+class _exclusive_store:
+    """Exclusive store lock for a rebuild; fails fast if another process holds it (unless force)."""
+    def __init__(self, client, force=False):
+        self.store = _store_dir(client)
+        self.force = force
+        self.fd = None
+        self.borrowed = False
+
+    def __enter__(self):
+        if self.store is None:
+            return self
+        if fcntl is None:
+            logger.log("index_rebuild_warning", {"store": self.store, "warning": "cannot check for other processes"})
+            return self
+        with _store_locks_lock:
+            self.fd = _store_locks.get(self.store)
+        self.borrowed = self.fd is not None  # upgrade our own shared lock in place
+        if not self.borrowed:
+            self.fd = os.open(os.path.join(self.store, STORE_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if not self.force:
+                self._release()
+                raise StoreInUseError(f"{self.store} is open in another process (agent, Backend); "
+                                      "stop it first or pass force=True / --force")
+            logger.log("index_rebuild_warning", {"store": self.store, "warning": "store in use, forced"})
+        return self
+
+    def __exit__(self, *exc):
+        self._release()
+
+    def _release(self):
+        if self.fd is None:
+            return
+        if self.borrowed:
+            fcntl.flock(self.fd, fcntl.LOCK_SH)
+        else:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+        self.fd = None
+
+def profiles_path(path=None) -> str:
+    return path or os.getenv("OMNI_INDEX_PROFILES", DEFAULT_PROFILES_PATH)
+
+def load_profiles(path=None) -> dict:
+    """All profiles from the profile file ({} if it does not exist)."""
+    path = profiles_path(path)
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def get_profile(collection_name, path=None) -> dict:
+    """The collection's profile on top of the "default" entry; empty means Chroma's defaults."""
+    profiles = load_profiles(path)
+    profile = {**profiles.get("default", {}), **profiles.get(collection_name, {})}
+    unknown = set(profile) - set(PROFILE_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown index profile keys for {collection_name}: {sorted(unknown)}")
+    if profile.get("space", "l2") not in SPACES:
+        raise ValueError(f"Unknown HNSW space: {profile['space']}")
+    return profile
+
+def save_profile(collection_name, profile: dict, path=None):
+    """Store one collection's profile in the profile file (atomically)."""
+    path = profiles_path(path)
+    with _profiles_lock:
+        profiles = load_profiles(path)
+        profiles[collection_name] = {k: profile[k] for k in PROFILE_KEYS if k in profile}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(profiles, f, indent=2)
+        os.replace(tmp, path)
+
+def hnsw_metadata(profile: dict) -> dict:
+    return {_METADATA_KEYS[k]: v for k, v in profile.items() if k in _METADATA_KEYS}
+
+def current_profile(collection) -> dict:
+    """The HNSW settings a collection actually uses."""
+    config = getattr(collection, "configuration", None)
+    hnsw = config.get("hnsw") if isinstance(config, dict) else None
+    if hnsw:
+        return {k: hnsw[c] for k, c in _CONFIG_KEYS.items() if hnsw.get(c) is not None}
+    meta = collection.metadata or {}
+    return {k: meta[m] for k, m in _METADATA_KEYS.items() if m in meta}
+
+def open_collection(client, name, path=None):
+    """
+    get_or_create_collection with the collection's profile. A new collection
+    gets the whole profile; for an existing one a changed search_ef is saved
+    to its configuration (used once the index is loaded, so call this before
+    querying), other differences are logged (they need rebuild_collection).
+    """
+    profile = get_profile(name, path)
+    hold_store(client)
+    recover_rebuild(client, name)
+    collection = client.get_or_create_collection(name, metadata=hnsw_metadata(profile) or None)
+    if not profile:
+        return collection
+    current = current_profile(collection)
+    if "search_ef" in profile and current.get("search_ef") != profile["search_ef"]:
+        try:
+            collection.modify(configuration={"hnsw": {"ef_search": profile["search_ef"]}})
+            current["search_ef"] = profile["search_ef"]
+        except Exception as e:
+            logger.log("index_profile_error", {"collection": name, "error": str(e)})
+    stale = {k: (current.get(k), v) for k, v in profile.items() if current.get(k) != v}
+    if stale:
+        logger.log("index_profile_mismatch", {"collection": name, "current_vs_profile": stale,
+                                              "hint": "python -m agent_tools.index_profiles rebuild"})
+    return collection
+
+def _collection_names(client) -> set:
+    return {c if isinstance(c, str) else c.name for c in client.list_collections()}
+
+def recover_rebuild(client, name) -> bool:
+    """
+    Finish or undo a rebuild interrupted between its renames. If `name` is
+    missing but `<name>__old` exists, the original is renamed back; if both
+    exist, the swap had completed and the old copy is deleted. Returns True
+    if anything was repaired.
+    """
+    names = _collection_names(client)
+    old_name = f"{name}__old"
+    if old_name not in names:
+        return False
+    if name in names:
+        client.delete_collection(old_name)
+        logger.log("index_rebuild_recovered", {"collection": name, "action": "dropped old copy"})
+    else:
+        client.get_collection(old_name).modify(name=name)
+        logger.log("index_rebuild_recovered", {"collection": name, "action": "restored original"})
+    return True
+
+def rebuild_collection(client, name, profile: dict, batch_size=5000, force=False):
+    """
+    Re-create collection `name` with `profile`: copy every record into a new
+    collection built with the profile, rename the original to <name>__old,
+    rename the copy to `name`, then delete the original. A crash at any
+    point leaves the original reachable (recover_rebuild, also run by
+    open_collection, completes or undoes the swap).
+
+    Other processes with the store open (agent, Backend) keep handles to the
+    old collection, so this raises StoreInUseError while they run, unless
+    `force`. Returns the new collection.
+    """
+    with _exclusive_store(client, force):
+        recover_rebuild(client, name)
+        old = client.get_collection(name)
+        tmp_name, old_name = f"{name}__rebuild", f"{name}__old"
+        try:
+            client.delete_collection(tmp_name)  # leftover of an interrupted copy
+        except Exception:
+            pass
+        new = client.create_collection(tmp_name, metadata=hnsw_metadata(profile) or None)
+        total = old.count()
+        started = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            page = old.get(include=["embeddings", "metadatas", "documents"], limit=batch_size, offset=offset)
+            new.add(ids=page["ids"], embeddings=page["embeddings"], metadatas=page["metadatas"], documents=page["documents"])
+        if new.count() != total:
+            client.delete_collection(tmp_name)
+            raise RuntimeError(f"Rebuild of {name} copied {new.count()} of {total} records; original kept")
+        old.modify(name=old_name)
+        try:
+            new.modify(name=name)
+        except Exception:
+            client.get_collection(old_name).modify(name=name)
+            raise
+        client.delete_collection(old_name)
+    store = _store_dir(client)
+    if store is not None:
+        # Cached tag index of this process points at the deleted collection
+        try:
+            from agent_tools.tag_index import drop_tag_index
+        except ImportError:  # numpy missing: no tag index either
+            pass
+        else:
+            drop_tag_index(store, name)
+    logger.log("index_rebuild", {"collection": name, "profile": profile, "records": total,
+                                 "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+    return client.get_collection(name)
+
+# --- Tuning: python -m agent_tools.index_profiles tune ---
+
+def exact_neighbors(base, queries, k, space="l2", chunk=256):
+    """Indices of the k nearest base rows per query, by brute force (NumPy)."""
+    import numpy as np
+    if space == "cosine":
+        base = base / (np.linalg.norm(base, axis=1, keepdims=True) + 1e-12)
+        queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12)
+    out = []
+    base_sq = np.einsum("ij,ij->i", base, base)
+    for start in range(0, len(queries), chunk):
+        q = queries[start:start + chunk]
+        if space == "l2":
+            dist = base_sq[None, :] - 2.0 * (q @ base.T)
+        else:
+            dist = -(q @ base.T)
+        top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(dist, top, axis=1).argsort(axis=1)
+        out.append(np.take_along_axis(top, order, axis=1))
+    return np.vstack(out)
+
+def sample_embeddings(collection, n, seed=0):
+    """Up to `n` embeddings spread over the collection, shuffled (float32 matrix)."""
+    import numpy as np
+    total = collection.count()
+    if total <= n:
+        offsets = range(0, total, 1000)
+    else:
+        offsets = sorted(set(int(o) for o in np.linspace(0, total - 1000, -(-n // 1000))))
+    rows = {}
+    for offset in offsets:
+        page = collection.get(include=["embeddings"], limit=1000, offset=offset)
+        rows.update(zip(page["ids"], page["embeddings"]))
+    matrix = np.asarray(list(rows.values()), dtype=np.float32)
+    return matrix[np.random.default_rng(seed).permutation(len(matrix))[:n]]
+
+def tune(embeddings, space="l2", k=10, n_queries=200, Ms=(16, 32, 48), construction_efs=(100, 200),
+         search_efs=(16, 32, 64, 128, 256), seed=0) -> list:
+    """
+    Sweep HNSW settings on a sample: hold out `n_queries` vectors as queries,
+    index the rest in throwaway collections and measure recall@k against
+    exact neighbours plus query latency. Returns one dict per setting.
+    Each setting gets its own build: Chroma ignores a search_ef change on
+    an index that is already loaded.
+    """
+    import chromadb
+    import numpy as np
+    n_queries = min(n_queries, len(embeddings) // 5)
+    queries, base = embeddings[:n_queries], embeddings[n_queries:]
+    truth = exact_neighbors(base, queries, k, space)
+    ids = [str(i) for i in range(len(base))]
+    client = chromadb.EphemeralClient()
+    rows = []
+    for M in Ms:
+        for construction_ef in construction_efs:
+            for search_ef in search_efs:
+                name = f"tune_{seed}_{M}_{construction_ef}_{search_ef}"
+                collection = client.create_collection(name, metadata=hnsw_metadata(
+                    {"space": space, "M": M, "construction_ef": construction_ef, "search_ef": search_ef}))
+                started = time.perf_counter()
+                for start in range(0, len(base), 5000):
+                    collection.add(ids=ids[start:start + 5000], embeddings=base[start:start + 5000])
+                build_s = time.perf_counter() - started
+                latencies, hits = [], 0
+                for qi, q in enumerate(queries):
+                    t0 = time.perf_counter()
+                    found = collection.query(query_embeddings=[q], n_results=k, include=[])["ids"][0]
+                    latencies.append(time.perf_counter() - t0)
+                    hits += len(set(int(i) for i in found) & set(truth[qi].tolist()))
+                rows.append({
+                    "space": space, "M": M, "construction_ef": construction_ef, "search_ef": search_ef,
+                    "recall": hits / (len(queries) * k),
+                    "p50_ms": float(np.percentile(latencies, 50) * 1000),
+                    "p95_ms": float(np.percentile(latencies, 95) * 1000),
+                    "build_s": build_s,
+                })
+                client.delete_collection(name)
+    return rows
+
+def recommend(rows, target_recall=0.95) -> dict:
+    """Fastest (p95) setting reaching `target_recall`, else the one with the best recall."""
+    good = [r for r in rows if r["recall"] >= target_recall]
+    if good:
+        return min(good, key=lambda r: (r["p95_ms"], -r["recall"]))
+    return max(rows, key=lambda r: (r["recall"], -r["p95_ms"]))
+
+def _ints(value):
+    return tuple(int(v) for v in value.split(",") if v)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HNSW index profiles: show, tune (recall@k vs p95) and rebuild.")
+    parser.add_argument("--store", default="datastore", help="Chroma directory")
+    parser.add_argument("--collection", default="memory")
+    parser.add_argument("--profiles", help="Profile file (default OMNI_INDEX_PROFILES or index_profiles.json)")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("show", help="Profile vs the collection's current settings")
+    tn = sub.add_parser("tune", help="Sweep settings on a sample of the collection's embeddings")
+    tn.add_argument("--sample", type=int, default=20000)
+    tn.add_argument("--queries", type=int, default=200)
+    tn.add_argument("-k", type=int, default=10)
+    tn.add_argument("--space", choices=SPACES, help="Default: the profile's / collection's space")
+    tn.add_argument("--M", type=_ints, default=(16, 32, 48))
+    tn.add_argument("--construction-ef", type=_ints, default=(100, 200))
+    tn.add_argument("--search-ef", type=_ints, default=(16, 32, 64, 128, 256))
+    tn.add_argument("--target-recall", type=float, default=0.95)
+    tn.add_argument("--apply", action="store_true", help="Save the recommendation and rebuild the collection")
+    rb = sub.add_parser("rebuild", help="Rebuild the collection with its saved profile")
+    for p in (tn, rb):
+        p.add_argument("--force", action="store_true", help="Rebuild even while other processes have the store open")
+    args = parser.parse_args(argv)
+
+    import chromadb
+    client = chromadb.PersistentClient(path=args.store)
+    recover_rebuild(client, args.collection)
+    collection = client.get_collection(args.collection)
+    profile = get_profile(args.collection, args.profiles)
+    command = args.command or "show"
+
+    if command == "show":
+        print(f"{args.collection}: {collection.count()} records")
+        print(f"  current: {current_profile(collection)}")
+        print(f"  profile: {profile or '(none: Chroma defaults)'}")
+    elif command == "tune":
+        space = args.space or profile.get("space") or current_profile(collection).get("space", "l2")
+        sample = sample_embeddings(collection, args.sample)
+        if len(sample) < 50:
+            print(f"Only {len(sample)} embeddings in {args.collection}; not enough to tune.")
+            return
+        print(f"Tuning on {len(sample)} embeddings ({space}, recall@{args.k})...")
+        rows = tune(sample, space, args.k, args.queries, args.M, args.construction_ef, args.search_ef)
+        print(f"{'M':>4} {'c_ef':>5} {'s_ef':>5} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}")
+        for r in rows:
+            print(f"{r['M']:>4} {r['construction_ef']:>5} {r['search_ef']:>5} {r['recall']:>7.3f} "
+                  f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['build_s']:>8.2f}")
+        best = recommend(rows, args.target_recall)
+        chosen = {k: best[k] for k in PROFILE_KEYS}
+        print(f"\nRecommended: {chosen} (recall {best['recall']:.3f}, p95 {best['p95_ms']:.2f} ms)")
+        logger.log("index_tune", {"collection": args.collection, "sample": len(sample), "k": args.k,
+                                  "recommended": chosen, "recall": best["recall"], "p95_ms": best["p95_ms"]})
+        if args.apply:
+            save_profile(args.collection, chosen, args.profiles)
+            try:
+                rebuild_collection(client, args.collection, chosen, force=args.force)
+            except StoreInUseError as e:
+                print(f"Saved to {profiles_path(args.profiles)}; not rebuilt: {e}")
+                return
+            print(f"Saved to {profiles_path(args.profiles)} and rebuilt {args.collection}.")
+    elif command == "rebuild":
+        if not profile:
+            print(f"No profile for {args.collection} in {profiles_path(args.profiles)}.")
+            return
+        try:
+            rebuild_collection(client, args.collection, profile, force=args.force)
+        except StoreInUseError as e:
+            print(f"Not rebuilt: {e}")
+            return
+        print(f"Rebuilt {args.collection} with {profile}.")
+
+if __name__ == "__main__":
+    main()
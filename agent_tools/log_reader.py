@@ -0,0 +1,203 @@
+import gzip
+import io
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, Optional
+from agent_tools.ragis_logger import rotated_segments
+
+try:
+    import zstandard as zstd  # optional: needed only for .zst segments
+except ImportError:
+    zstd = None
+
+def open_segment(path):
+    """Open a log segment for text reading, decompressing .gz / .zst transparently."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstd is None:
+            raise RuntimeError(f"Reading {path} needs the 'zstandard' package")
+        return io.TextIOWrapper(zstd.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def log_segments(log_path, include_rotated: bool = True) -> list:
+    """The current log plus (optionally) its rotated segments, oldest first."""
+    segments = rotated_segments(log_path) if include_rotated else []
+    if os.path.exists(log_path):
+        segments.append(os.path.abspath(log_path))
+    return segments
+
+def _parse(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None  # torn or partial line
+
+def _ts(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value) if value else None
+
+def iter_events(log_path="ragis_events.log", include_rotated: bool = True,
+                event_types: Optional[Iterable[str]] = None, since=None, until=None) -> Iterator[dict]:
+    """
+    Yield events in chronological order across rotated (compressed) segments
+    and the current file. `since` / `until` are datetimes or ISO strings.
+    """
+    wanted = set(event_types) if event_types else None
+    since, until = _ts(since), _ts(until)
+    for path in log_segments(log_path, include_rotated):
+        try:
+            f = open_segment(path)
+        except FileNotFoundError:
+            continue  # removed by retention or compressed meanwhile
+        with f:
+            for line in f:
+                ev = _parse(line)
+                if ev is None or (wanted and ev.get("event_type") not in wanted):
+                    continue
+                if since or until:
+                    ts = _ts(ev.get("ts"))
+                    if ts is None or (since and ts < since) or (until and ts > until):
+                        continue
+                yield ev
+
+def tail_events(log_path="ragis_events.log", n: int = 100, include_rotated: bool = True,
+                event_types: Optional[Iterable[str]] = None) -> list:
+    """The last `n` events (oldest first), reaching into rotated segments only when needed."""
+    return _tail_paths(log_segments(log_path, include_rotated), n, event_types)
+
+def _tail_paths(paths, n, event_types=None) -> list:
+    wanted = set(event_types) if event_types else None
+    found: deque = deque()
+    for path in reversed(paths):
+        if len(found) >= n:
+            break
+        last = deque(maxlen=n - len(found))
+        try:
+            f = open_segment(path)
+        except FileNotFoundError:
+            continue
+        with f:
+            for line in f:
+                ev = _parse(line)
+                if ev is not None and (not wanted or ev.get("event_type") in wanted):
+                    last.append(ev)
+        found.extendleft(reversed(last))
+    return list(found)
+
+def read_last_lines(f, n: int, block_size: int = 64 * 1024):
+    """
+    The last `n` complete lines of a binary file open for reading, found by
+    seeking backwards from EOF block by block (cost independent of file size).
+    Returns (lines, offset just past the last complete line).
+    """
+    end = f.seek(0, os.SEEK_END)
+    pos, buf = end, b""
+    while pos > 0 and buf.count(b"\n") <= n:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        buf = f.read(step) + buf
+    lines = buf.split(b"\n")
+    partial = lines.pop()  # empty after the final newline, or a line still being written
+    if pos > 0:
+        lines = lines[1:]  # first piece may start mid-line
+    return (lines[-n:] if n else []), end - len(partial)
+
+class TailReader:
+    """
+    Incremental reader of the newest events of a log, for live views.
+
+    The first poll() seeks back from EOF for the last `max_events` events
+    (older rotated segments are consulted only if the file is shorter); later
+    polls parse only the bytes appended since. The reader keeps its file
+    open, so after a rotation it finishes the renamed segment and then
+    switches to the new file. `transform` maps each event to the stored item
+    (e.g. a table row); returning None skips the event.
+    """
+    def __init__(self, log_path="ragis_events.log", max_events: int = 100,
+                 transform: Optional[Callable[[dict], object]] = None, block_size: int = 64 * 1024):
+        self.log_path = log_path
+        self.max_events = max_events
+        self.transform = transform or (lambda ev: ev)
+        self.block_size = block_size
+        self.items: deque = deque(maxlen=max_events)
+        self._f = None
+        self._partial = b""
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _add(self, events) -> int:
+        added = 0
+        for ev in events:
+            item = self.transform(ev)
+            if item is not None:
+                self.items.append(item)
+                added += 1
+        return added
+
+    def _open_current(self):
+        try:
+            self._f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            self._f = None
+        self._partial = b""
+
+    def _rotated(self) -> bool:
+        try:
+            current = os.stat(self.log_path)
+        except FileNotFoundError:
+            return False
+        if self._f is None:
+            return True
+        opened = os.fstat(self._f.fileno())
+        return (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev) or current.st_size < self._f.tell()
+
+    def _read_new(self) -> list:
+        data = self._partial + self._f.read()
+        lines = data.split(b"\n")
+        self._partial = lines.pop()  # incomplete line, finished by a later write
+        return [ev for ev in (_parse(line) for line in lines if line.strip()) if ev is not None]
+
+    def _initial(self):
+        self._open_current()
+        if self._f is None:
+            return self._add(tail_events(self.log_path, self.max_events))
+        lines, offset = read_last_lines(self._f, self.max_events, self.block_size)
+        events = [ev for ev in map(_parse, lines) if ev is not None]
+        if len(events) < self.max_events:
+            events = _tail_paths(rotated_segments(self.log_path), self.max_events - len(events)) + events
+        self._f.seek(offset)
+        return self._add(events)
+
+    def poll(self) -> int:
+        """Read whatever was appended since the last poll; returns the number of new items."""
+        with self._lock:
+            if not self._started:
+                self._started = True
+                return self._initial()
+            added = 0
+            if self._f is not None:
+                added += self._add(self._read_new())
+            if self._rotated():
+                if self._f is not None:
+                    self._f.close()
+                self._open_current()
+                if self._f is not None:
+                    added += self._add(self._read_new())
+            return added
+
+    def snapshot(self) -> list:
+        """The newest items, oldest first."""
+        with self._lock:
+            return list(self.items)
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
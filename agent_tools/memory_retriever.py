@@ -4,6 +4,10 @@ import numpy as np
 import json
 import os
 from agent_tools.ragis_logger import RagisLogger  # <--- central logger
+from agent_tools.metrics import RETRIEVAL_SECONDS
+from agent_tools.tracing import traced
+from agent_tools.index_profiles import open_collection, current_profile
+from agent_tools.tag_index import get_tag_index, tag_index_enabled, scan_metadatas, BRUTE_FORCE_LIMIT
 
 SYSTEM_VERSION = "1.0.0"
 TAGGING_VERSION = "1.0.0"
@@ -16,8 +20,13 @@ class MemoryRetriever:
         synonyms_path="synonyms.json", 
         log_path="ragis_events.log"
     ):
-        self.client = chromadb.Client()
-        self.collection = self.client.get_or_create_collection(collection_name)
+        # Same on-disk store MemoryStore writes to (an in-memory Client() never sees those memories)
+        self.client = chromadb.PersistentClient(path=db_path)
+        # HNSW settings come from the collection's index profile (see index_profiles.py)
+        self.collection = open_collection(self.client, collection_name)
+        # Tag/category bitmaps for pre-filtering and tag stats (opt-in: OMNI_TAG_INDEX=1)
+        self.tag_index = get_tag_index(db_path, self.collection) if tag_index_enabled() else None
+        self.space = current_profile(self.collection).get("space", "l2")
 
         self.log_path = log_path
         self.logger = RagisLogger(log_path=log_path, pii_mask_fields=['query_text'])
@@ -41,6 +50,8 @@ class MemoryRetriever:
     def utc_now(self):
         return datetime.utcnow().replace(tzinfo=timezone.utc)
 
+    @traced("retrieval")
+    @RETRIEVAL_SECONDS.time(source="memory_retriever")
     def retrieve_memories(
         self, 
         query_embedding, 
@@ -48,23 +59,29 @@ class MemoryRetriever:
         query_text: str, 
         use_recent_days=90, 
         min_tag_freq=10, 
-        experiment_mode=None,  # None/'pure'/'rarest'
-        log_context=None
+        experiment_mode=None,  # None/'pure'/'rarest'/'hybrid'
+        log_context=None,
+        tag_counts=None
     ):
         """
         Retrieve matching memories using:
         -  major category/tag narrowing,
         -  tag overlap within the context window + recency subfilter,
-        -  optional experiment (pure vector, rarest tag)
+        -  optional experiment (pure vector, rarest tag, hybrid: tag-filtered
+           candidates merged with pure vector neighbours by distance)
+        Pass `tag_counts` (from get_tag_counts) to reuse tag statistics fetched earlier.
         """
         now = self.utc_now()
+        if self.tag_index is not None:
+            self.tag_index.sync()
         # Normalize context tags
         all_context_tags = self.normalize_metatags(context_window_metatags)
 
         # Get frequency counts for all context tags
-        tag_counts_90d = {}
-        for tag in set(all_context_tags):
-            tag_counts_90d[tag] = self.get_tag_freqs(tag, days=use_recent_days)
+        if tag_counts is None:
+            tag_counts_90d = self.get_tag_counts(context_window_metatags, days=use_recent_days)
+        else:
+            tag_counts_90d = dict(tag_counts)
 
         # Only keep tags that meet the minimum freq
         qualifying_tags = [tag for tag in all_context_tags if tag_counts_90d.get(tag, 0) >= min_tag_freq]
@@ -80,40 +97,78 @@ class MemoryRetriever:
             tag_strategy = "pure"
         elif experiment_mode == "rarest":
             tag, c = self._get_rarest_qualifying_tag(tag_counts_90d, min_tag_freq)
-            filter_query = {"metatags": tag} if tag else {}
+            filter_query = self._tags_clause([tag]) if tag else {}
             tag_strategy = f"rarest:{tag}" if tag else "none"
         else:
-            # Default: restrict by major_category and metatags
+            # Default (and the filtered half of hybrid): restrict by major_category and metatags
             if major_cats:
                 filter_query = {"major_category": {"$in": major_cats}}
                 if qualifying_tags:
-                    filter_query["metatags"] = {"$in": qualifying_tags}
+                    filter_query = {"$and": [filter_query, self._tags_clause(qualifying_tags)]}
             else:
                 filter_query = {}
 
-            tag_strategy = "standard"
+            tag_strategy = "hybrid" if experiment_mode == "hybrid" else "standard"
 
         # Always add time preference: only within recent N days if possible
         ids, metadatas, scores, docs = [], [], [], []
 
-        # ChromaDB doesn't (yet) do direct timestamp filtering server-side, so fetch and filter here
-        candidate_results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=30,  # tune as needed
-            where=filter_query,
-            include=['documents', 'metadatas', 'distances']
-        )
+        # Tag index: the filter as bitmap AND/OR; small allowed sets are scored exactly with NumPy,
+        # larger ones go to HNSW as an id filter instead of a metadata scan
+        allowed, prefilter = None, None
+        if self.tag_index is not None and filter_query:
+            if experiment_mode == "rarest":
+                allowed_by = {"categories": None, "tags": [tag]}
+            else:
+                allowed_by = {"categories": major_cats, "tags": qualifying_tags or None}
+            allowed = self.tag_index.allowed(**allowed_by)
+
+        if allowed is not None and len(allowed) <= BRUTE_FORCE_LIMIT:
+            candidate_results = self.tag_index.brute_force(query_embedding, allowed, n_results=30,
+                                                           space=self.space, **allowed_by)
+            prefilter = "brute_force"
+        elif allowed is not None:
+            candidate_results = self.tag_index.query_ids(query_embedding, allowed, n_results=30, **allowed_by)
+            prefilter = "hnsw_ids"
+        else:
+            # ChromaDB doesn't (yet) do direct timestamp filtering server-side, so fetch and filter here
+            candidate_results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=30,  # tune as needed
+                where=filter_query or None,
+                include=['documents', 'metadatas', 'distances']
+            )
+
+        # Results are per query embedding; we only sent one.
+        cand_ids = (candidate_results.get('ids') or [[]])[0]
+        cand_metas = (candidate_results.get('metadatas') or [[]])[0]
+        cand_docs = (candidate_results.get('documents') or [[]])[0]
+        cand_dists = (candidate_results.get('distances') or [[]])[0]
+
+        if experiment_mode == "hybrid" and filter_query:
+            # Add unfiltered neighbours so good matches with missing/other tags still surface
+            vector_results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=30,
+                include=['documents', 'metadatas', 'distances']
+            )
+            merged = {}
+            for results in (candidate_results, vector_results):
+                for row in zip(*((results.get(k) or [[]])[0] for k in ('ids', 'metadatas', 'documents', 'distances'))):
+                    merged.setdefault(row[0], row)
+            best = sorted(merged.values(), key=lambda row: row[3])[:30]
+            cand_ids, cand_metas, cand_docs, cand_dists = (list(col) for col in zip(*best)) if best else ([], [], [], [])
 
         # Manual post-filter by recency
-        for idx, meta in enumerate(candidate_results.get('metadatas', [])):
-            ts = meta.get("timestamp")
+        for idx, meta in enumerate(cand_metas):
+            ts = (meta or {}).get("timestamp")
             if not ts: continue
             t = datetime.fromisoformat(ts)
             if (now - t).days <= use_recent_days:
-                ids.append(candidate_results['ids'][idx])
+                ids.append(cand_ids[idx])
                 metadatas.append(meta)
-                docs.append(candidate_results["documents"][idx])
-                scores.append(candidate_results['distances'][idx])
+                docs.append(cand_docs[idx])
+                scores.append(cand_dists[idx])
 
         # Prepare for backward analysis/logging
         out_record = {
@@ -124,6 +179,8 @@ class MemoryRetriever:
             "major_cats": major_cats,
             "filter_query": filter_query,
             "strategy": tag_strategy,
+            "prefilter": prefilter,
+            "allowed_count": len(allowed) if allowed is not None else None,
             "experiment_mode": experiment_mode or "standard",
             "retrieved_ids": ids,
             "retrieved_scores": scores,
@@ -140,14 +197,29 @@ class MemoryRetriever:
 
         return docs, metadatas, scores
 
+    @traced("tag_counts")
+    def get_tag_counts(self, context_window_metatags, days=90):
+        """
+        Return {normalized_tag: count in last N days} for a list of raw context tags.
+        """
+        if self.tag_index is not None:
+            self.tag_index.sync()
+            return self.tag_index.tag_counts(set(self.normalize_metatags(context_window_metatags)), days=days)
+        return {
+            tag: self.get_tag_freqs(tag, days=days)
+            for tag in set(self.normalize_metatags(context_window_metatags))
+        }
+
     def get_tag_freqs(self, metatag, days=90):
         """
         Return the count of memories with this metatag in the last N days.
         """
-        results = self.collection.get(where={"metatags": {"$contains": metatag}})
+        if self.tag_index is not None:
+            self.tag_index.sync()
+            return self.tag_index.tag_counts([metatag], days=days)[metatag]
         now = self.utc_now()
         count = 0
-        for meta in results.get("metadatas", []):
+        for _, meta in scan_metadatas(self.collection, where={"metatags": {"$contains": metatag}}):
             ts = meta.get("timestamp")
             if not ts:
                 continue
@@ -160,15 +232,22 @@ class MemoryRetriever:
         """
         Collect all unique major_categories present for the set of tags.
         """
+        if self.tag_index is not None:
+            return self.tag_index.categories_for(set(tags))
         cats = set()
         for tag in set(tags):
-            results = self.collection.get(where={"metatags": {"$contains": tag}})
-            for meta in results.get("metadatas", []):
+            for _, meta in scan_metadatas(self.collection, where={"metatags": {"$contains": tag}}):
                 cat = meta.get("major_category")
                 if cat:
                     cats.add(cat)
         return list(cats)
 
+    @staticmethod
+    def _tags_clause(tags):
+        """Where clause: memories carrying any of `tags` (metatags is a list, so $contains per tag)."""
+        clauses = [{"metatags": {"$contains": tag}} for tag in dict.fromkeys(tags)]
+        return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
     def _get_rarest_qualifying_tag(self, tag_counts: dict, min_tag_freq: int):
         """
         Given tag:count pairs, return rarest tag meeting threshold.
@@ -5,6 +5,9 @@ import uuid
 import json
 import os
 from agent_tools.ragis_logger import RagisLogger  # <-- Import here
+from agent_tools.tracing import traced
+from agent_tools.index_profiles import open_collection
+from agent_tools.tag_index import get_tag_index, tag_index_enabled, scan_metadatas, bump_generation, generation_path
 
 SYSTEM_VERSION = "1.0.0"
 TAGGING_VERSION = "1.0.0"
@@ -12,8 +15,12 @@ TAGGING_VERSION = "1.0.0"
 class MemoryStore:
     def __init__(self, db_path='datastore', collection_name='memory', synonyms_path="synonyms.json", log_path="ragis_events.log"):
         self.client = chromadb.PersistentClient(path=db_path)
-        self.collection = self.client.get_or_create_collection(collection_name)
+        # HNSW settings come from the collection's index profile (see index_profiles.py)
+        self.collection = open_collection(self.client, collection_name)
         self.collection_name = collection_name
+        self.db_path = db_path
+        # Bitmap tag index shared with MemoryRetriever (opt-in: OMNI_TAG_INDEX=1)
+        self.tag_index = get_tag_index(db_path, self.collection) if tag_index_enabled() else None
 
         self.synonym_map = self._load_synonym_map(synonyms_path)
         self.synonyms_path = synonyms_path
@@ -36,6 +43,22 @@ class MemoryStore:
     def utc_now_iso(self):
         return datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
 
+    @staticmethod
+    def _chroma_metadata(metadata):
+        """
+        Chroma metadata values must be scalars or non-empty lists: dicts
+        (tag_freq_90d) are stored as JSON strings, empty tag lists are left out.
+        """
+        out = {}
+        for key, value in metadata.items():
+            if isinstance(value, dict):
+                value = json.dumps(value)
+            elif isinstance(value, list) and not value:
+                continue
+            out[key] = value
+        return out
+
+    @traced("memory_store.add_memory")
     def add_memory(self, raw_text, embedding, major_category, metatags,
                    session_id, timestamp=None, tag_freq_window=None):
         norm_metatags = self.normalize_metatags(metatags)
@@ -62,10 +85,14 @@ class MemoryStore:
         if not all(isinstance(x, (float, int)) for x in embedding):
             raise ValueError("All elements in embedding must be float or int.")
 
-        self.collection.add([embedding], [doc_id], metadatas=[metadata], documents=[raw_text])
+        self.collection.add(ids=[doc_id], embeddings=[embedding],
+                            metadatas=[self._chroma_metadata(metadata)], documents=[raw_text])
+        if self.tag_index is not None:
+            self.tag_index.add([doc_id], [metadata])
         # Centralized logging
         self.logger.log_storage_event(doc_id, session_id, metadata)
 
+    @traced("memory_store.add_memories_batch")
     def add_memories_batch(self, memory_entries):
         embeddings, ids, metadatas, documents = [], [], [], []
         doc_ids, session_ids, metas = [], [], []
@@ -86,16 +113,20 @@ class MemoryStore:
             doc_id = str(uuid.uuid4())
             embeddings.append(entry["embedding"])
             ids.append(doc_id)
-            metadatas.append(metadata)
+            metadatas.append(self._chroma_metadata(metadata))
             documents.append(entry["raw_text"])
             doc_ids.append(doc_id)
             session_ids.append(entry["session_id"])
             metas.append(metadata)
-        self.collection.add(embeddings, ids, metadatas, documents)
+        self.collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+        if self.tag_index is not None:
+            self.tag_index.add(ids, metadatas)
         self.logger.log_batch_storage(doc_ids, session_ids, metas)
 
     def retro_tag_memory(self, session_id, tag_extractor_fn):
-        results = self.collection.get(where={"session_id": session_id})
+        # Chroma leaves embeddings out of get() unless asked
+        results = self.collection.get(where={"session_id": session_id},
+                                      include=["documents", "metadatas", "embeddings"])
         updated_docs = []
         error_docs = []
         for doc, meta, emb, doc_id in zip(
@@ -110,12 +141,19 @@ class MemoryStore:
                 meta['metatags'] = norm_metatags
                 meta['tagging_version'] = TAGGING_VERSION
                 self.collection.update(ids=[doc_id],
-                                      metadatas=[meta],
+                                      metadatas=[self._chroma_metadata(meta)],
                                       embeddings=[emb],
                                       documents=[doc])
+                if self.tag_index is not None:
+                    self.tag_index.update(doc_id, meta)
                 updated_docs.append(doc_id)
             except Exception as e:
                 error_docs.append({"doc_id": doc_id, "error": str(e)})
+        # Tag indexes in other processes rebuild on their next sync
+        if updated_docs and self.tag_index is not None:
+            self.tag_index.bump_generation()
+        elif updated_docs:
+            bump_generation(generation_path(self.db_path, self.collection_name))
         # Log retro-tag results
         self.logger.log("retro_tag_complete", {
             "session_id": session_id,
@@ -139,12 +177,15 @@ class MemoryStore:
     def get_tag_freqs(self, metatag: str, days: int = 90) -> int:
         """
         Return the count of memories with this metatag in the last N days.
-        Uses $contains for partial match in ChromaDB (metatags is a list).
+        Uses $contains for partial match in ChromaDB (metatags is a list),
+        or the tag index when enabled.
         """
-        results = self.collection.get(where={"metatags": {"$contains": metatag}})
+        if self.tag_index is not None:
+            self.tag_index.sync()
+            return self.tag_index.tag_counts([metatag], days=days)[metatag]
         now = datetime.utcnow().replace(tzinfo=timezone.utc)
         count = 0
-        for meta in results["metadatas"]:
+        for _, meta in scan_metadatas(self.collection, where={"metatags": {"$contains": metatag}}):
             try:
                 t = datetime.fromisoformat(meta["timestamp"])
                 if (now - t).days <= days:
@@ -0,0 +1,231 @@
+import bisect
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers embedding calls (~50 ms) up to long tool runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help="", labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    """
+    Current value per label set, either set explicitly or read from
+    callbacks at scrape time (`add_callback`; for labelled gauges a callback
+    returns {label values tuple: value}).
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help="", labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._callbacks: list = []
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def add_callback(self, fn: Callable):
+        self._callbacks.append(fn)
+
+    def render(self) -> list:
+        with self._lock:
+            values = dict(self._values)
+        for fn in list(self._callbacks):
+            try:
+                current = fn()
+            except Exception:
+                continue  # a failing callback must not break the scrape
+            if isinstance(current, dict):
+                values.update({tuple(map(str, k if isinstance(k, tuple) else (k,))): v for k, v in current.items()})
+            elif current is not None:
+                values[()] = current
+        return self._header() + [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}"
+                                 for k, v in sorted(values.items())]
+
+class _Timer:
+    """Context manager / decorator observing elapsed seconds into a histogram."""
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram, self.labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+class Histogram(_Metric):
+    """Cumulative-bucket latency histogram per label set (values in seconds)."""
+    kind = "histogram"
+
+    def __init__(self, name, help="", labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels) -> _Timer:
+        """`with h.time(tool="x"): ...` or `@h.time(tool="x")`."""
+        return _Timer(self, labels)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Named metrics of one process, rendered together for /metrics."""
+    def __init__(self):
+        self._metrics: dict = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help="", labels=()) -> Counter:
+        return self._get_or_create(Counter, name, help=help, labels=labels)
+
+    def gauge(self, name, help="", labels=()) -> Gauge:
+        return self._get_or_create(Gauge, name, help=help, labels=labels)
+
+    def histogram(self, name, help="", labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help=help, labels=labels, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return "\n".join(line for m in metrics for line in m.render()) + "\n"
+
+REGISTRY = MetricsRegistry()
+counter, gauge, histogram, render = REGISTRY.counter, REGISTRY.gauge, REGISTRY.histogram, REGISTRY.render
+
+# --- Standard metrics ---
+
+EVENTS = counter("ragis_events_total", "Events passed to RagisLogger (before sampling), by type.", ["event_type"])
+EVENT_DURATION = histogram("ragis_event_duration_seconds", "elapsed_ms reported by logged events, by type.", ["event_type"])
+TOOL_SECONDS = histogram("omni_tool_duration_seconds", "Agent tool call latency.", ["tool"])
+EMBEDDING_SECONDS = histogram("omni_embedding_duration_seconds", "Embedding call latency.", ["source"])
+RETRIEVAL_SECONDS = histogram("omni_retrieval_duration_seconds", "Memory retrieval latency.", ["source"])
+LLM_SECONDS = histogram("omni_llm_duration_seconds", "LLM call latency (phase=first_token|total).", ["phase"])
+QUEUE_DEPTH = gauge("omni_queue_depth", "Items waiting per queue.", ["queue"])
+
+def observe_event(event_type: str, data) -> None:
+    """Feed one RagisLogger event: count it, and record its elapsed_ms if it has one."""
+    EVENTS.inc(event_type=event_type)
+    elapsed = data.get("elapsed_ms") if isinstance(data, dict) else None
+    if isinstance(elapsed, (int, float)):
+        EVENT_DURATION.observe(elapsed / 1000.0, event_type=event_type)
+
+# --- Sidecar server (for processes without a web framework, e.g. the Gradio agent) ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood stderr
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread; returns the server (call shutdown() to stop)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
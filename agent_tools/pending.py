@@ -0,0 +1,82 @@
+import importlib
+from typing import Any, Callable, Optional
+from agent_tools.ragis_logger import RagisLogger
+from agent_tools.tracing import span
+
+# session_state key holding the single typed pending action
+PENDING_KEY = "pending"
+
+# Central logger for pending-action dispatch
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['user_message'])
+
+# action_type -> (handler, needs_secret)
+_HANDLERS: dict = {}
+
+def register_pending(action_type: str, needs_secret: bool = False) -> Callable:
+    """
+    Decorator registering the approval handler for a pending-action type.
+    Handlers take (user_message, session_state), plus get_secret if needs_secret.
+    """
+    def decorator(handler):
+        _HANDLERS[action_type] = (handler, needs_secret)
+        return handler
+    return decorator
+
+def set_pending(session_state: dict, action_type: str, payload: Any):
+    """Record the action awaiting approval, replacing any earlier one."""
+    if action_type not in _HANDLERS:
+        raise KeyError(f"No pending handler registered for '{action_type}'")
+    previous = session_state.get(PENDING_KEY)
+    if previous and previous.get("type") != action_type:
+        logger.log("pending_replaced", {"previous": previous.get("type"), "new": action_type})
+    session_state[PENDING_KEY] = {
+        "type": action_type,
+        # lets dispatch import the owner module in a fresh process (restored session)
+        "module": _HANDLERS[action_type][0].__module__,
+        "payload": payload,
+    }
+
+def peek_pending(session_state: dict, action_type: str) -> Optional[Any]:
+    """Return the payload if an action of this type is pending, else None."""
+    entry = session_state.get(PENDING_KEY)
+    if entry and entry.get("type") == action_type:
+        return entry.get("payload")
+    return None
+
+def pop_pending(session_state: dict, action_type: str) -> Optional[Any]:
+    """Remove and return the payload if an action of this type is pending."""
+    entry = session_state.get(PENDING_KEY)
+    if entry and entry.get("type") == action_type:
+        session_state.pop(PENDING_KEY)
+        return entry.get("payload")
+    return None
+
+def dispatch_pending(user_message: str, session_state: dict, get_secret=None) -> Optional[str]:
+    """
+    Route the user's reply to the handler of the pending action, if any.
+    O(1): nothing is probed when no action is pending.
+    """
+    entry = session_state.get(PENDING_KEY)
+    if not entry:
+        return None
+    action_type = entry.get("type")
+    if action_type not in _HANDLERS and entry.get("module"):
+        try:
+            importlib.import_module(entry["module"])
+        except ImportError as e:
+            logger.log("handler_error", {"handler": action_type, "error": str(e), "user_message": user_message})
+    registered = _HANDLERS.get(action_type)
+    if registered is None:
+        session_state.pop(PENDING_KEY, None)
+        logger.log("handler_error", {"handler": action_type, "error": "no handler registered", "user_message": user_message})
+        return None
+    handler, needs_secret = registered
+    try:
+        with span(f"pending:{action_type}", state=session_state, handler=handler.__name__):
+            if needs_secret:
+                return handler(user_message, session_state, get_secret)
+            return handler(user_message, session_state)
+    except Exception as e:
+        session_state.pop(PENDING_KEY, None)
+        logger.log("handler_error", {"handler": handler.__name__, "error": str(e), "user_message": user_message})
+        return f"⚠️ Could not complete the pending action: {e}"
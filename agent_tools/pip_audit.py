@@ -2,9 +2,12 @@ import subprocess
 from datetime import datetime
 from typing import Any, Dict, Optional
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.pending import register_pending, set_pending, peek_pending, pop_pending
+from agent_tools.task_manager import register_action, report_progress
 
 MAX_STDOUT = 1800
 MAX_STDERR = 800
+BACKGROUND_TIMEOUT = 300  # seconds for a queued audit (the task timeout is a little longer)
 
 # Central logger for pip audit actions
 logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['path'])
@@ -19,15 +22,16 @@ def pip_audit(args: Dict[str, Any], session_state: dict) -> str:
     Prepare to run pip-audit in the given path, approval required.
     """
     path = args.get("path", ".")
-    session_state['pending_pip_audit'] = path
+    set_pending(session_state, "pip_audit", path)
     return f"Agent wants to run pip-audit in `{path}` to check dependencies for CVEs. Run audit? (yes/ok/approve)"
 
+@register_pending("pip_audit")
 def handle_pending_pip_audit(user_message: str, session_state: dict) -> Optional[str]:
     """
     Handle approval and execution of a pending pip-audit.
     """
-    if session_state.get('pending_pip_audit'):
-        path = session_state.pop('pending_pip_audit')
+    if peek_pending(session_state, "pip_audit"):
+        path = pop_pending(session_state, "pip_audit")
         auto_approve = session_state.get("global_approval", False)
 
         if auto_approve or is_affirmative(user_message):
@@ -58,6 +62,34 @@ def handle_pending_pip_audit(user_message: str, session_state: dict) -> Optional
             return "pip-audit cancelled."
     return None
 
+def run_pip_audit(params: Dict[str, Any], context=None) -> str:
+    """
+    Task action: run pip-audit in params["path"] on the session's worker pool
+    (queued with "audit deps <path>"). The subprocess is killed after
+    params["timeout"] seconds, so a timed-out task never keeps running.
+    """
+    path = params.get("path", ".")
+    timeout = params.get("timeout", BACKGROUND_TIMEOUT)
+    report_progress(10, f"pip-audit in {path}")
+    try:
+        result = subprocess.run(
+            ["pip-audit", "--no-deps"], capture_output=True, text=True, cwd=path, timeout=timeout
+        )
+    except Exception as e:
+        logger.log("pip_audit_fail", {"action": "PIP_AUDIT_FAIL", "path": path, "error": str(e)})
+        raise
+    logger.log("pip_audit", {
+        "action": "PIP_AUDIT",
+        "path": path,
+        "background": True,
+        "stdout_sample": result.stdout[:350],
+        "stderr_sample": result.stderr[:150]
+    })
+    report_progress(100)
+    return f"pip-audit results for `{path}`:\n{result.stdout[:MAX_STDOUT]}\n{result.stderr[:MAX_STDERR]}"
+
+register_action("pip_audit", run_pip_audit)
+
 def handle_pip_audit_upgrade(user_message: str, session_state: dict) -> Optional[str]:
     """
     Stub placeholder: you'd add per-package patching here if extending.
@@ -0,0 +1,219 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+from agent_tools.ragis_logger import RagisLogger
+from agent_tools.tracing import thread_trace_ids
+
+# Central logger for saved turn profiles
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=[])
+
+PROFILE_MODES = ("sample", "cprofile")
+
+# Leaf functions of threads that are just waiting; such samples are skipped.
+_IDLE_LEAVES = {"wait", "select", "poll", "epoll", "accept", "_wait_for_tstate_lock", "get", "sleep", "acquire",
+                "readinto", "recv", "recv_into", "serve_forever", "_worker", "_run_once"}
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class _Sampler:
+    """
+    Samples the turn's threads each `interval` seconds into collapsed-stack
+    counts: the thread stepping the turn generator, and threads inside a
+    span of the turn's trace (pipeline workers). Other sessions' turns and
+    background threads (log writer, task workers) are left out.
+    """
+    def __init__(self, interval: float, trace_id=None):
+        self.interval = interval
+        self.trace_id = trace_id
+        self.drivers: set = set()  # idents of threads currently stepping the turn
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="turn-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            traces = thread_trace_ids()
+            drivers = set(self.drivers)
+            for ident, frame in sys._current_frames().items():
+                if ident == me or frame.f_code.co_name in _IDLE_LEAVES:
+                    continue
+                if ident not in drivers and (self.trace_id is None or traces.get(ident) != self.trace_id):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                self.counts[";".join([names.get(ident, str(ident))] + stack[::-1])] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format (flamegraph.pl, speedscope, inferno)."""
+        return "".join(f"{stack} {n}\n" for stack, n in self.counts.most_common())
+
+class TurnProfile:
+    """Profiling state of one turn (see TurnProfiler.begin)."""
+    def __init__(self, profiler, trace_id, session_id, forced):
+        self.profiler = profiler
+        self.trace_id = trace_id
+        self.session_id = session_id
+        self.forced = forced
+        self.mode = profiler.mode
+        self.started = time.perf_counter()
+        self.cprofile = cProfile.Profile() if profiler.mode == "cprofile" else None
+        self.sampler = _Sampler(profiler.interval, trace_id) if profiler.mode == "sample" else None
+        if self.sampler is not None:
+            self.sampler.start()
+
+    def resume(self):
+        """cProfile only sees the enabling thread: enable around each generator step."""
+        if self.sampler is not None:
+            self.sampler.drivers.add(threading.get_ident())
+        if self.cprofile is not None:
+            try:
+                self.cprofile.enable()
+            except ValueError:
+                # Python 3.12+: one profiler per process; a concurrent turn already has it.
+                self.cprofile = None
+
+    def pause(self):
+        if self.sampler is not None:
+            self.sampler.drivers.discard(threading.get_ident())
+        if self.cprofile is not None:
+            self.cprofile.disable()
+
+class TurnProfiler:
+    """
+    Per-turn profiler for the chat agent, off unless armed.
+
+    `arm(n)` profiles the next n turns; `threshold_ms` profiles every turn
+    but keeps only those slower than the threshold. mode="sample" samples
+    the turn's threads every `interval` seconds (low overhead) and writes
+    collapsed stacks; mode="cprofile" traces the turn's own steps and writes
+    .pstats plus a text summary. Files are named after the trace id and go
+    to `out_dir`, by default a profiles/ directory next to the event log.
+    """
+    def __init__(self, mode="sample", turns=0, threshold_ms: Optional[float] = None,
+                 out_dir=None, interval=0.005):
+        # Resolved now, like the log sink's path, so a later chdir doesn't move it
+        self.out_dir = os.path.abspath(out_dir or os.path.join(os.path.dirname(os.path.abspath(logger.log_path)), "profiles"))
+        self.interval = interval
+        self.threshold_ms = None
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self.saved = 0
+        self.configure(mode=mode, turns=turns, threshold_ms=threshold_ms)
+
+    def configure(self, mode=None, turns=None, threshold_ms=None):
+        """Change settings at runtime (threshold_ms=0 turns threshold mode off)."""
+        if mode is not None:
+            if mode not in PROFILE_MODES:
+                raise ValueError(f"Unknown profile mode: {mode}")
+            self.mode = mode
+        if turns is not None:
+            self.arm(turns)
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms or None
+
+    def arm(self, turns: int):
+        with self._lock:
+            self._remaining = max(0, int(turns))
+
+    def disable(self):
+        self.configure(turns=0, threshold_ms=0)
+
+    @property
+    def active(self) -> bool:
+        return self._remaining > 0 or self.threshold_ms is not None
+
+    def status(self) -> str:
+        if not self.active:
+            return f"off ({self.saved} profiles saved)"
+        parts = [f"mode {self.mode}"]
+        if self._remaining:
+            parts.append(f"next {self._remaining} turn(s)")
+        if self.threshold_ms is not None:
+            parts.append(f"turns over {self.threshold_ms:g} ms")
+        return ", ".join(parts) + f"; {self.saved} saved in {self.out_dir}/"
+
+    def begin(self, trace_id, session_id=None) -> Optional[TurnProfile]:
+        """Start profiling a turn, or None when not armed (no overhead)."""
+        with self._lock:
+            forced = self._remaining > 0
+            if forced:
+                self._remaining -= 1
+            elif self.threshold_ms is None:
+                return None
+        return TurnProfile(self, trace_id, session_id, forced)
+
+    def profile_turn(self, gen, trace_id, session_id=None):
+        """Drive a turn generator under the profiler (pass-through when not armed)."""
+        profile = self.begin(trace_id, session_id)
+        if profile is None:
+            yield from gen
+            return
+        try:
+            while True:
+                profile.resume()
+                try:
+                    item = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    profile.pause()
+                yield item
+        finally:
+            gen.close()
+            self.finish(profile)
+
+    def finish(self, profile: TurnProfile) -> Optional[str]:
+        """Stop the profile; save it if forced or slower than the threshold. Returns the path stem."""
+        duration_ms = (time.perf_counter() - profile.started) * 1000
+        if profile.sampler is not None:
+            profile.sampler.stop()
+        if not profile.forced and (self.threshold_ms is None or duration_ms < self.threshold_ms):
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        stem = os.path.join(self.out_dir, f"{stamp}_{profile.trace_id or 'turn'}")
+        files = []
+        if profile.cprofile is not None:
+            profile.cprofile.dump_stats(stem + ".pstats")
+            summary = io.StringIO()
+            pstats.Stats(profile.cprofile, stream=summary).sort_stats("cumulative").print_stats(40)
+            with open(stem + ".txt", "w", encoding="utf-8") as f:
+                f.write(summary.getvalue())
+            files += [stem + ".pstats", stem + ".txt"]
+        if profile.sampler is not None:
+            with open(stem + ".collapsed", "w", encoding="utf-8") as f:
+                f.write(profile.sampler.collapsed())
+            files.append(stem + ".collapsed")
+        self.saved += 1
+        logger.log("turn_profile", {
+            "trace_id": profile.trace_id,
+            "session_id": profile.session_id,
+            "mode": profile.mode,
+            "duration_ms": round(duration_ms, 1),
+            "reason": "armed" if profile.forced else "threshold",
+            "samples": profile.sampler.samples if profile.sampler is not None else None,
+            "threads": "turn" if profile.sampler is not None else "driver",
+            "files": files,
+        })
+        return stem
@@ -1,21 +1,664 @@
 import json
 import threading
+import queue
+import atexit
+import time
+import random
+import re
+import gzip
+import shutil
 from datetime import datetime, timezone
 import os
+from agent_tools.metrics import QUEUE_DEPTH, observe_event
+
+try:
+    import zstandard as zstd  # optional: RAGIS_LOG_COMPRESS=zstd
+except ImportError:
+    zstd = None
+
+if os.name == "nt":  # pragma: no cover - Windows
+    import msvcrt
+
+    def _lock_file(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(fd):
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock_file(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
 
 SYSTEM_VERSION = "1.0.0"
 TAGGING_VERSION = "1.0.0"
 
+# What _mask_pii puts in place of a masked string
+MASKED = "[MASKED]"
+
+# Sink options, shared by every logger writing to the same file:
+#   RAGIS_LOG_ASYNC=1                  queue events, write them in batches
+#   RAGIS_LOG_QUEUE_SIZE=10000         bounded queue
+#   RAGIS_LOG_BACKPRESSURE=block|drop  when the queue is full
+#   RAGIS_LOG_FSYNC_INTERVAL=1.0       seconds between fsyncs (unset = never)
+#   RAGIS_LOG_MULTIPROCESS=1           lock the file around each write (several
+#                                      processes, e.g. Gradio workers + Backend);
+#                                      rotation by others is followed either way
+#   RAGIS_LOG_MAX_BYTES=67108864       rotate above this size (0 = never)
+#   RAGIS_LOG_ROTATE_INTERVAL=86400    rotate segments older than this (seconds, 0 = never)
+#   RAGIS_LOG_COMPRESS=gzip|zstd|none  compression of rotated segments
+#   RAGIS_LOG_BACKUP_COUNT=0           rotated segments kept (0 = all; audit logs are kept by default)
+#   RAGIS_LOG_RETENTION_DAYS=0         delete older segments (0 = keep)
+def _env_flag(name, default="0"):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+class AsyncLogWriter:
+    """
+    Group-commit writer: callers enqueue serialized lines; one thread hands
+    them to the sink in batches (one write, one flush per batch).
+
+    When the queue is full, `backpressure="block"` makes the caller wait and
+    "drop" discards the line and counts it; the count is written to the log
+    as a `log_dropped` event. A batch the sink fails to write (disk full, bad
+    descriptor, ...) is lost, counted in `write_errors` and reported as a
+    `log_write_error` event with the next batch that succeeds; the thread
+    keeps running. Pending lines are flushed at interpreter exit.
+    """
+    _SENTINEL = object()
+
+    def __init__(self, sink, max_queue=10000, batch_size=512, backpressure="block"):
+        if backpressure not in ("block", "drop"):
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.sink = sink
+        self.batch_size = batch_size
+        self.backpressure = backpressure
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+        self.lost = 0
+        self.last_error = None
+        self._reported_dropped = 0
+        self._reported_errors = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ragis-log-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, line: str) -> bool:
+        """Queue one line; returns False if it was dropped."""
+        if self._closed:
+            return False
+        if self.backpressure == "block":
+            self._queue.put(line)
+            return True
+        try:
+            self._queue.put_nowait(line)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self):
+        """Block until everything queued so far is written."""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        """Flush and stop the writer thread (idempotent)."""
+        if self._closed:
+            return
+        self._queue.put(self._SENTINEL)
+        self._thread.join()
+        self._closed = True
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is self._SENTINEL for item in batch)
+            lines = [item for item in batch if item is not self._SENTINEL]
+            try:
+                self._write_batch(lines)
+            except Exception as e:  # never lose the writer thread over one batch
+                self.write_errors += 1
+                self.lost += len(lines)
+                self.last_error = str(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def stats(self) -> dict:
+        """Counters for this writer (`lost` = lines in batches that failed to write)."""
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped,
+                "write_errors": self.write_errors, "lost": self.lost, "last_error": self.last_error}
+
+    @staticmethod
+    def _event_line(event_type, data) -> str:
+        return json.dumps({
+            "ts": datetime.utcnow().replace(tzinfo=timezone.utc).isoformat(),
+            "event_type": event_type,
+            "system_version": SYSTEM_VERSION,
+            "tagging_version": TAGGING_VERSION,
+            "data": data,
+        }) + "\n"
+
+    def _write_batch(self, lines):
+        dropped, errors = self.dropped, self.write_errors
+        if dropped != self._reported_dropped:
+            lines.append(self._event_line("log_dropped", {
+                "dropped_total": dropped, "dropped_since_last": dropped - self._reported_dropped}))
+        if errors != self._reported_errors:
+            lines.append(self._event_line("log_write_error", {
+                "errors_total": errors, "lost_total": self.lost, "last_error": self.last_error}))
+        if lines:
+            self.sink.write_lines(lines)
+            self.written += len(lines)
+        self._reported_dropped, self._reported_errors = dropped, errors
+
+# Rotated segments: <log>.<YYYYmmddTHHMMSS_ffffff>[.gz|.zst]
+_SEGMENT_RE = re.compile(r"\.(\d{8})[T_](\d{6})(?:_(\d+))?(\.gz|\.zst)?$")
+
+def rotated_segments(log_path) -> list:
+    """Rotated segments of `log_path`, oldest first (compressed or not)."""
+    log_path = os.path.abspath(log_path)
+    folder, base = os.path.split(log_path)
+    found = {}
+    try:
+        names = os.listdir(folder or ".")
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if not name.startswith(base + "."):
+            continue
+        m = _SEGMENT_RE.fullmatch(name[len(base):])
+        if m:
+            key = (m.group(1), m.group(2), (m.group(3) or "").ljust(6, "0"))
+            # While compressing, both copies exist: list the segment once.
+            if key not in found or not m.group(4):
+                found[key] = os.path.join(folder, name)
+    return [found[key] for key in sorted(found)]
+
+def _first_ts(path) -> float:
+    """Timestamp of the first record in a log file (its start time), or now."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return datetime.fromisoformat(json.loads(f.readline())["ts"]).timestamp()
+    except (OSError, ValueError, KeyError, TypeError):
+        return time.time()
+
+class _Compressor:
+    """Background thread compressing rotated segments and applying retention."""
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, sink, segment):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ragis-log-compress", daemon=True)
+                self._thread.start()
+        self._queue.put((sink, segment))
+
+    def join(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            sink, segment = self._queue.get()
+            try:
+                sink._compress(segment)
+                sink._apply_retention()
+            except Exception as e:  # never take the process down over housekeeping
+                sink.compress_errors += 1
+                sink.last_error = str(e)
+            finally:
+                self._queue.task_done()
+
+_compressor = _Compressor()
+
+class LogSink:
+    """
+    The single writer for one log file, shared by every RagisLogger that logs
+    to that path (see get_sink). Owns one append-mode descriptor and one lock,
+    so lines from different loggers never interleave.
+
+    Each batch is one os.write on an O_APPEND descriptor; in multiprocess mode
+    it is also wrapped in an exclusive file lock (flock / msvcrt.locking).
+    In both modes the path is checked (inode + size) before each batch and
+    reopened if another process (e.g. the Backend) rotated it, so lines never
+    go to a segment that is about to be compressed and deleted.
+
+    The file is rotated when it exceeds `max_bytes` or is older than
+    `rotate_interval` seconds. Rotated segments are compressed in the
+    background (gzip, or zstd when the zstandard package is installed) and
+    pruned to `backup_count` segments / `retention_days` (both opt-in; by
+    default every segment is kept).
+    """
+    def __init__(self, path, async_mode=False, multiprocess=False, max_queue=10000,
+                 backpressure="block", fsync_interval=None, max_bytes=0, rotate_interval=0,
+                 compression="gzip", backup_count=0, retention_days=0):
+        self.path = path
+        self.multiprocess = multiprocess
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.compression = compression if compression != "zstd" or zstd is not None else "gzip"
+        self.backup_count = backup_count
+        self.retention_days = retention_days
+        self.rotations = 0
+        self.compress_errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._fd = None
+        self._file_id = None
+        self._size = 0
+        self._started = time.time()
+        self._last_fsync = time.monotonic()
+        self._writer = AsyncLogWriter(self, max_queue=max_queue, backpressure=backpressure) if async_mode else None
+        # Segments left uncompressed by a previous run (e.g. killed mid-compression)
+        if self.compression != "none":
+            for segment in rotated_segments(path):
+                if not segment.endswith((".gz", ".zst")):
+                    _compressor.submit(self, segment)
+
+    def write(self, line: str):
+        if self._writer is not None:
+            self._writer.put(line)
+        else:
+            self.write_lines([line])
+
+    def write_lines(self, lines):
+        data = "".join(lines).encode("utf-8")
+        with self._lock:
+            fd = self._open()
+            if self.multiprocess:
+                _lock_file(fd)
+                try:
+                    fd = self._reopen_if_rotated(fd)
+                    fd = self._maybe_rotate(fd, len(data))
+                    self._write_all(fd, data)
+                finally:
+                    _unlock_file(fd)
+            else:
+                fd = self._reopen_if_rotated(fd)
+                fd = self._maybe_rotate(fd, len(data))
+                self._write_all(fd, data)
+            self._size += len(data)
+            if self.fsync_interval is not None and time.monotonic() - self._last_fsync >= self.fsync_interval:
+                os.fsync(fd)
+                self._last_fsync = time.monotonic()
+
+    def _open(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+            opened = os.fstat(self._fd)
+            self._size, self._file_id = opened.st_size, (opened.st_ino, opened.st_dev)
+            self._started = _first_ts(self.path) if self._size else time.time()
+        return self._fd
+
+    def _reopen_if_rotated(self, fd):
+        """Reopen the path if it is no longer our descriptor's file; refreshes the size (others append too)."""
+        # Loop: the file we reopen may itself be rotated while we wait for its lock.
+        while True:
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and (current.st_ino, current.st_dev) == self._file_id:
+                self._size = current.st_size
+                return fd
+            if self.multiprocess:
+                _unlock_file(fd)
+            self._close_fd()
+            fd = self._open()
+            if self.multiprocess:
+                _lock_file(fd)
+
+    def _maybe_rotate(self, fd, incoming):
+        """Rotate before a write that would overflow the size or age limit (lock held)."""
+        if self._size == 0:
+            return fd
+        too_big = self.max_bytes and self._size + incoming > self.max_bytes
+        too_old = self.rotate_interval and time.time() - self._started >= self.rotate_interval
+        if not (too_big or too_old):
+            return fd
+        segment = self._rotate_locked()  # closing the descriptor also drops its file lock
+        fd = self._open()
+        if self.multiprocess:
+            _lock_file(fd)
+        if segment:
+            self._schedule(segment)
+        return fd
+
+    def _rotate_locked(self, new_path=None):
+        # Rename before closing: closing drops the file lock, and a process
+        # waiting on it must already see the new file.
+        if not os.path.exists(self.path):
+            self._close_fd()
+            return None
+        new_path = new_path or f"{self.path}.{datetime.utcnow().strftime('%Y%m%dT%H%M%S_%f')}"
+        os.rename(self.path, new_path)
+        self._close_fd()
+        self.rotations += 1
+        return new_path
+
+    def _schedule(self, segment):
+        if self.compression != "none":
+            _compressor.submit(self, segment)
+        elif self.backup_count or self.retention_days:
+            _compressor.submit(self, None)
+
+    def _compress(self, segment):
+        if segment is None or not os.path.exists(segment):
+            return
+        suffix = ".zst" if self.compression == "zstd" else ".gz"
+        # Per-process temp file: another process may pick up the same leftover segment at startup.
+        target, tmp = segment + suffix, f"{segment}{suffix}.{os.getpid()}.tmp"
+        with open(segment, "rb") as src, open(tmp, "wb") as raw:
+            if suffix == ".zst":
+                with zstd.ZstdCompressor(level=10).stream_writer(raw) as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+            else:
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(tmp, target)
+        try:
+            os.remove(segment)
+        except FileNotFoundError:
+            pass
+
+    def _apply_retention(self):
+        segments = rotated_segments(self.path)
+        doomed = set()
+        if self.backup_count and len(segments) > self.backup_count:
+            doomed.update(segments[:len(segments) - self.backup_count])
+        if self.retention_days:
+            cutoff = time.time() - self.retention_days * 86400
+            doomed.update(p for p in segments if os.path.getmtime(p) < cutoff)
+        for path in doomed:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _write_all(fd, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+
+    def _close_fd(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+
+    def stats(self) -> dict:
+        """Async writer counters (if any) plus housekeeping errors."""
+        stats = self._writer.stats() if self._writer is not None else {}
+        stats.update(compress_errors=self.compress_errors, compress_last_error=self.last_error)
+        return stats
+
+    def close(self):
+        """Flush queued lines and release the descriptor (it reopens on the next write)."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        with self._lock:
+            self._close_fd()
+
+    def rotate(self, new_path=None):
+        """Rotate now; the segment is compressed in the background like automatic rotations."""
+        self.flush()
+        with self._lock:
+            segment = self._rotate_locked(new_path)
+        if segment:
+            self._schedule(segment)
+        return segment
+
+_sinks: dict = {}
+_sinks_lock = threading.Lock()
+
+def get_sink(log_path, async_mode=None, multiprocess=None, max_queue=None, backpressure=None, fsync_interval=None) -> LogSink:
+    """
+    Return the process-wide sink for `log_path`, creating it on first use.
+    Options (explicit or from RAGIS_LOG_* env vars) apply when the sink is
+    created; later loggers for the same path share it as is.
+    """
+    key = os.path.abspath(log_path)
+    with _sinks_lock:
+        sink = _sinks.get(key)
+        if sink is None:
+            if fsync_interval is None and os.getenv("RAGIS_LOG_FSYNC_INTERVAL"):
+                fsync_interval = float(os.getenv("RAGIS_LOG_FSYNC_INTERVAL"))
+            sink = _sinks[key] = LogSink(
+                key,
+                async_mode=_env_flag("RAGIS_LOG_ASYNC") if async_mode is None else async_mode,
+                multiprocess=_env_flag("RAGIS_LOG_MULTIPROCESS") if multiprocess is None else multiprocess,
+                max_queue=max_queue or int(os.getenv("RAGIS_LOG_QUEUE_SIZE", "10000")),
+                backpressure=backpressure or os.getenv("RAGIS_LOG_BACKPRESSURE", "block"),
+                fsync_interval=fsync_interval,
+                max_bytes=int(os.getenv("RAGIS_LOG_MAX_BYTES", str(64 * 1024 * 1024))),
+                rotate_interval=float(os.getenv("RAGIS_LOG_ROTATE_INTERVAL", "0")),
+                compression=os.getenv("RAGIS_LOG_COMPRESS", "gzip").lower(),
+                backup_count=int(os.getenv("RAGIS_LOG_BACKUP_COUNT", "0")),
+                retention_days=float(os.getenv("RAGIS_LOG_RETENTION_DAYS", "0")),
+            )
+        return sink
+
+def _log_queue_depths() -> dict:
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    return {f"log:{os.path.basename(s.path)}": s._writer._queue.qsize() for s in sinks if s._writer is not None}
+
+QUEUE_DEPTH.add_callback(_log_queue_depths)
+
+@atexit.register
+def close_all_sinks():
+    """Flush and close every sink (runs at interpreter exit)."""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.close()
+    # Unfinished compressions are redone by the next process that opens the log.
+
+# Per-event-type verbosity, from a JSON file (RAGIS_LOG_POLICY, default
+# ragis_log_policy.json; re-read when it changes), e.g.
+#   {"default": "always",
+#    "max_field_chars": 4000,
+#    "events": {
+#      "memory_retrieval": {"mode": "sample", "rate": 0.1,
+#                           "truncate": {"retrieved_docs": {"chars": 200, "items": 5}}},
+#      "next_task": {"mode": "summary", "interval": 60},
+#      "add_task": "off"}}
+# Modes: always | sample (kept with probability `rate`, tagged with sample_rate)
+#        | summary (one log_summary count per `interval` seconds) | off
+LOG_MODES = ("always", "sample", "summary", "off")
+
+def _rule(spec) -> dict:
+    if isinstance(spec, str):
+        spec = {"mode": spec}
+    mode = spec.get("mode", "always")
+    if mode not in LOG_MODES:
+        raise ValueError(f"Unknown log mode: {mode}")
+    rate = float(spec.get("rate", 1.0))
+    if not 0.0 <= rate <= 1.0:
+        raise ValueError(f"Sample rate must be in [0, 1], got {rate}")
+    return {"mode": mode, "rate": rate, "interval": float(spec.get("interval", 60)),
+            "truncate": dict(spec.get("truncate") or {})}
+
+def _truncate_value(value, chars=None, items=None):
+    """Cut strings to `chars` and lists to `items`, recursively, marking what was dropped."""
+    if isinstance(value, str):
+        if chars is not None and len(value) > chars:
+            return f"{value[:chars]}…[+{len(value) - chars} chars]"
+        return value
+    if isinstance(value, list):
+        kept = [_truncate_value(v, chars) for v in (value[:items] if items is not None else value)]
+        if items is not None and len(value) > items:
+            kept.append(f"…[+{len(value) - items} items]")
+        return kept
+    if isinstance(value, dict):
+        return {k: _truncate_value(v, chars) for k, v in value.items()}
+    return value
+
+class LogPolicy:
+    """
+    Per-event-type logging policy (always / sample / summary / off) plus
+    field truncation for large payloads. Loaded from a JSON file and
+    re-read when its mtime changes (checked every `check_interval` seconds),
+    so verbosity can be changed without a restart.
+    """
+    def __init__(self, path=None, rules=None, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.last_error = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._summaries: dict = {}   # event_type -> [count, window_start, write_fn]
+        self._exit_hook = False
+        self._set(rules or {})
+
+    def _set(self, rules: dict):
+        default = _rule(rules.get("default", "always"))
+        events = {name: _rule(spec) for name, spec in (rules.get("events") or {}).items()}
+        max_chars = rules.get("max_field_chars")
+        self._default, self._rules, self.max_field_chars = default, events, max_chars
+
+    def maybe_reload(self) -> bool:
+        """Re-read the file if it changed; True when the policy was (re)loaded or failed to."""
+        if self.path is None or time.monotonic() < self._next_check:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_check:
+                return False
+            self._next_check = now + self.check_interval
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._mtime:
+                return False
+            self._mtime = mtime
+        return self.reload()
+
+    def reload(self) -> bool:
+        """Load the policy file now (no file = log everything). A broken file keeps the previous policy."""
+        try:
+            rules = {}
+            if self.path is not None and os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    rules = json.load(f)
+            self._set(rules)
+            self.last_error = None
+        except (OSError, ValueError, AttributeError) as e:
+            self.last_error = str(e)
+        return True
+
+    def rule_for(self, event_type) -> dict:
+        return self._rules.get(event_type, self._default)
+
+    def count(self, event_type, rule, write_fn):
+        """Count a summarized event; returns (count, window_s) when its window closed, else None."""
+        now = time.time()
+        with self._lock:
+            entry = self._summaries.get(event_type)
+            if entry is None:
+                entry = self._summaries[event_type] = [0, now, write_fn]
+                if not self._exit_hook:
+                    # Registered late so it runs before the sinks/stores close at exit.
+                    self._exit_hook = True
+                    atexit.register(self.flush_summaries)
+            entry[0] += 1
+            entry[2] = write_fn
+            if now - entry[1] < rule["interval"]:
+                return None
+            count, started = entry[0], entry[1]
+            entry[0], entry[1] = 0, now
+        return count, now - started
+
+    def flush_summaries(self):
+        """Write the counts of still-open summary windows (also runs at exit)."""
+        now = time.time()
+        with self._lock:
+            pending = [(t, e[0], now - e[1], e[2]) for t, e in self._summaries.items() if e[0]]
+            for _, entry in self._summaries.items():
+                entry[0], entry[1] = 0, now
+        for event_type, count, window, write_fn in pending:
+            write_fn(event_type, count, window)
+
+    def truncate(self, data: dict, rule) -> dict:
+        limits, default = rule["truncate"], self.max_field_chars
+        if not limits and default is None:
+            return data
+        out = {}
+        for key, value in data.items():
+            limit = limits.get(key, default)
+            if limit is None:
+                out[key] = value
+            elif isinstance(limit, dict):
+                out[key] = _truncate_value(value, limit.get("chars", default), limit.get("items"))
+            else:
+                out[key] = _truncate_value(value, limit)
+        return out
+
+_policies: dict = {}
+_policies_lock = threading.Lock()
+
+def get_log_policy(path=None) -> LogPolicy:
+    """Return the process-wide policy for `path` (default RAGIS_LOG_POLICY), loading it on first use."""
+    key = os.path.abspath(path or os.getenv("RAGIS_LOG_POLICY", "ragis_log_policy.json"))
+    with _policies_lock:
+        policy = _policies.get(key)
+        if policy is None:
+            policy = _policies[key] = LogPolicy(key)
+    policy.maybe_reload()
+    return policy
+
 class RagisLogger:
     """
     Central log/database for memory storage, retrieval, and experiment evaluation.
     For production—swap out the simple file logger for a DB/batch/remote logger as needed.
     """
 
-    def __init__(self, log_path="ragis_events.log", pii_mask_fields=None):
+    def __init__(self, log_path="ragis_events.log", pii_mask_fields=None, async_mode=None,
+                 multiprocess=None, max_queue=None, backpressure=None, fsync_interval=None,
+                 backend=None, event_db=None, policy=None):
         self.log_path = log_path
         self.pii_mask_fields = pii_mask_fields or []
-        self._write_lock = threading.Lock()
+        # Shared verbosity policy (a LogPolicy, or the path of its JSON file)
+        self.policy = policy if isinstance(policy, LogPolicy) else get_log_policy(policy)
+        # "file" (JSONL), "sqlite" (indexed event store, see event_store.py) or "both"
+        self.backend = (backend or os.getenv("RAGIS_LOG_BACKEND", "file")).lower()
+        if self.backend not in ("file", "sqlite", "both"):
+            raise ValueError(f"Unknown log backend: {self.backend}")
+        # One sink per file for the whole process; masking stays per logger.
+        self._sink = None
+        if self.backend in ("file", "both"):
+            self._sink = get_sink(log_path, async_mode=async_mode, multiprocess=multiprocess,
+                                  max_queue=max_queue, backpressure=backpressure, fsync_interval=fsync_interval)
+        self._store = None
+        if self.backend in ("sqlite", "both"):
+            from agent_tools.event_store import get_event_store
+            self._store = get_event_store(event_db)
 
     def utc_now_iso(self):
         """Returns current UTC timestamp."""
@@ -25,32 +668,67 @@ class RagisLogger:
         """
         Main logging entrypoint.
         Scrubs/masks any configured PII fields; always adds UTC timestamp, system/tagging version.
+        The event type's policy may sample, summarize, truncate or drop it.
         Thread-safe for concurrent use.
         """
+        # Metrics count every event, whatever the policy keeps.
+        observe_event(event_type, data)
+        policy = self.policy
+        if policy.maybe_reload():
+            self._write(self._record("log_policy_loaded", {"path": policy.path, "error": policy.last_error}))
+        rule = policy.rule_for(event_type)
+        mode = rule["mode"]
+        if mode == "off":
+            return
+        if mode == "summary":
+            closed = policy.count(event_type, rule, self._write_summary)
+            if closed is not None:
+                self._write_summary(event_type, *closed)
+            return
+        if mode == "sample" and random.random() >= rule["rate"]:
+            return
         # Mask PII as configured
         masked = dict(data)
         for field in self.pii_mask_fields:
             if field in masked:
                 masked[field] = self._mask_pii(masked[field])
-        record = {
+        record = self._record(event_type, policy.truncate(masked, rule))
+        if mode == "sample":
+            record["sample_rate"] = rule["rate"]
+        self._write(record)
+
+    def _record(self, event_type, data):
+        return {
             "ts": self.utc_now_iso(),
             "event_type": event_type,
             "system_version": SYSTEM_VERSION,
             "tagging_version": TAGGING_VERSION,
-            "data": masked
+            "data": data
         }
-        self._write(record)
+
+    def _write_summary(self, event_type, count, window_s):
+        self._write(self._record("log_summary", {"summarized_event": event_type, "count": count,
+                                                 "window_s": round(window_s, 1)}))
 
     def _write(self, record):
-        """Append event to log safely."""
-        with self._write_lock:
-            with open(self.log_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(record) + "\n")
+        """Append event to the shared sink and/or the event store (batched)."""
+        line = json.dumps(record) + "\n"
+        if self._sink is not None:
+            self._sink.write(line)
+        if self._store is not None:
+            self._store.write(record, line)
+
+    def flush(self):
+        """Wait until queued events are on disk (no-op for a synchronous file sink)."""
+        if self._sink is not None:
+            self._sink.flush()
+        if self._store is not None:
+            self._store.flush()
 
     def _mask_pii(self, value):
         """Basic PII masking—replace with XXX if a string, mask dict/lists recursively."""
         if isinstance(value, str):
-            return "[MASKED]"
+            return MASKED
         elif isinstance(value, dict):
             return {k: self._mask_pii(v) for k, v in value.items()}
         elif isinstance(value, list):
@@ -97,10 +775,9 @@ class RagisLogger:
 
     def rotate_log(self):
         """
-        Rotates the log file (for daily or manual rotation). Closes and renames old file.
+        Rotates the log file now (size/time rotation happens automatically, see LogSink).
+        Returns the rotated segment's path; it is compressed in the background.
         """
-        if not os.path.exists(self.log_path):
-            return
-        ts_str = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        new_path = f"{self.log_path}.{ts_str}"
-        os.rename(self.log_path, new_path)
\ No newline at end of file
+        if self._sink is None or not os.path.exists(self.log_path):
+            return None
+        return self._sink.rotate()
\ No newline at end of file
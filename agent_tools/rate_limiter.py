@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+from agent_tools.ragis_logger import RagisLogger
+
+# Central logger for client-side rate limiting
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=[])
+
+class RateLimitTimeout(Exception):
+    """Raised when a caller waited longer than its timeout for capacity."""
+
+class TokenBucket:
+    """Continuously refilling bucket: `per_minute` units per minute, burst up to `capacity`."""
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float, now: Optional[float] = None) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill(now or time.monotonic())
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        # May go negative when settling actual usage; later callers then wait longer.
+        self.level -= amount
+
+class _Lease:
+    """Held while a call is in flight; releases its concurrency slot on exit."""
+    def __init__(self, limiter, tokens, waited):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.waited = waited
+        self._released = False
+
+    def settle(self, actual_tokens: int):
+        """Correct the token bucket with the call's real usage."""
+        with self.limiter._cond:
+            self.limiter._tpm.take(actual_tokens - self.tokens)
+            self.tokens = actual_tokens
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.limiter._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class RateLimiter:
+    """
+    Shared client-side limiter for one OpenAI endpoint (chat or embeddings):
+    requests/minute and tokens/minute token buckets plus a concurrency cap.
+
+    Waiting callers are served round-robin across sessions (FIFO within a
+    session), so one busy session cannot starve the others. estimate_wait()
+    tells a caller roughly how long it would queue; snapshot() exposes the
+    current state for tuning against the account quota.
+    """
+    def __init__(self, name: str, rpm: int = 500, tpm: int = 200_000, max_concurrency: int = 8):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._rpm = TokenBucket(rpm)
+        self._tpm = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting: "OrderedDict[str, deque]" = OrderedDict()
+        self._paused_until = 0.0
+        self.stats = {"granted": 0, "waited": 0, "wait_ms_total": 0.0, "timeouts": 0, "backoffs": 0}
+
+    def acquire(self, session_id: str = "default", tokens: int = 1, timeout: Optional[float] = 120.0) -> _Lease:
+        """
+        Block until this caller may issue a request of ~`tokens` tokens.
+        Use as `with limiter.acquire(session_id, tokens) as lease: ...`.
+        """
+        ticket = object()
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        with self._cond:
+            self._waiting.setdefault(session_id, deque()).append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._grant_delay(session_id, ticket, tokens, now)
+                    if delay == 0.0:
+                        break
+                    if deadline is not None and now >= deadline:
+                        self.stats["timeouts"] += 1
+                        logger.log("rate_limit_timeout", {"limiter": self.name, "session_id": session_id, "waited_ms": round((now - started) * 1000, 1)})
+                        raise RateLimitTimeout(f"{self.name}: no capacity after {timeout:g}s")
+                    wait = 1.0 if delay is None else delay
+                    if deadline is not None:
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(max(wait, 0.01))
+            finally:
+                self._dequeue(session_id, ticket)
+                self._cond.notify_all()
+            self._rpm.take(1)
+            self._tpm.take(tokens)
+            self._in_flight += 1
+            waited = time.monotonic() - started
+            self.stats["granted"] += 1
+            if waited > 0.05:
+                self.stats["waited"] += 1
+                self.stats["wait_ms_total"] += waited * 1000
+        if waited > 0.05:
+            logger.log("rate_limit_wait", {"limiter": self.name, "session_id": session_id,
+                                           "waited_ms": round(waited * 1000, 1), "tokens": tokens})
+        return _Lease(self, tokens, waited)
+
+    def _grant_delay(self, session_id, ticket, tokens, now) -> Optional[float]:
+        """0.0 if the ticket may go now, seconds to wait for buckets, or None to wait for a notify."""
+        if next(iter(self._waiting)) != session_id or self._waiting[session_id][0] is not ticket:
+            return None
+        if self._in_flight >= self.max_concurrency:
+            return None
+        return max(self._paused_until - now, self._rpm.time_until(1, now), self._tpm.time_until(tokens, now), 0.0)
+
+    def _dequeue(self, session_id, ticket):
+        queue = self._waiting.get(session_id)
+        if queue is None:
+            return
+        was_head = queue and queue[0] is ticket
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiting[session_id]
+        elif was_head:
+            # Served one request for this session: it goes to the back of the rotation.
+            self._waiting.move_to_end(session_id)
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def backoff(self, seconds: float):
+        """Pause all grants (e.g. after the server answered 429)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.stats["backoffs"] += 1
+        logger.log("rate_limit_backoff", {"limiter": self.name, "seconds": seconds})
+
+    def estimate_wait(self, session_id: str = "default", tokens: int = 1) -> float:
+        """Rough seconds a new request from `session_id` would queue right now."""
+        with self._cond:
+            now = time.monotonic()
+            ahead = sum(len(q) for q in self._waiting.values())
+            return max(
+                self._paused_until - now,
+                self._rpm.time_until(ahead + 1, now),
+                self._tpm.time_until(tokens * (ahead + 1), now),
+                0.0,
+            )
+
+    def snapshot(self) -> dict:
+        """Current limiter state, for logs, metrics and tuning."""
+        with self._cond:
+            now = time.monotonic()
+            self._rpm._refill(now)
+            self._tpm._refill(now)
+            return {
+                "limiter": self.name,
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "waiting": sum(len(q) for q in self._waiting.values()),
+                "waiting_sessions": len(self._waiting),
+                "requests_available": round(self._rpm.level, 1),
+                "rpm": round(self._rpm.rate * 60),
+                "tokens_available": round(self._tpm.level),
+                "tpm": round(self._tpm.rate * 60),
+                "paused_s": round(max(self._paused_until - now, 0.0), 1),
+                **self.stats,
+                "wait_ms_total": round(self.stats["wait_ms_total"], 1),
+            }
@@ -4,6 +4,7 @@ import glob
 from datetime import datetime
 from typing import Dict, Any, Optional
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.pending import register_pending, set_pending, peek_pending, pop_pending
 
 # Central logger for restore actions
 logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['target_path', 'backup_path'])
@@ -18,7 +19,7 @@ def list_file_backups(args: Dict[str, Any], session_state: dict) -> str:
     found = sorted(glob.glob(pattern), reverse=True)
     if not found:
         return f"No backups found for {target}."
-    session_state['pending_backup_restore'] = found
+    set_pending(session_state, "backup_restore", found)
     backup_msg = "\n".join(f"[{i}] {os.path.basename(fp)} ({fp})" for i, fp in enumerate(found))
     logger.log("list_file_backups", {"target_path": target, "backups_found": found[:10]})
     return (
@@ -26,12 +27,13 @@ def list_file_backups(args: Dict[str, Any], session_state: dict) -> str:
         "Reply with the index number to restore, or 'cancel' to skip."
     )
 
+@register_pending("backup_restore")
 def handle_pending_backup_restore(user_message: str, session_state: dict) -> Optional[str]:
     """
     Restore a selected backup file over its original.
     """
-    if session_state.get('pending_backup_restore'):
-        found = session_state.pop('pending_backup_restore')
+    if peek_pending(session_state, "backup_restore"):
+        found = pop_pending(session_state, "backup_restore")
 
         if user_message.strip().lower() == "cancel":
             logger.log("restore_cancelled", {})
@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+import numpy as np
+import pandas as pd
+from agent_tools.log_reader import iter_events
+from agent_tools.index_profiles import current_profile
+
+STRATEGIES = ("standard", "pure", "rarest", "hybrid")
+
+# What RagisLogger writes in place of a masked string (query_text is masked by MemoryRetriever)
+MASKED = "[MASKED]"
+
+def load_queries(log_path="ragis_events.log", since=None, until=None, limit=None, db=None) -> pd.DataFrame:
+    """
+    Logged memory_retrieval records (rotated segments included, or the event
+    store with `db`) as a frame: ts, query_text, context_tags, strategy,
+    retrieved_ids, result_count.
+    """
+    if db:
+        from agent_tools.event_store import get_event_store
+        events = get_event_store(db).query(event_types=["memory_retrieval"], since=since, until=until, limit=None)
+    else:
+        events = iter_events(log_path, event_types=["memory_retrieval"], since=since, until=until)
+    rows = []
+    for ev in events:
+        data = ev.get("data")
+        if not isinstance(data, dict):
+            continue
+        rows.append({
+            "ts": ev.get("ts"),
+            "query_text": data.get("query_text"),
+            "context_tags": list(data.get("context_tags") or []),
+            "strategy": data.get("strategy"),
+            "retrieved_ids": list(data.get("retrieved_ids") or []),
+            "result_count": data.get("result_count"),
+        })
+    frame = pd.DataFrame(rows, columns=["ts", "query_text", "context_tags", "strategy", "retrieved_ids", "result_count"])
+    return frame.tail(limit).reset_index(drop=True) if limit else frame
+
+def _epoch(ts) -> float:
+    try:
+        return datetime.fromisoformat(ts).timestamp()
+    except (TypeError, ValueError):
+        return float("nan")
+
+class CollectionSnapshot:
+    """
+    A collection loaded into NumPy: float32 embedding matrix, ids, major
+    categories, timestamps and per-tag row indexes, for exact (brute-force)
+    neighbours and vectorized where-clause masks.
+    """
+    def __init__(self, collection, batch_size=10000):
+        ids, embeddings, metadatas = [], [], []
+        for offset in range(0, collection.count(), batch_size):
+            page = collection.get(include=["embeddings", "metadatas"], limit=batch_size, offset=offset)
+            ids += page["ids"]
+            embeddings += list(page["embeddings"])
+            metadatas += [m or {} for m in page["metadatas"]]
+        self.ids = np.array(ids, dtype=object)
+        self.row = {doc_id: i for i, doc_id in enumerate(ids)}
+        self.embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        self.categories = np.array([m.get("major_category") for m in metadatas], dtype=object)
+        self.timestamps = np.array([_epoch(m.get("timestamp")) for m in metadatas], dtype=np.float64)
+        tag_rows: dict = {}
+        for i, meta in enumerate(metadatas):
+            for tag in meta.get("metatags") or []:
+                tag_rows.setdefault(tag, []).append(i)
+        self.tag_rows = {tag: np.array(rows, dtype=np.int64) for tag, rows in tag_rows.items()}
+        self.space = current_profile(collection).get("space", "l2")
+        self._norms = np.linalg.norm(self.embeddings, axis=1) if self.space == "cosine" else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def recent_mask(self, days, now=None) -> np.ndarray:
+        """Rows inside MemoryRetriever's recency window (same whole-day rule)."""
+        now = (now or datetime.now(timezone.utc)).timestamp()
+        return (now - self.timestamps) < (days + 1) * 86400.0
+
+    def _tag_mask(self, tag) -> np.ndarray:
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.tag_rows.get(tag, np.empty(0, dtype=np.int64))] = True
+        return mask
+
+    def where_mask(self, where) -> np.ndarray:
+        """Rows matching a retriever where clause ($and/$or, $in on category, $contains on metatags)."""
+        if not where:
+            return np.ones(len(self), dtype=bool)
+        if "$and" in where:
+            return np.logical_and.reduce([self.where_mask(w) for w in where["$and"]])
+        if "$or" in where:
+            return np.logical_or.reduce([self.where_mask(w) for w in where["$or"]])
+        (field, cond), = where.items()
+        if field == "metatags":
+            return self._tag_mask(cond["$contains"] if isinstance(cond, dict) else cond)
+        column = self.categories if field == "major_category" else None
+        if column is None:
+            raise ValueError(f"Unsupported filter field: {field}")
+        if isinstance(cond, dict) and "$in" in cond:
+            return np.isin(column, list(cond["$in"]))
+        return column == (cond.get("$eq") if isinstance(cond, dict) else cond)
+
+    def distances(self, query) -> np.ndarray:
+        """Distances in the collection's space (Chroma's l2 is squared L2)."""
+        q = np.asarray(query, dtype=np.float32)
+        if self.space == "cosine":
+            return 1.0 - (self.embeddings @ q) / (self._norms * (np.linalg.norm(q) or 1.0) + 1e-12)
+        if self.space == "ip":
+            return 1.0 - self.embeddings @ q
+        diff = self.embeddings - q
+        return np.einsum("ij,ij->i", diff, diff)
+
+    def exact_top_k(self, query, k, mask=None) -> list:
+        """Ids of the k nearest rows (within `mask`), nearest first."""
+        dist = self.distances(query)
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+        if len(rows) == 0:
+            return []
+        if len(rows) > k:
+            rows = rows[np.argpartition(dist[rows], k - 1)[:k]]
+        return list(self.ids[rows[np.argsort(dist[rows])]])
+
+    def centroid(self, doc_ids) -> Optional[np.ndarray]:
+        """Mean embedding of the rows still present, or None."""
+        rows = [self.row[d] for d in doc_ids if d in self.row]
+        return self.embeddings[rows].mean(axis=0) if rows else None
+
+class _CaptureLogger:
+    """Stands in for the retriever's RagisLogger: keeps the last retrieval record instead of logging it."""
+    def __init__(self):
+        self.record = None
+
+    def log_retrieval(self, record):
+        self.record = record
+
+    def log(self, event_type, data):
+        pass
+
+def _overlap(got, expected) -> float:
+    if not expected:
+        return float("nan")
+    return len(set(got) & set(expected)) / len(expected)
+
+def evaluate(queries: pd.DataFrame, retriever, snapshot: CollectionSnapshot, strategies=STRATEGIES, k=10,
+             use_recent_days=90, min_tag_freq=10, embed_fn: Optional[Callable] = None) -> pd.DataFrame:
+    """
+    Re-run each logged query under every strategy; one row per (query, strategy).
+
+    The query vector is embed_fn(query_text) when the text was logged
+    unmasked and embed_fn is given, otherwise the centroid of the memories
+    the query originally retrieved (a proxy: it favours the logged result
+    set, so overlap_logged is an upper bound). Columns: recall (top-k vs
+    exact neighbours in the recency window), filter_recall (vs exact
+    neighbours inside the strategy's own filter, i.e. index loss),
+    overlap_logged, result_count, candidates (rows passing the filter),
+    latency_ms.
+    """
+    capture = _CaptureLogger()
+    original_logger, retriever.logger = retriever.logger, capture
+    recent = snapshot.recent_mask(use_recent_days)
+    rows = []
+    try:
+        for qi, q in queries.iterrows():
+            text = q["query_text"] if isinstance(q["query_text"], str) else ""
+            if embed_fn is not None and text and text != MASKED:
+                vector, source = np.asarray(embed_fn(text), dtype=np.float32), "text"
+            else:
+                vector, source = snapshot.centroid(q["retrieved_ids"]), "centroid"
+            if vector is None:
+                continue  # nothing to rebuild the query from
+            truth = snapshot.exact_top_k(vector, k, recent)
+            for strategy in strategies:
+                started = time.perf_counter()
+                retriever.retrieve_memories(
+                    vector.tolist(), q["context_tags"], text, use_recent_days=use_recent_days,
+                    min_tag_freq=min_tag_freq, experiment_mode=None if strategy == "standard" else strategy,
+                    log_context={"evaluation": True},
+                )
+                latency_ms = (time.perf_counter() - started) * 1000
+                record = capture.record or {}
+                got = list(record.get("retrieved_ids") or [])[:k]
+                allowed = recent if strategy == "hybrid" else recent & snapshot.where_mask(record.get("filter_query"))
+                rows.append({
+                    "query": qi,
+                    "strategy": strategy,
+                    "query_source": source,
+                    "resolved": record.get("strategy"),
+                    "recall": _overlap(got, truth),
+                    "filter_recall": _overlap(got, snapshot.exact_top_k(vector, k, allowed)),
+                    "overlap_logged": _overlap(got, q["retrieved_ids"][:k]),
+                    "result_count": record.get("result_count", 0),
+                    "candidates": int(allowed.sum()),
+                    "latency_ms": latency_ms,
+                })
+    finally:
+        retriever.logger = original_logger
+    return pd.DataFrame(rows)
+
+def summarize(results: pd.DataFrame) -> pd.DataFrame:
+    """Per-strategy means and latency / candidate-set percentiles, best recall first."""
+    if results.empty:
+        return results
+    summary = results.groupby("strategy").agg(
+        queries=("query", "count"),
+        recall=("recall", "mean"),
+        filter_recall=("filter_recall", "mean"),
+        overlap_logged=("overlap_logged", "mean"),
+        results_mean=("result_count", "mean"),
+        candidates_p50=("candidates", "median"),
+        candidates_p95=("candidates", lambda s: s.quantile(0.95)),
+        latency_p50_ms=("latency_ms", "median"),
+        latency_p95_ms=("latency_ms", lambda s: s.quantile(0.95)),
+        latency_p99_ms=("latency_ms", lambda s: s.quantile(0.99)),
+    )
+    return summary.sort_values(["recall", "latency_p95_ms"], ascending=[False, True])
+
+# --- CLI: python -m agent_tools.retrieval_eval ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run logged retrievals under each strategy against a snapshot of the memory store.")
+    parser.add_argument("--log", default="ragis_events.log", help="JSONL log (rotated segments included)")
+    parser.add_argument("--events-db", help="Read queries from this event store instead of the log")
+    parser.add_argument("--since", help="ISO timestamp")
+    parser.add_argument("--until", help="ISO timestamp")
+    parser.add_argument("--limit", type=int, default=500, help="Most recent N queries (0 = all)")
+    parser.add_argument("--store", default="datastore", help="Memory store directory (Chroma)")
+    parser.add_argument("--collection", default="memory")
+    parser.add_argument("--synonyms", default="synonyms.json")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES))
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--recent-days", type=int, default=90)
+    parser.add_argument("--min-tag-freq", type=int, default=10)
+    parser.add_argument("--no-snapshot", action="store_true", help="Query the store in place instead of a copy")
+    parser.add_argument("--embed", action="store_true",
+                        help="Embed unmasked query text with OpenAI (OPENAI_API_KEY) instead of the centroid proxy")
+    parser.add_argument("--output", help="Write the per-strategy summary as JSON")
+    parser.add_argument("--csv", help="Write the per-query results as CSV")
+    args = parser.parse_args(argv)
+
+    queries = load_queries(args.log, args.since, args.until, args.limit or None, args.events_db)
+    if queries.empty:
+        print("No memory_retrieval events found.")
+        return
+    strategies = [s for s in args.strategies.split(",") if s]
+    unknown = set(strategies) - set(STRATEGIES)
+    if unknown:
+        parser.error(f"unknown strategies: {', '.join(sorted(unknown))}")
+
+    embed_fn = None
+    if args.embed:
+        from langchain_openai import OpenAIEmbeddings
+        embed_fn = OpenAIEmbeddings(model="text-embedding-3-small").embed_query
+
+    store, synonyms = os.path.abspath(args.store), os.path.abspath(args.synonyms)
+    output = os.path.abspath(args.output) if args.output else None
+    csv_path = os.path.abspath(args.csv) if args.csv else None
+    scratch = tempfile.mkdtemp(prefix="omni_retrieval_eval_")
+    cwd = os.getcwd()
+    try:
+        if not args.no_snapshot:
+            # Evaluate a frozen copy so the agent can keep writing meanwhile
+            store = shutil.copytree(store, os.path.join(scratch, "store"))
+        # Spans and retriever logs go to the scratch dir, not the log being evaluated.
+        os.chdir(scratch)
+        from agent_tools.memory_retriever import MemoryRetriever
+        retriever = MemoryRetriever(db_path=store, collection_name=args.collection, synonyms_path=synonyms,
+                                    log_path=os.path.join(scratch, "eval_events.log"))
+        snapshot = CollectionSnapshot(retriever.collection)
+        print(f"{len(queries)} logged queries, {len(snapshot)} memories in {args.collection}", file=sys.stderr)
+        results = evaluate(queries, retriever, snapshot, strategies, args.k, args.recent_days, args.min_tag_freq, embed_fn)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    summary = summarize(results)
+    if summary.empty:
+        print("No query could be rebuilt (no logged text or retrieved ids found in the store).")
+        return
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.3f}".format):
+        print(summary)
+    print(f"\nBest recall@{args.k}: {summary.index[0]} "
+          f"({summary['recall'].iloc[0]:.3f}, p95 {summary['latency_p95_ms'].iloc[0]:.1f} ms)")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"k": args.k, "queries": len(queries), "strategies": summary.reset_index().to_dict("records")},
+                      f, indent=2, default=float)
+    if csv_path:
+        results.to_csv(csv_path, index=False)
+
+if __name__ == "__main__":
+    main()
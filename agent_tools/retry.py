@@ -0,0 +1,243 @@
+import asyncio
+import inspect
+import random
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional
+from agent_tools.ragis_logger import RagisLogger
+
+# Central logger for retries and circuit breaker transitions
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=[])
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a target whose circuit breaker is open."""
+    def __init__(self, target, retry_in):
+        super().__init__(f"Circuit open for '{target}' (retry in {retry_in:.0f}s)")
+        self.target = target
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """
+    Per-target breaker: after `failure_threshold` consecutive failures the
+    circuit opens and calls fail fast for `reset_timeout` seconds; then one
+    trial call is let through (half-open) and its outcome closes or re-opens it.
+    """
+    def __init__(self, target, failure_threshold=5, reset_timeout=30.0):
+        self.target = target
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return
+            raise CircuitOpenError(self.target, max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.log("circuit_closed", {"target": self.target})
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def release_trial(self):
+        """The call ended without saying anything about the target; let the next one be the trial."""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._trial = False
+                logger.log("circuit_open", {"target": self.target, "failures": self.failures, "reset_timeout": self.reset_timeout})
+
+_breakers: dict = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(target: str, failure_threshold=5, reset_timeout=30.0) -> CircuitBreaker:
+    """Return the process-wide breaker for `target`, creating it on first use."""
+    with _breakers_lock:
+        breaker = _breakers.get(target)
+        if breaker is None:
+            breaker = _breakers[target] = CircuitBreaker(target, failure_threshold, reset_timeout)
+        return breaker
+
+# --- Result classifiers ---
+
+def exit_code_in(codes: Iterable[int] = (), stderr_patterns: Iterable[str] = ()) -> Callable[[Any], bool]:
+    """Classify a CompletedProcess as retryable by exit code and/or stderr text."""
+    codes, patterns = set(codes), [p.lower() for p in stderr_patterns]
+    def check(result) -> bool:
+        code = getattr(result, "returncode", 0)
+        if not code:
+            return False
+        if code in codes:
+            return True
+        stderr = (getattr(result, "stderr", "") or "").lower()
+        return any(p in stderr for p in patterns)
+    return check
+
+def status_in(statuses: Iterable[int] = (408, 425, 429, 500, 502, 503, 504)) -> Callable[[Any], bool]:
+    """Classify an HTTP response as retryable by status code."""
+    statuses = set(statuses)
+    return lambda response: getattr(response, "status_code", None) in statuses
+
+# Connection / timeout errors of HTTP clients that are not imported here
+# (openai, httpx, requests), matched by class name anywhere in the MRO.
+_TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException",
+                          "ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout"}
+
+def transient_http_error(exc) -> bool:
+    """HTTP 408/409/429/5xx, or a connection/timeout error; other exceptions without a status are not transient."""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(exc).__mro__)
+
+def _retry_after(result) -> Optional[float]:
+    headers = getattr(result, "headers", None) or {}
+    value = headers.get("Retry-After") if hasattr(headers, "get") else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+class RetryPolicy:
+    """
+    Retry with exponential backoff and full jitter.
+
+    An attempt is retried when it raises one of `retry_on` (and none of
+    `no_retry_on`, and `retry_if_exception` agrees), or when `retry_if_result(result)` is true (non-zero git
+    exit, HTTP 429/5xx, ...). When attempts run out, the last exception is
+    raised or the last result returned. A Retry-After header, when present,
+    sets the delay (capped at max_delay).
+
+    With `breaker=True`, each target gets a CircuitBreaker: failed attempts
+    count towards opening it, and an open circuit raises CircuitOpenError
+    without calling. Exceptions in `no_retry_on` (caller-side conditions
+    such as a client rate-limit timeout) neither trip nor reset it, and
+    neither do results matching `breaker_ignore_if_result` (e.g. a git
+    command failing on auth or a conflict, which says nothing about the remote).
+    """
+    def __init__(self, name="call", max_attempts=3, base_delay=0.5, max_delay=20.0, multiplier=2.0,
+                 retry_on=(Exception,), no_retry_on=(), retry_if_result: Optional[Callable[[Any], bool]] = None,
+                 retry_if_exception: Optional[Callable[[Exception], bool]] = None, breaker=False, failure_threshold=5, reset_timeout=30.0,
+                 breaker_ignore_if_result: Optional[Callable[[Any], bool]] = None):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.retry_on = tuple(retry_on)
+        self.no_retry_on = tuple(no_retry_on) + (CircuitOpenError,)
+        self.retry_if_result = retry_if_result
+        self.retry_if_exception = retry_if_exception
+        self.breaker = breaker
+        self.breaker_ignore_if_result = breaker_ignore_if_result
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    def delay_for(self, attempt: int, result=None) -> float:
+        """Backoff before the attempt after `attempt` (1-based)."""
+        hinted = _retry_after(result)
+        if hinted is not None:
+            return min(self.max_delay, hinted)
+        cap = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return random.uniform(0, cap)
+
+    def _breaker(self, target):
+        if not self.breaker:
+            return None
+        return get_breaker(target or self.name, self.failure_threshold, self.reset_timeout)
+
+    def _classify(self, outcome, is_error) -> bool:
+        if is_error:
+            return (isinstance(outcome, self.retry_on) and not isinstance(outcome, self.no_retry_on)
+                    and (self.retry_if_exception is None or self.retry_if_exception(outcome)))
+        return bool(self.retry_if_result and self.retry_if_result(outcome))
+
+    def _record(self, attempt, target, outcome, is_error, delay):
+        reason = str(outcome) if is_error else f"retryable result ({getattr(outcome, 'returncode', getattr(outcome, 'status_code', '?'))})"
+        if attempt < self.max_attempts:
+            logger.log("retry_attempt", {"policy": self.name, "target": target, "attempt": attempt,
+                                         "delay_s": round(delay, 3), "reason": reason[:300]})
+        else:
+            logger.log("retry_exhausted", {"policy": self.name, "target": target, "attempts": attempt, "reason": reason[:300]})
+
+    def _after_attempt(self, attempt, target, breaker, outcome, is_error):
+        """Shared bookkeeping; returns the delay before the next attempt, or None to stop."""
+        retryable = self._classify(outcome, is_error)
+        if breaker is not None and is_error and isinstance(outcome, self.no_retry_on):
+            breaker.release_trial()  # not the target's fault
+        elif breaker is not None and not (retryable or is_error) and self.breaker_ignore_if_result \
+                and self.breaker_ignore_if_result(outcome):
+            breaker.release_trial()  # a failure, but not the target's
+        elif breaker is not None and (retryable or is_error):
+            breaker.record_failure()
+        elif breaker is not None:
+            breaker.record_success()
+        if not retryable:
+            if attempt > 1 and not is_error:
+                logger.log("retry_recovered", {"policy": self.name, "target": target, "attempts": attempt})
+            return None
+        delay = self.delay_for(attempt, None if is_error else outcome)
+        self._record(attempt, target, outcome, is_error, delay)
+        return delay if attempt < self.max_attempts else None
+
+    def call(self, fn: Callable[[], Any], target: Optional[str] = None) -> Any:
+        """Run the zero-argument `fn` under this policy (blocking backoff)."""
+        breaker = self._breaker(target)
+        for attempt in range(1, self.max_attempts + 1):
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                outcome, is_error = fn(), False
+            except Exception as e:
+                outcome, is_error = e, True
+            delay = self._after_attempt(attempt, target, breaker, outcome, is_error)
+            if delay is None:
+                if is_error:
+                    raise outcome
+                return outcome
+            time.sleep(delay)
+
+    async def acall(self, fn: Callable[[], Any], target: Optional[str] = None) -> Any:
+        """Async variant: `fn` may return an awaitable; backoff uses asyncio.sleep."""
+        breaker = self._breaker(target)
+        for attempt in range(1, self.max_attempts + 1):
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                outcome = fn()
+                if inspect.isawaitable(outcome):
+                    outcome = await outcome
+                is_error = False
+            except Exception as e:
+                outcome, is_error = e, True
+            delay = self._after_attempt(attempt, target, breaker, outcome, is_error)
+            if delay is None:
+                if is_error:
+                    raise outcome
+                return outcome
+            await asyncio.sleep(delay)
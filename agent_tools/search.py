@@ -3,6 +3,7 @@ import subprocess
 from datetime import datetime
 from typing import Any, Dict, Optional
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.pending import register_pending, peek_pending, pop_pending
 
 MAX_RIPGREP_LINES = 40
 MAX_CTAGS_RESULTS = 30
@@ -47,12 +48,13 @@ def code_search_ripgrep(args: Dict[str, Any], session_state: dict) -> str:
         })
         return f"ripgrep search error: {e}"
 
+@register_pending("code_search")
 def handle_pending_code_search(user_message: str, session_state: dict) -> Optional[str]:
     """
     Handle approval and execution of a pending ripgrep code search.
     """
-    if session_state.get('pending_code_search'):
-        pattern, project_dir = session_state.pop('pending_code_search')
+    if peek_pending(session_state, "code_search"):
+        pattern, project_dir = pop_pending(session_state, "code_search")
         auto_approve = session_state.get("global_approval", False)
 
         if auto_approve or is_affirmative(user_message):
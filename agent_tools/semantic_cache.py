@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+import uuid
+from typing import Iterable, Optional
+from agent_tools.ragis_logger import RagisLogger
+
+# Central logger for cache lookups (PII: the cached prompt/response text)
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['prompt', 'response'])
+
+def context_hash(*parts) -> str:
+    """Stable hash of everything besides the question that shapes the answer."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (list, tuple, set, frozenset)):
+            part = "\x1f".join(sorted(map(str, part)))
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()[:32]
+
+def reply_context_hash(model, system_prompt, tool_names, scope) -> str:
+    """
+    Context hash for a chat reply: model, system prompt, tools and the scope
+    (session or user) that may see it. Recalled memories, history and the
+    rolling summary change on every turn (each question is itself stored as
+    a memory), so they are left out; the scope keeps one user's replies from
+    being served to another, and the TTL bounds how stale a reply can get.
+    """
+    return context_hash(model, system_prompt, list(tool_names), scope)
+
+class SemanticCache:
+    """
+    Opt-in semantic cache of agent replies in a dedicated Chroma collection.
+
+    Entries are (prompt embedding, context hash, response). A lookup hits when
+    the nearest entry with the same context hash is within `threshold` cosine
+    similarity and younger than `ttl_seconds`. Callers scope the hash to the
+    session or user (see reply_context_hash), so one user's reply is never
+    served to another. Replies from turns that called a side-effecting tool
+    are never stored (`bypass_tools`; None = any tool).
+    Very short messages ("and the second one?") depend on the conversation,
+    so they are neither looked up nor stored.
+    """
+    def __init__(self, client, collection_name="response_cache", threshold=0.95,
+                 ttl_seconds=24 * 3600, bypass_tools: Optional[Iterable[str]] = None, min_words=4):
+        self.collection = client.get_or_create_collection(collection_name, metadata={"hnsw:space": "cosine"})
+        self.collection_name = collection_name
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.bypass_tools = set(bypass_tools) if bypass_tools is not None else None
+        self.min_words = min_words
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "bypassed": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._stores_since_purge = 0
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def cacheable(self, message: str) -> bool:
+        """Whether a message is self-contained enough to answer from cache."""
+        return len(message.split()) >= self.min_words
+
+    def lookup(self, embedding, ctx_hash: str) -> Optional[dict]:
+        """Return {"response", "similarity", "age_s"} for a hit, else None."""
+        self._count("lookups")
+        now = time.time()
+        try:
+            result = self.collection.query(
+                query_embeddings=[embedding],
+                n_results=1,
+                where={"$and": [{"context_hash": ctx_hash}, {"expires_at": {"$gt": now}}]},
+                include=["documents", "metadatas", "distances"],
+            )
+        except Exception as e:
+            self._count("errors")
+            logger.log("semantic_cache_error", {"op": "lookup", "error": str(e)})
+            return None
+        ids = (result.get("ids") or [[]])[0]
+        if not ids:
+            self._count("misses")
+            logger.log("semantic_cache", {"hit": False, "similarity": None})
+            return None
+        similarity = 1.0 - result["distances"][0][0]
+        meta = result["metadatas"][0][0] or {}
+        if similarity < self.threshold:
+            self._count("misses")
+            logger.log("semantic_cache", {"hit": False, "similarity": round(similarity, 4)})
+            return None
+        self._count("hits")
+        age = now - meta.get("created_at", now)
+        logger.log("semantic_cache", {"hit": True, "similarity": round(similarity, 4), "age_s": round(age), "entry_id": ids[0]})
+        return {"response": result["documents"][0][0], "similarity": similarity, "age_s": age}
+
+    def should_store(self, called_tools: Iterable[str]) -> bool:
+        """False when the turn used a tool whose effects must not be replayed."""
+        called = set(called_tools or ())
+        if not called:
+            return True
+        if self.bypass_tools is None:
+            return False
+        return not (called & self.bypass_tools)
+
+    def store(self, embedding, ctx_hash: str, prompt: str, response: str, called_tools=()):
+        """Cache a reply (skipped for empty replies and side-effecting turns)."""
+        if not response or not self.should_store(called_tools):
+            self._count("bypassed")
+            return
+        now = time.time()
+        try:
+            self.collection.add(
+                embeddings=[embedding],
+                ids=[str(uuid.uuid4())],
+                documents=[response],
+                metadatas=[{"context_hash": ctx_hash, "created_at": now,
+                            "expires_at": now + self.ttl_seconds, "prompt": prompt[:500]}],
+            )
+        except Exception as e:
+            self._count("errors")
+            logger.log("semantic_cache_error", {"op": "store", "error": str(e)})
+            return
+        self._count("stores")
+        with self._lock:
+            self._stores_since_purge += 1
+            purge = self._stores_since_purge >= 100
+            if purge:
+                self._stores_since_purge = 0
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self):
+        """Delete entries past their TTL."""
+        try:
+            self.collection.delete(where={"expires_at": {"$lt": time.time()}})
+        except Exception as e:
+            logger.log("semantic_cache_error", {"op": "purge", "error": str(e)})
+
+    def clear(self):
+        """Drop every cached reply (e.g. after changing the system prompt or tools)."""
+        self.collection.delete(where={"expires_at": {"$gt": 0}})
+
+    def metrics(self) -> dict:
+        """Counters plus hit rate, for logs and the chat `cache stats` command."""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["threshold"] = self.threshold
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
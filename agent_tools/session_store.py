@@ -0,0 +1,245 @@
+import json
+import sqlite3
+import threading
+import time
+import contextvars
+from agent_tools.ragis_logger import RagisLogger
+from agent_tools.task_manager import TaskManager
+from agent_tools.task_queue import SQLiteTaskQueue
+
+DEFAULT_TTL_SECONDS = 4 * 3600
+
+# State keys that hold PINs; never written to disk.
+UNPERSISTED_KEYS = {"pin", "pending_secret_pin"}
+
+# Central logger for session lifecycle events
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=[])
+
+# Session serving the current turn (set by SessionStore.bound()).
+_current_session = contextvars.ContextVar("omni_current_session", default=None)
+
+class Session:
+    """
+    Per-user agent state: PIN/unlock status, conversational state
+    (pending approvals, flags) and the task queue.
+    """
+    def __init__(self, session_id, state=None, unlocked=False, pin=None, task_manager=None):
+        self.session_id = session_id
+        self.state = state if state is not None else self.default_state(session_id)
+        self.unlocked = unlocked
+        self.pin = pin
+        self.task_manager = task_manager or TaskManager(context=self.state)
+        self.last_seen = time.time()
+
+    @staticmethod
+    def default_state(session_id) -> dict:
+        return {"session_id": session_id, "global_approval": False}
+
+    def touch(self):
+        self.last_seen = time.time()
+
+    def close(self):
+        """Release the session's task manager (running tasks finish first)."""
+        self.task_manager.close()
+
+def current_session():
+    """Return the Session serving the current turn, or None outside a turn."""
+    return _current_session.get()
+
+def current_state() -> dict:
+    """Return the current session's state dict (empty dict outside a turn)."""
+    session = _current_session.get()
+    return session.state if session is not None else {}
+
+class SessionStore:
+    """
+    In-memory, session-keyed store with TTL eviction.
+    Idle sessions (no turn for `ttl_seconds`) are dropped on the next sweep.
+    """
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+
+    def get(self, session_id) -> Session:
+        """Return the session for `session_id`, creating it on first use."""
+        self._maybe_sweep()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._load(session_id) or self._new_session(session_id)
+                self._sessions[session_id] = session
+                logger.log("session_open", {"session_id": session_id, "active_sessions": len(self._sessions)})
+        session.touch()
+        return session
+
+    def save(self, session: Session):
+        """Persist a session after a turn (no-op for the in-memory store)."""
+        session.touch()
+
+    def drop(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def task_counts(self) -> dict:
+        """Queued and running tasks across live sessions (for metrics)."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "queued": sum(len(s.task_manager.backend) for s in sessions),
+            "running": sum(len(s.task_manager._running) for s in sessions),
+        }
+
+    def evict_expired(self) -> int:
+        """Drop sessions idle longer than the TTL. Returns how many were evicted."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if s.last_seen < cutoff]
+            closed = [self._sessions.pop(sid) for sid in expired]
+        for session in closed:
+            session.close()
+        if expired:
+            logger.log("session_evict", {"evicted": len(expired), "active_sessions": len(self._sessions)})
+        return len(expired)
+
+    def bound(self, gen, session: Session):
+        """
+        Drive a turn generator with `session` as the current session.
+        The context variable is set around every step (Gradio may resume the
+        generator on a different worker thread), and the session is saved
+        when the turn ends.
+        """
+        try:
+            while True:
+                token = _current_session.set(session)
+                try:
+                    item = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    _current_session.reset(token)
+                yield item
+        finally:
+            gen.close()
+            self.save(session)
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep >= min(60, self.ttl_seconds / 10):
+            self._last_sweep = now
+            self.evict_expired()
+
+    def _load(self, session_id):
+        return None
+
+    def _new_session(self, session_id, state=None):
+        return Session(session_id, state=state)
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SessionStore that also persists session state to SQLite, so sessions survive
+    a restart and can be shared by several worker processes.
+
+    The PIN is never written to disk: a restored session starts locked and
+    asks for the PIN again. Each session's task queue is a durable
+    SQLiteTaskQueue in `tasks_db_path` (all sharing one connection);
+    recover_tasks() resumes those of unexpired sessions. Delivery is
+    at-least-once: a task interrupted by a crash runs again on recovery
+    unless its action was registered with idempotent=False.
+    """
+    def __init__(self, db_path="sessions.db", ttl_seconds=DEFAULT_TTL_SECONDS, tasks_db_path=None):
+        super().__init__(ttl_seconds=ttl_seconds)
+        self.db_path = db_path
+        self.tasks_db_path = tasks_db_path or db_path
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, state TEXT NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def save(self, session: Session):
+        session.touch()
+        state = {k: v for k, v in session.state.items() if k not in UNPERSISTED_KEYS}
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, state, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, last_seen = excluded.last_seen",
+                (session.session_id, json.dumps(state, default=str), session.last_seen),
+            )
+            self._conn.commit()
+
+    def drop(self, session_id):
+        super().drop(session_id)
+        with self._db_lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def evict_expired(self) -> int:
+        evicted = super().evict_expired()
+        with self._db_lock:
+            self._conn.execute("DELETE FROM sessions WHERE last_seen < ?", (time.time() - self.ttl_seconds,))
+            self._conn.commit()
+        return evicted
+
+    def _load(self, session_id):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT state, last_seen FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None or row[1] < time.time() - self.ttl_seconds:
+            return None
+        try:
+            state = json.loads(row[0])
+        except ValueError as e:
+            logger.log("session_load_error", {"session_id": session_id, "error": str(e)})
+            return None
+        logger.log("session_restore", {"session_id": session_id})
+        return self._new_session(session_id, state=state)
+
+    def _new_session(self, session_id, state=None):
+        state = state if state is not None else Session.default_state(session_id)
+        task_manager = TaskManager(backend=SQLiteTaskQueue(self.tasks_db_path, queue=session_id), context=state)
+        return Session(session_id, state=state, task_manager=task_manager)
+
+    def recover_tasks(self) -> int:
+        """
+        Resume task queues left unfinished by a previous process (crash or restart).
+        Queues of sessions that expired meanwhile are cancelled instead.
+        Returns how many sessions were resumed.
+        """
+        with self._db_lock:
+            live = {row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_seen >= ?", (time.time() - self.ttl_seconds,))}
+        resumed, cancelled = 0, 0
+        for session_id in SQLiteTaskQueue.queues_with_work(self.tasks_db_path):
+            if session_id in live:
+                self.get(session_id).task_manager.start()
+                resumed += 1
+                continue
+            backend = SQLiteTaskQueue(self.tasks_db_path, queue=session_id)
+            try:
+                cancelled += backend.cancel_all()
+            finally:
+                backend.close()
+        if resumed or cancelled:
+            logger.log("task_recovery", {"sessions": resumed, "expired_tasks_cancelled": cancelled})
+        return resumed
+
+def open_session_store(backend="memory", ttl_seconds=DEFAULT_TTL_SECONDS, db_path="sessions.db"):
+    """Build the session store named by `backend` ('memory' or 'sqlite')."""
+    if backend == "sqlite":
+        store = SQLiteSessionStore(db_path=db_path, ttl_seconds=ttl_seconds)
+        store.recover_tasks()
+        return store
+    if backend != "memory":
+        raise ValueError(f"Unknown session store backend: {backend}")
+    return SessionStore(ttl_seconds=ttl_seconds)
@@ -2,6 +2,7 @@ import os
 import subprocess
 import datetime
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.pending import register_pending, set_pending, peek_pending, pop_pending
 
 MAX_STDOUT = 1800
 MAX_STDERR = 800
@@ -29,7 +30,7 @@ def run_shell_command(args, session_state):
         logger.log("blocked_shell_command", {"cmd": cmd, "cwd": cwd})
         return "[BLOCKED] That command is not permitted for safety."
     if not any(cmd.lower().startswith(prefix) for prefix in safe_cmds):
-        session_state['pending_shell_cmd'] = (cmd, cwd)
+        set_pending(session_state, "shell_cmd", (cmd, cwd))
         return f"Agent wants to run shell command:\n`{cmd}` in `{cwd}` — ok to run? (yes/ok/approve)"
     try:
         if cmd.startswith("npm install"):
@@ -47,9 +48,10 @@ def run_shell_command(args, session_state):
         logger.log("run_shell_fail", {"action": "RUN_SHELL_FAIL", "cwd": cwd, "cmd": cmd, "error": str(e)})
         return f"Shell command error: {e}"
 
+@register_pending("shell_cmd")
 def handle_pending_shell_cmd(user_message, session_state):
-    if session_state.get('pending_shell_cmd'):
-        cmd, cwd = session_state.pop('pending_shell_cmd')
+    if peek_pending(session_state, "shell_cmd"):
+        cmd, cwd = pop_pending(session_state, "shell_cmd")
         auto_approve = session_state.get("global_approval", False)
 
         if auto_approve or is_affirmative(user_message):
@@ -77,12 +79,13 @@ def run_pip_install(args, session_state):
     package = args.get("package")
     if not package:
         return "No package specified for pip install."
-    session_state['pending_pip_install'] = package
+    set_pending(session_state, "pip_install", package)
     return f"Agent wants to run `pip install {package}`. Ok to run? (yes/ok/approve)"
 
+@register_pending("pip_install")
 def handle_pending_pip_install(user_message, session_state):
-    if session_state.get('pending_pip_install'):
-        package = session_state.pop('pending_pip_install')
+    if peek_pending(session_state, "pip_install"):
+        package = pop_pending(session_state, "pip_install")
         auto_approve = session_state.get("global_approval", False)
 
         if auto_approve or is_affirmative(user_message):
@@ -104,22 +107,23 @@ def run_npm_install(args, session_state):
     package = args.get("package", "")
     cwd = args.get("cwd", os.path.expanduser("~"))
     if not package:
-        session_state['pending_npm_install'] = cwd
+        set_pending(session_state, "npm_install", cwd)
         return f"Agent wants to run `npm install` in `{cwd}` (no package specified). Ok to run? (yes/ok/approve)"
     else:
-        session_state['pending_npm_install'] = (package, cwd)
+        set_pending(session_state, "npm_install", (package, cwd))
         return f"Agent wants to run `npm install {package}` in `{cwd}`. Ok to run? (yes/ok/approve)"
 
+@register_pending("npm_install")
 def handle_pending_npm_install(user_message: str, session_state: dict) -> str | None:
     """
     Handle approval for pending npm install actions.
     If approved, runs npm install (with or without a package) in the specified directory.
     """
-    if session_state.get('pending_npm_install'):
-        val = session_state.pop('pending_npm_install')
+    if peek_pending(session_state, "npm_install"):
+        val = pop_pending(session_state, "npm_install")
         auto_approve = session_state.get("global_approval", False)
 
-        if isinstance(val, tuple):
+        if isinstance(val, (tuple, list)):  # list when restored from a persisted session
             package, cwd = val
             cmd = ["npm", "install", package]
         else:
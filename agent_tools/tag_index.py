@@ -0,0 +1,334 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+import numpy as np
+
+# Set bits per byte value (popcount of packed bitmaps)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Allowed sets up to this size are scored by brute force instead of a filtered HNSW query
+BRUTE_FORCE_LIMIT = int(os.getenv("OMNI_TAG_INDEX_BRUTE_FORCE", "2048"))
+
+# Larger allowed sets are passed to Chroma as id lists (query(ids=...)) in chunks of this size
+ID_QUERY_CHUNK = int(os.getenv("OMNI_TAG_INDEX_ID_CHUNK", "10000"))
+
+def _epoch(ts) -> float:
+    try:
+        t = datetime.fromisoformat(ts)
+    except (TypeError, ValueError):
+        return float("nan")
+    return (t if t.tzinfo else t.replace(tzinfo=timezone.utc)).timestamp()
+
+def scan_metadatas(collection, where=None, batch_size=10000):
+    """
+    Yield (id, metadata) for every match, a page at a time: a single get()
+    of more than ~32k rows fails in Chroma ("too many SQL variables").
+    """
+    offset = 0
+    while True:
+        page = collection.get(where=where, include=["metadatas"], limit=batch_size, offset=offset)
+        yield from zip(page["ids"], page["metadatas"])
+        if len(page["ids"]) < batch_size:
+            return
+        offset += batch_size
+
+def vector_distances(matrix, query, space="l2") -> np.ndarray:
+    """Distances of each row to `query` as Chroma reports them (its l2 is squared L2)."""
+    q = np.asarray(query, dtype=np.float32)
+    if space == "cosine":
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(q) or 1.0)
+        return 1.0 - (matrix @ q) / (norms + 1e-12)
+    if space == "ip":
+        return 1.0 - matrix @ q
+    diff = matrix - q
+    return np.einsum("ij,ij->i", diff, diff)
+
+class TagIndex:
+    """
+    In-memory tag/category index over one collection.
+
+    Every memory gets an ordinal; each metatag and major_category has a
+    packed bitmap (uint8, one bit per ordinal) and timestamps sit in a float
+    array, so allowed sets and recent tag counts are vectorized AND/OR +
+    popcount instead of Chroma metadata scans. The collection is scanned on
+    first use, not at construction. MemoryStore keeps it in sync (add /
+    update) and bumps `generation_path` after updating metadata; sync()
+    rebuilds when the collection's count or that generation changed, so
+    writes by other processes are picked up within check_interval seconds.
+    """
+    def __init__(self, collection, check_interval=5.0, generation_path=None):
+        self.collection = collection
+        self.check_interval = check_interval
+        self.generation_path = generation_path
+        self._lock = threading.RLock()
+        self._checked = 0.0
+        self._generation = 0
+        self._built = False
+
+    # --- maintenance ---
+
+    def rebuild(self, batch_size=10000):
+        """(Re)load ids, tags, categories and timestamps from the collection."""
+        with self._lock:
+            self.ids: list = []
+            self.ordinal: dict = {}
+            self._doc_keys: list = []
+            self._tags: dict = {}
+            self._categories: dict = {}
+            self._capacity = 1024
+            self._ts = np.full(self._capacity * 8, np.nan)
+            self._built = True
+            self._generation = self._read_generation()
+            for doc_id, meta in scan_metadatas(self.collection, batch_size=batch_size):
+                self.add([doc_id], [meta])
+            self._checked = time.monotonic()
+
+    def sync(self, force=False):
+        """
+        Build on first use; afterwards rebuild if the collection's size or
+        metadata generation changed behind our back (checked every check_interval s).
+        """
+        with self._lock:
+            if not self._built:
+                return self.rebuild()
+            now = time.monotonic()
+            if not force and now - self._checked < self.check_interval:
+                return
+            self._checked = now
+            if self.collection.count() != len(self.ids) or self._read_generation() != self._generation:
+                self.rebuild()
+
+    def _read_generation(self) -> int:
+        if self.generation_path is None:
+            return 0
+        try:
+            return os.stat(self.generation_path).st_size
+        except OSError:
+            return 0
+
+    def bump_generation(self):
+        """
+        Tell other processes' indexes that metadata changed (one appended byte;
+        O_APPEND keeps concurrent bumps from being lost). Our own index stays
+        current unless another process bumped since we last looked.
+        """
+        if self.generation_path is None:
+            return
+        with self._lock:
+            generation = bump_generation(self.generation_path)
+            if generation == self._generation + 1:
+                self._generation = generation
+
+    def _ensure_built(self):
+        if not self._built:
+            self.rebuild()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _grow(self, n_docs):
+        needed = (n_docs + 7) // 8
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        for bitmaps in (self._tags, self._categories):
+            for key, bits in bitmaps.items():
+                bitmaps[key] = np.concatenate([bits, np.zeros(capacity - len(bits), dtype=np.uint8)])
+        self._ts = np.concatenate([self._ts, np.full((capacity - self._capacity) * 8, np.nan)])
+        self._capacity = capacity
+
+    def _set(self, bitmaps, key, ordinal, on=True):
+        bits = bitmaps.get(key)
+        if bits is None:
+            if not on:
+                return
+            bits = bitmaps[key] = np.zeros(self._capacity, dtype=np.uint8)
+        if on:
+            bits[ordinal >> 3] |= np.uint8(1 << (ordinal & 7))
+        else:
+            bits[ordinal >> 3] &= np.uint8(~(1 << (ordinal & 7)) & 0xFF)
+
+    def add(self, ids: Iterable[str], metadatas: Iterable[dict]):
+        """Index new memories (already-known ids are updated instead)."""
+        with self._lock:
+            if not self._built:
+                return
+            for doc_id, meta in zip(ids, metadatas):
+                if doc_id in self.ordinal:
+                    self.update(doc_id, meta)
+                    continue
+                ordinal = len(self.ids)
+                self._grow(ordinal + 1)
+                self.ids.append(doc_id)
+                self.ordinal[doc_id] = ordinal
+                self._doc_keys.append(((), None))
+                self._index(ordinal, meta or {})
+
+    def update(self, doc_id, meta: dict):
+        """Re-index one memory's tags, category and timestamp (e.g. after retro-tagging)."""
+        with self._lock:
+            if not self._built:
+                return
+            ordinal = self.ordinal.get(doc_id)
+            if ordinal is None:
+                return self.add([doc_id], [meta])
+            tags, category = self._doc_keys[ordinal]
+            for tag in tags:
+                self._set(self._tags, tag, ordinal, on=False)
+            if category is not None:
+                self._set(self._categories, category, ordinal, on=False)
+            self._index(ordinal, meta or {})
+
+    def _index(self, ordinal, meta):
+        tags = tuple(meta.get("metatags") or ())
+        category = meta.get("major_category")
+        for tag in tags:
+            self._set(self._tags, tag, ordinal)
+        if category is not None:
+            self._set(self._categories, category, ordinal)
+        self._doc_keys[ordinal] = (tags, category)
+        self._ts[ordinal] = _epoch(meta.get("timestamp"))
+
+    # --- queries ---
+
+    def _any(self, bitmaps, keys) -> np.ndarray:
+        out = np.zeros(self._capacity, dtype=np.uint8)
+        for key in keys:
+            bits = bitmaps.get(key)
+            if bits is not None:
+                np.bitwise_or(out, bits, out=out)
+        return out
+
+    def _recent(self, days, now=None) -> np.ndarray:
+        """Bitmap of memories inside the retriever's recency window ((now - t).days <= days)."""
+        now = (now or datetime.now(timezone.utc)) - timedelta(days=days + 1)
+        return np.packbits(self._ts > now.timestamp(), bitorder="little")
+
+    def _ordinals(self, bits) -> np.ndarray:
+        return np.flatnonzero(np.unpackbits(bits, count=len(self.ids), bitorder="little"))
+
+    def allowed(self, categories: Optional[Iterable[str]] = None, tags: Optional[Iterable[str]] = None,
+                days: Optional[int] = None) -> list:
+        """
+        Ids with any of `categories` AND any of `tags` (None = no constraint)
+        AND, with `days`, inside the recency window. Same semantics as the
+        retriever's where clause.
+        """
+        with self._lock:
+            self._ensure_built()
+            bits = np.full(self._capacity, 0xFF, dtype=np.uint8)
+            if categories is not None:
+                np.bitwise_and(bits, self._any(self._categories, categories), out=bits)
+            if tags is not None:
+                np.bitwise_and(bits, self._any(self._tags, tags), out=bits)
+            if days is not None:
+                np.bitwise_and(bits, self._recent(days), out=bits)
+            return [self.ids[o] for o in self._ordinals(bits)]
+
+    def tag_counts(self, tags: Iterable[str], days=90) -> dict:
+        """{tag: memories carrying it inside the last `days` days} (popcount of tag AND recent)."""
+        with self._lock:
+            self._ensure_built()
+            recent = self._recent(days)
+            counts = {}
+            for tag in tags:
+                bits = self._tags.get(tag)
+                counts[tag] = 0 if bits is None else int(_POPCOUNT[bits & recent].sum(dtype=np.int64))
+            return counts
+
+    def categories_for(self, tags: Iterable[str]) -> list:
+        """Major categories of the memories carrying any of `tags`."""
+        with self._lock:
+            self._ensure_built()
+            any_tag = self._any(self._tags, tags)
+            return [c for c, bits in self._categories.items() if np.any(bits & any_tag)]
+
+    @staticmethod
+    def _matches(meta, categories, tags) -> bool:
+        meta = meta or {}
+        if categories is not None and meta.get("major_category") not in categories:
+            return False
+        if tags is not None and tags.isdisjoint(meta.get("metatags") or ()):
+            return False
+        return True
+
+    def _verified(self, rows, categories, tags, n_results) -> dict:
+        """
+        Drop (id, meta, doc, dist) rows whose stored metadata no longer matches
+        the filter (changed by a process that did not bump the generation);
+        any mismatch makes the next sync rebuild.
+        """
+        categories = set(categories) if categories is not None else None
+        tags = set(tags) if tags is not None else None
+        kept = [row for row in rows if self._matches(row[1], categories, tags)]
+        if len(kept) < len(rows):
+            with self._lock:
+                self._built = False
+        kept = sorted(kept, key=lambda row: row[3])[:n_results]
+        return {key: [[row[i] for row in kept]] for i, key in enumerate(("ids", "metadatas", "documents", "distances"))}
+
+    def brute_force(self, query_embedding, doc_ids, n_results=30, space="l2", categories=None, tags=None) -> dict:
+        """
+        Exact nearest `n_results` among `doc_ids`, fetched from the collection
+        and scored with NumPy; shaped like collection.query() output. Rows
+        whose fetched metadata fails `categories`/`tags` are dropped.
+        """
+        if not doc_ids:
+            return {"ids": [[]], "metadatas": [[]], "documents": [[]], "distances": [[]]}
+        got = self.collection.get(ids=list(doc_ids), include=["embeddings", "metadatas", "documents"])
+        dist = vector_distances(np.asarray(got["embeddings"], dtype=np.float32), query_embedding, space)
+        order = np.argsort(dist)
+        rows = [(got["ids"][i], got["metadatas"][i], got["documents"][i], float(dist[i])) for i in order]
+        return self._verified(rows, categories, tags, n_results)
+
+    def query_ids(self, query_embedding, doc_ids, n_results=30, categories=None, tags=None,
+                  chunk_size=ID_QUERY_CHUNK) -> dict:
+        """
+        HNSW query restricted to `doc_ids` (Chroma's ids= filter, one query per
+        chunk, merged by distance) instead of re-evaluating the metadata where
+        clause; same output shape and verification as brute_force().
+        """
+        doc_ids = list(doc_ids)
+        rows = []
+        for start in range(0, len(doc_ids), chunk_size):
+            chunk = doc_ids[start:start + chunk_size]
+            res = self.collection.query(query_embeddings=[query_embedding], ids=chunk,
+                                        n_results=min(n_results, len(chunk)),
+                                        include=["documents", "metadatas", "distances"])
+            rows.extend(zip(*((res.get(k) or [[]])[0] for k in ("ids", "metadatas", "documents", "distances"))))
+        return self._verified(rows, categories, tags, n_results)
+
+def generation_path(db_path, collection_name) -> str:
+    """File whose size counts metadata updates to a collection (see TagIndex.sync)."""
+    return os.path.join(os.path.abspath(db_path), f".omni_tags_{collection_name}.gen")
+
+def bump_generation(path) -> int:
+    """Append one byte (O_APPEND, so concurrent bumps are never lost); returns the new generation."""
+    with open(path, "ab") as f:
+        f.write(b".")
+        return f.tell()
+
+_indexes: dict = {}
+_indexes_lock = threading.Lock()
+
+def get_tag_index(db_path, collection) -> TagIndex:
+    """Process-wide index for (db_path, collection name), so a MemoryStore and MemoryRetriever share it."""
+    key = (os.path.abspath(db_path), collection.name)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = TagIndex(collection, generation_path=generation_path(db_path, collection.name))
+        return index
+
+def drop_tag_index(db_path, collection_name):
+    """Forget the cached index (e.g. after the collection was rebuilt under the same name)."""
+    with _indexes_lock:
+        _indexes.pop((os.path.abspath(db_path), collection_name), None)
+
+def tag_index_enabled() -> bool:
+    """Opt-in: OMNI_TAG_INDEX=1 turns the index on (default: Chroma metadata filters only)."""
+    return os.getenv("OMNI_TAG_INDEX", "0").lower() not in ("0", "false", "no")
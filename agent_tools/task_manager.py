@@ -1,81 +1,382 @@
 import time
-import heapq
-from typing import Callable, Any, Optional
+import queue
+import threading
+from typing import Callable, Any, Optional, Union
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.task_queue import InMemoryTaskQueue
+from agent_tools.retry import RetryPolicy
+from agent_tools.tracing import span, trace_parent
 
 # Centralized logger for task management actions
 logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=[])
 
+# Task states reported in progress events
+QUEUED, RUNNING, DONE, FAILED, TIMEOUT, CANCELLED = "queued", "running", "done", "failed", "timeout", "cancelled"
+
+# Named actions usable with add_task("name", ...)
+_ACTIONS: dict = {}
+# Actions that must not run twice: a durable task re-delivered after a crash fails instead
+_NOT_IDEMPOTENT: set = set()
+
+_local = threading.local()
+
+def register_action(name: str, fn: Callable, idempotent: bool = True) -> Callable:
+    """
+    Register a task action under a name (durable queues store the name, not the callable).
+    Durable delivery is at-least-once: a task interrupted by a crash runs again
+    on recovery. Pass idempotent=False for actions where that is unsafe; such
+    a task is then reported as failed instead of being re-run.
+    """
+    _ACTIONS[name] = fn
+    if idempotent:
+        _NOT_IDEMPOTENT.discard(name)
+    else:
+        _NOT_IDEMPOTENT.add(name)
+    return fn
+
+def current_task() -> Optional[dict]:
+    """The task running on this thread, or None."""
+    return getattr(_local, "task", None)
+
+def report_progress(percent: int, message: str = "") -> bool:
+    """
+    Report progress from inside a running task.
+    Returns False if the task was cancelled or timed out, so long tasks can stop early.
+    """
+    task = current_task()
+    if task is None:
+        return True
+    if task["state"] != RUNNING:
+        return False
+    task["_manager"]._emit(task, "progress", percent=percent, message=message)
+    return True
+
+def _action_name(action) -> str:
+    return action if isinstance(action, str) else getattr(action, "__name__", repr(action))
+
 class TaskManager:
     """
-    Simple priority-based task manager using a min-heap.
+    Priority task scheduler backed by a worker pool.
     Lower priority numbers are executed first.
+
+    - per-action concurrency limits (e.g. {"pip_install": 1}),
+    - cancellation (queued tasks are dropped; running ones are told to stop
+      and do so at their next report_progress(), threads cannot be killed),
+    - per-task timeouts (the worker moves on and the result is discarded; the
+      action's concurrency slot stays taken until its thread really exits,
+      so actions that spawn processes should also pass the timeout to them),
+    - progress events, read with drain_events()/iter_events().
+
+    Storage is pluggable: the default in-memory heap, or a durable
+    SQLiteTaskQueue whose tasks survive a restart (actions must then be
+    registered by name). Workers start with the first task and exit once the
+    queue is drained, so idle sessions hold no threads.
     """
-    def __init__(self):
-        self.queue: list[tuple[int, dict]] = []
+    def __init__(self, max_workers: int = 4, concurrency: Optional[dict] = None,
+                 default_timeout: Optional[float] = None, idle_timeout: float = 30.0,
+                 autostart: bool = True, backend=None, context: Any = None):
+        self.backend = backend if backend is not None else InMemoryTaskQueue()
+        self.durable = not isinstance(self.backend, InMemoryTaskQueue)
+        self.max_workers = max_workers
+        self.concurrency = dict(concurrency or {})
+        self.default_timeout = default_timeout
+        self.idle_timeout = idle_timeout
+        self.autostart = autostart
+        self.context = context
+        self._cond = threading.Condition()
+        self._running: dict = {}          # task_id -> task
+        self._contexts: dict = {}         # task_id -> per-task context (in-process only)
+        self._trace_parents: dict = {}    # task_id -> trace ids of the turn that queued it (in-process only)
+        self._active_per_action: dict = {}
+        self._workers = 0
+        self._closed = False
+        self._events: "queue.Queue[dict]" = queue.Queue()
+
+    # --- queueing ---
 
-    def add_task(self, action: str, params: Optional[dict] = None, priority: int = 5):
+    def add_task(self, action: Union[str, Callable], params: Optional[dict] = None, priority: int = 5,
+                 timeout: Optional[float] = None, context: Any = None) -> int:
         """
         Add a task to the queue.
         Args:
-            action: The action name or identifier.
+            action: Callable `fn(params, context)` or the name of a registered action.
             params: Optional dictionary of parameters for the task.
             priority: Lower numbers run first (default 5).
+            timeout: Seconds before the task is reported as timed out (default: manager's).
+            context: Passed to the action as its second argument (default: manager's context).
+        Returns:
+            The task id.
+        """
+        return self.add_tasks([(action, params, priority)], timeout=timeout, context=context)[0]
+
+    def add_tasks(self, tasks: list, timeout: Optional[float] = None, context: Any = None) -> list:
+        """
+        Enqueue several (action, params, priority) tasks at once
+        (a single transaction on the durable backend). Returns their ids.
         """
-        task = {
-            "priority": -priority,  # Negate for min-heap
+        if self._closed:
+            raise RuntimeError("TaskManager is closed")
+        records = [self._make_task(*spec, timeout=timeout) for spec in tasks]
+        effective = context if context is not None else self.context
+        parent = trace_parent(effective if isinstance(effective, dict) else None)
+        with self._cond:
+            ids = self.backend.put(records)
+            for task_id in ids:
+                self._trace_parents[task_id] = parent
+                if context is not None:
+                    self._contexts[task_id] = context
+            self._cond.notify_all()
+        for task in records:
+            logger.log("add_task", {
+                "task_id": task["id"],
+                "action": task["name"],
+                "priority": task["priority"],
+                "params": task["params"]
+            })
+            self._emit(task, QUEUED)
+        if self.autostart:
+            self._ensure_workers()
+        return ids
+
+    def _make_task(self, action, params=None, priority=5, timeout=None) -> dict:
+        name = _action_name(action)
+        if self.durable:
+            if not isinstance(action, str):
+                name = next((n for n, fn in _ACTIONS.items() if fn is action), None)
+                if name is None:
+                    raise ValueError(f"Durable tasks need a registered action; register {_action_name(action)!r} first")
+            action = name
+        return {
+            "priority": priority,
             "action": action,
-            "params": params or {}
+            "name": name,
+            "params": params or {},
+            "timeout": timeout if timeout is not None else self.default_timeout,
         }
-        heapq.heappush(self.queue, (task["priority"], task))
-        logger.log("add_task", {
-            "action": action,
-            "priority": priority,
-            "params": params
-        })
 
     def next_task(self) -> Optional[dict]:
         """
-        Pop and return the next task from the queue, or None if empty.
+        Claim and return the next task, or None if empty (for callers that run
+        tasks themselves instead of using the pool). The task counts as done.
         """
-        if not self.queue:
-            return None
-        _, task = heapq.heappop(self.queue)
-        logger.log("next_task", {"task": task})
+        with self._cond:
+            task = self.backend.claim()
+            if task is None:
+                return None
+            self.backend.ack(task["id"], DONE)
+            self._contexts.pop(task["id"], None)
+            self._trace_parents.pop(task["id"], None)
+        task.setdefault("action", task["name"])
+        logger.log("next_task", {"task_id": task["id"], "action": task["name"], "priority": task["priority"]})
         return task
 
     def has_tasks(self) -> bool:
         """
         Return True if there are tasks in the queue.
         """
-        return len(self.queue) > 0
+        return len(self.backend) > 0
+
+    def is_busy(self) -> bool:
+        """True while tasks are queued or running."""
+        return bool(self._running) or len(self.backend) > 0
+
+    def cancel(self, task_id: int) -> bool:
+        """
+        Cancel a queued or running task. Returns False if it is unknown or finished.
+        A running task keeps running until it checks report_progress().
+        """
+        with self._cond:
+            task = self.backend.cancel(task_id)
+            if task is None:
+                task = self._running.get(task_id)
+                if task is None:
+                    return False
+            task["state"] = CANCELLED
+            self._contexts.pop(task_id, None)
+            self._trace_parents.pop(task_id, None)
+        logger.log("task_cancelled", {"task_id": task_id, "action": task["name"]})
+        self._emit(task, CANCELLED)
+        return True
+
+    def close(self):
+        """
+        Stop claiming tasks (e.g. when the session is evicted). Running tasks
+        finish; the backend is closed once the last worker exits. Tasks still
+        queued in a durable backend stay in its database.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            idle = self._workers == 0
+            self._cond.notify_all()
+        if idle:
+            self.backend.close()
+
+    # --- events ---
+
+    def drain_events(self) -> list:
+        """Return all progress events emitted since the last call (non-blocking)."""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def iter_events(self, poll: float = 0.5, until_idle: bool = True):
+        """Yield progress events as they arrive; stops once no task is queued or running."""
+        while True:
+            try:
+                yield self._events.get(timeout=poll)
+            except queue.Empty:
+                if until_idle and not self.is_busy():
+                    return
+
+    def _emit(self, task, state, **extra):
+        event = {"task_id": task["id"], "action": task["name"], "state": state, "ts": time.time(), **extra}
+        self._events.put(event)
+
+    # --- worker pool ---
+
+    def start(self):
+        """Start the worker pool (done automatically by add_task unless autostart=False)."""
+        self._ensure_workers()
+
+    def _ensure_workers(self):
+        with self._cond:
+            if self._closed:
+                return
+            wanted = min(self.max_workers, len(self.backend) + len(self._running))
+            while self._workers < wanted:
+                self._workers += 1
+                threading.Thread(target=self._worker, name="task-worker", daemon=True).start()
+
+    def _claim_runnable(self) -> Optional[dict]:
+        """Claim the highest-priority task whose action has a free concurrency slot (lock held)."""
+        full = [name for name, limit in self.concurrency.items()
+                if self._active_per_action.get(name, 0) >= limit]
+        task = self.backend.claim(exclude=full)
+        if task is not None:
+            task["state"] = RUNNING
+            task["_manager"] = self
+            task["context"] = self._contexts.pop(task["id"], self.context)
+            task["trace_parent"] = self._trace_parents.pop(task["id"], {})
+            self._running[task["id"]] = task
+            self._active_per_action[task["name"]] = self._active_per_action.get(task["name"], 0) + 1
+        return task
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                task = None if self._closed else self._claim_runnable()
+                if task is None and not self._closed:
+                    self._cond.wait(timeout=self.backend.poll_interval or self.idle_timeout)
+                    task = None if self._closed else self._claim_runnable()
+                if task is None:
+                    # Tasks leased elsewhere (or by a dead process) keep us polling.
+                    if self._closed or self.backend.pending() <= len(self._running):
+                        self._workers -= 1
+                        close_backend = self._closed and self._workers == 0
+                        break
+                    continue
+            try:
+                self._execute(task)
+            finally:
+                with self._cond:
+                    self._running.pop(task["id"], None)
+                    if not task.get("_orphaned"):
+                        self._active_per_action[task["name"]] -= 1
+                    self.backend.ack(task["id"], task["state"])
+                    self._cond.notify_all()
+        if close_backend:
+            self.backend.close()
+
+    def _runner_exited(self, task):
+        """Called by the task's thread when the action returns; frees a timed-out task's slot."""
+        with self._cond:
+            task["_exited"] = True
+            if task.get("_orphaned"):
+                self._active_per_action[task["name"]] -= 1
+                logger.log("task_orphan_exited", {"task_id": task["id"], "action": task["name"]})
+                self._cond.notify_all()
+
+    def _execute(self, task):
+        action = task["action"]
+        fn = _ACTIONS.get(action) if isinstance(action, str) else action
+        if fn is None:
+            task["state"] = FAILED
+            logger.log("task_error", {"task_id": task["id"], "action": task["name"], "error": "unknown action"})
+            self._emit(task, FAILED, error=f"Unknown action '{task['name']}'")
+            return
+        if task.get("attempts", 1) > 1 and task["name"] in _NOT_IDEMPOTENT:
+            task["state"] = FAILED
+            logger.log("task_not_rerun", {"task_id": task["id"], "action": task["name"], "attempt": task["attempts"]})
+            self._emit(task, FAILED, error="Interrupted by a restart; not re-run (the action is not idempotent)")
+            return
+
+        outcome = {}
+        def run():
+            _local.task = task
+            try:
+                # Attached to the turn that queued it (ids captured in add_task; none after a restart)
+                with span(f"task:{task['name']}", state=task["trace_parent"], task_id=task["id"]):
+                    outcome["result"] = fn(task["params"], task["context"])
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                _local.task = None
+                self._runner_exited(task)
+
+        started = time.perf_counter()
+        self._emit(task, RUNNING)
+        logger.log("task_started", {"task_id": task["id"], "action": task["name"], "attempt": task.get("attempts", 1)})
+        runner = threading.Thread(target=run, name=f"task-{task['id']}", daemon=True)
+        runner.start()
+        deadline = started + task["timeout"] if task["timeout"] is not None else None
+        # Join in slices so the durable backend's lease is renewed while the task runs.
+        lease_slice = getattr(self.backend, "visibility_timeout", None)
+        while runner.is_alive():
+            remaining = deadline - time.perf_counter() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                break
+            waits = [w for w in (remaining, lease_slice / 3 if lease_slice else None) if w is not None]
+            runner.join(min(waits) if waits else None)
+            if runner.is_alive():
+                self.backend.touch(task["id"])
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        with self._cond:
+            # Threads cannot be killed: the worker moves on, but the action's
+            # concurrency slot is freed by the thread itself when it exits.
+            timed_out = not task.get("_exited")
+            task["_orphaned"] = timed_out
+        if timed_out:
+            task["state"] = TIMEOUT
+            logger.log("task_timeout", {"task_id": task["id"], "action": task["name"], "timeout": task["timeout"]})
+            self._emit(task, TIMEOUT, elapsed_ms=elapsed_ms)
+        elif task["state"] == CANCELLED:
+            return
+        elif "error" in outcome:
+            task["state"] = FAILED
+            logger.log("task_error", {"task_id": task["id"], "action": task["name"], "error": str(outcome["error"]), "params": task["params"]})
+            self._emit(task, FAILED, error=str(outcome["error"]), elapsed_ms=elapsed_ms)
+        else:
+            task["state"] = DONE
+            logger.log("task_done", {"task_id": task["id"], "action": task["name"], "elapsed_ms": elapsed_ms})
+            self._emit(task, DONE, result=outcome.get("result"), elapsed_ms=elapsed_ms)
 
 def with_retry(task_fn: Callable[[], Any], retries: int = 2, delay: float = 1) -> Any:
     """
-    Retry a task function up to 'retries' times with a delay between attempts.
+    Retry a task function up to 'retries' times.
+    Kept for existing callers; new code should use a RetryPolicy directly.
     Args:
         task_fn: Callable with no arguments.
         retries: Number of retries (default 2).
-        delay: Delay in seconds between retries (default 1).
+        delay: Base delay in seconds (backoff doubles it, with jitter).
     Returns:
         The result of task_fn if successful.
     Raises:
         The last exception if all retries fail.
     """
-    for attempt in range(retries + 1):
-        try:
-            return task_fn()
-        except Exception as e:
-            logger.log("task_retry_error", {
-                "attempt": attempt + 1,
-                "error": str(e)
-            })
-            if attempt < retries:
-                time.sleep(delay)
-            else:
-                logger.log("task_failed", {
-                    "error": str(e),
-                    "retries": retries + 1
-                })
-                print(f"Task failed after {retries + 1} attempts: {e}")
-                raise e
\ No newline at end of file
+    return RetryPolicy(name="with_retry", max_attempts=retries + 1, base_delay=delay).call(task_fn)
@@ -0,0 +1,265 @@
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from agent_tools.ragis_logger import RagisLogger
+
+# Central logger for durable queue events
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=[])
+
+# Row states. 'claimed' rows whose lease has expired are ready again.
+READY, CLAIMED = "ready", "claimed"
+FINAL_STATES = ("done", "failed", "timeout", "cancelled")
+
+class InMemoryTaskQueue:
+    """
+    Default TaskManager backend: a priority heap (lower priority first, FIFO
+    within a priority). Tasks may hold callables; nothing survives a restart.
+    """
+    poll_interval = None  # workers are woken by add_task; no polling needed
+
+    def __init__(self):
+        self._heap: list[tuple[int, int, dict]] = []
+        self._claimed: set = set()
+        self._ids = itertools.count()
+
+    def put(self, tasks: list) -> list:
+        ids = []
+        for task in tasks:
+            task["id"] = next(self._ids)
+            heapq.heappush(self._heap, (task["priority"], task["id"], task))
+            ids.append(task["id"])
+        return ids
+
+    def claim(self, exclude=()) -> Optional[dict]:
+        """Pop the first task (by priority) whose action is not in `exclude`."""
+        for entry in sorted(self._heap):
+            if entry[2]["name"] not in exclude:
+                self._heap.remove(entry)
+                heapq.heapify(self._heap)
+                self._claimed.add(entry[1])
+                return entry[2]
+        return None
+
+    def ack(self, task_id, state="done"):
+        self._claimed.discard(task_id)
+
+    def touch(self, task_id):
+        pass
+
+    def cancel(self, task_id) -> Optional[dict]:
+        """Remove a queued task; returns it, or None if not queued."""
+        for i, entry in enumerate(self._heap):
+            if entry[1] == task_id:
+                self._heap.pop(i)
+                heapq.heapify(self._heap)
+                return entry[2]
+        return None
+
+    def pending(self) -> int:
+        """Tasks queued or claimed (not yet acked)."""
+        return len(self._heap) + len(self._claimed)
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return len(self._heap)
+
+# db path -> [connection, lock, users]; every queue in a database shares one connection
+_connections: dict = {}
+_connections_lock = threading.Lock()
+
+def _open_connection(db_path):
+    key = os.path.abspath(db_path)
+    with _connections_lock:
+        entry = _connections.get(key)
+        if entry is None:
+            conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, queue TEXT NOT NULL, action TEXT NOT NULL,"
+                " params TEXT NOT NULL, priority INTEGER NOT NULL, timeout REAL,"
+                " state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " claimed_by TEXT, claimed_until REAL, created REAL NOT NULL, finished REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (queue, state, priority, id)")
+            entry = _connections[key] = [conn, threading.Lock(), 0]
+        entry[2] += 1
+        return entry[0], entry[1]
+
+def _release_connection(db_path):
+    key = os.path.abspath(db_path)
+    with _connections_lock:
+        entry = _connections.get(key)
+        if entry is None:
+            return
+        entry[2] -= 1
+        if entry[2] <= 0:
+            del _connections[key]
+            entry[0].close()
+
+class SQLiteTaskQueue:
+    """
+    Durable TaskManager backend in SQLite (WAL), one named queue per session.
+
+    claim() atomically leases the best ready row for `visibility_timeout`
+    seconds; the worker renews the lease (touch) while the task runs and acks
+    it when finished. If the process dies, the lease expires and the row is
+    handed out again, so delivery is at-least-once: a task killed mid-run is
+    re-run, a task that was acked never is (TaskManager fails re-delivered
+    tasks of actions registered with idempotent=False instead). Rows
+    re-leased `max_attempts` times are marked failed instead of looping forever.
+
+    Actions are stored by registered name, params as JSON. All queues in one
+    database share a connection; close() releases this queue's share.
+    """
+    poll_interval = 1.0  # other processes (or expiring leases) don't notify us
+
+    def __init__(self, db_path="tasks.db", queue="default", visibility_timeout=300, max_attempts=3):
+        self.db_path = db_path
+        self.queue = queue
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.owner = f"{os.getpid()}:{id(self)}"
+        self._conn, self._lock = _open_connection(db_path)
+        self._closed = False
+
+    def put(self, tasks: list) -> list:
+        """Enqueue tasks in one transaction. Returns their ids."""
+        now = time.time()
+        rows = [
+            (self.queue, t["name"], json.dumps(t["params"], default=str), t["priority"], t["timeout"], READY, now)
+            for t in tasks
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                first = self._conn.execute(
+                    "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'tasks'), 0)").fetchone()[0]
+                self._conn.executemany(
+                    "INSERT INTO tasks (queue, action, params, priority, timeout, state, created)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        # AUTOINCREMENT ids are consecutive: the write lock was held for the whole batch
+        ids = list(range(first + 1, first + 1 + len(rows)))
+        for task, task_id in zip(tasks, ids):
+            task["id"] = task_id
+        return ids
+
+    def claim(self, exclude=()) -> Optional[dict]:
+        """Lease the first ready (or lease-expired) task whose action is not in `exclude`."""
+        now = time.time()
+        skip = f"AND action NOT IN ({','.join('?' * len(exclude))})" if exclude else ""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                abandoned = self._conn.execute(
+                    "UPDATE tasks SET state = 'failed', finished = ? WHERE queue = ? AND state = ?"
+                    " AND claimed_until < ? AND attempts >= ? RETURNING id, action",
+                    (now, self.queue, CLAIMED, now, self.max_attempts)).fetchall()
+                row = self._conn.execute(
+                    "UPDATE tasks SET state = ?, attempts = attempts + 1, claimed_by = ?, claimed_until = ?"
+                    " WHERE id = (SELECT id FROM tasks WHERE queue = ?"
+                    f" AND (state = ? OR (state = ? AND claimed_until < ?)) {skip}"
+                    " ORDER BY priority, id LIMIT 1)"
+                    " RETURNING id, action, params, priority, timeout, attempts",
+                    (CLAIMED, self.owner, now + self.visibility_timeout, self.queue,
+                     READY, CLAIMED, now, *exclude)).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        for task_id, action in abandoned:
+            logger.log("task_abandoned", {"task_id": task_id, "action": action, "queue": self.queue, "max_attempts": self.max_attempts})
+        if row is None:
+            return None
+        task_id, action, params, priority, timeout, attempts = row
+        if attempts > 1:
+            logger.log("task_redelivered", {"task_id": task_id, "action": action, "queue": self.queue, "attempt": attempts})
+        return {"id": task_id, "name": action, "action": action, "params": json.loads(params),
+                "priority": priority, "timeout": timeout, "attempts": attempts}
+
+    def ack(self, task_id, state="done"):
+        """Record the final state of a claimed task."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, finished = ?, claimed_until = NULL"
+                " WHERE id = ? AND state = ? AND claimed_by = ?",
+                (state, time.time(), task_id, CLAIMED, self.owner))
+
+    def touch(self, task_id):
+        """Extend the lease of a running task."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET claimed_until = ? WHERE id = ? AND state = ? AND claimed_by = ?",
+                (time.time() + self.visibility_timeout, task_id, CLAIMED, self.owner))
+
+    def cancel(self, task_id) -> Optional[dict]:
+        """Cancel a ready task; returns it, or None if not queued."""
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE tasks SET state = 'cancelled', finished = ? WHERE id = ? AND queue = ? AND state = ?"
+                " RETURNING id, action", (time.time(), task_id, self.queue, READY)).fetchone()
+        return {"id": row[0], "name": row[1]} if row else None
+
+    def cancel_all(self) -> int:
+        """Cancel every ready (or lease-expired) task in this queue. Returns how many."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE tasks SET state = 'cancelled', finished = ? WHERE queue = ?"
+                " AND (state = ? OR (state = ? AND claimed_until < ?))",
+                (now, self.queue, READY, CLAIMED, now))
+            return cur.rowcount
+
+    def close(self):
+        """Release this queue's share of the database connection (idempotent)."""
+        if not self._closed:
+            self._closed = True
+            _release_connection(self.db_path)
+
+    def pending(self) -> int:
+        """Rows ready or leased (by anyone)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE queue = ? AND state IN (?, ?)",
+                (self.queue, READY, CLAIMED)).fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE queue = ? AND (state = ? OR (state = ? AND claimed_until < ?))",
+                (self.queue, READY, CLAIMED, time.time())).fetchone()[0]
+
+    def purge(self, older_than_seconds=7 * 24 * 3600) -> int:
+        """Delete finished rows older than the cutoff."""
+        with self._lock:
+            cur = self._conn.execute(
+                f"DELETE FROM tasks WHERE state IN ({','.join('?' * len(FINAL_STATES))}) AND finished < ?",
+                (*FINAL_STATES, time.time() - older_than_seconds))
+            return cur.rowcount
+
+    @staticmethod
+    def queues_with_work(db_path="tasks.db") -> list:
+        """Names of queues that still have ready or leased tasks (for startup recovery)."""
+        if not os.path.exists(db_path):
+            return []
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(
+                "SELECT DISTINCT queue FROM tasks WHERE state IN (?, ?)", (READY, CLAIMED)).fetchall()
+        except sqlite3.OperationalError:
+            return []
+        finally:
+            conn.close()
+        return [r[0] for r in rows]
@@ -0,0 +1,234 @@
+import argparse
+import contextvars
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Optional
+from agent_tools.ragis_logger import RagisLogger
+
+# Spans are written as "span" events (attrs may hold user text)
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['input', 'query_text'])
+
+# Span open on this thread/task (asyncio.to_thread and copy_context() carry it along)
+_current_span = contextvars.ContextVar("omni_current_span", default=None)
+
+# thread ident -> trace id of the innermost `with span` open on it (read by the turn profiler)
+_thread_traces: dict = {}
+
+def _new_id(n=16) -> str:
+    return uuid.uuid4().hex[:n]
+
+class Span:
+    """
+    One timed operation of a trace. Written through RagisLogger when it ends:
+    trace_id, span_id, parent_id, name, start, duration_ms, status and attrs.
+    """
+    def __init__(self, name, trace_id=None, parent_id=None, **attrs):
+        self.name = name
+        self.trace_id = trace_id or _new_id(32)
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, error: Optional[BaseException] = None):
+        """Finish and log the span (idempotent)."""
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+        logger.log("span", {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "status": "error" if error is not None else "ok",
+            "error": f"{type(error).__name__}: {error}"[:300] if error is not None else None,
+            **self.attrs,
+        })
+
+def _session_state() -> dict:
+    # Imported late: session_store -> task_manager -> tracing
+    from agent_tools.session_store import current_state
+    return current_state()
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def start_span(name, state: Optional[dict] = None, **attrs) -> Span:
+    """
+    Start a span without making it current (for generators that yield while
+    it is open); call .end() yourself. The parent is the current span, else
+    the turn recorded in `state` (default: the current session's state).
+    """
+    parent = _current_span.get()
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, **attrs)
+    state = state if state is not None else _session_state()
+    return Span(name, state.get("trace_id"), state.get("trace_span_id"), **attrs)
+
+def trace_parent(state: Optional[dict] = None) -> dict:
+    """
+    The current span / turn as {"trace_id", "trace_span_id"}, to hand to
+    work that starts later (e.g. a queued task): start_span(name, state=...)
+    with it attaches to this point, not to whatever turn is current then.
+    """
+    parent = _current_span.get()
+    if parent is not None:
+        return {"trace_id": parent.trace_id, "trace_span_id": parent.span_id}
+    state = state if state is not None else _session_state()
+    return {"trace_id": state.get("trace_id"), "trace_span_id": state.get("trace_span_id")}
+
+def start_trace(name, state: dict, **attrs) -> Span:
+    """
+    Start a new trace (one chat turn). Its ids are kept in `state`
+    (session_state), so tool calls and background tasks of the turn attach
+    to it even when they run on other threads.
+    """
+    root = Span(name, **attrs)
+    state["trace_id"] = root.trace_id
+    state["trace_span_id"] = root.span_id
+    return root
+
+class span:
+    """`with span("retrieval", k=5):` — a child of the current span / turn, current while open."""
+    def __init__(self, name, state: Optional[dict] = None, **attrs):
+        self.name = name
+        self.state = state
+        self.attrs = attrs
+        self.span = None
+        self._token = None
+
+    def __enter__(self) -> Span:
+        self.span = start_span(self.name, self.state, **self.attrs)
+        self._token = _current_span.set(self.span)
+        ident = threading.get_ident()
+        self._thread_trace = _thread_traces.get(ident)
+        _thread_traces[ident] = self.span.trace_id
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        ident = threading.get_ident()
+        if self._thread_trace is None:
+            _thread_traces.pop(ident, None)
+        else:
+            _thread_traces[ident] = self._thread_trace
+        self.span.end(exc)
+
+def thread_trace_ids() -> dict:
+    """{thread ident: trace id} for threads currently inside a `with span` block."""
+    return dict(_thread_traces)
+
+def traced(name: Optional[str] = None, **attrs):
+    """Decorator: run the function inside a span (named after it by default)."""
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attrs):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# --- CLI: python -m agent_tools.tracing ---
+
+def load_spans(log_path="ragis_events.log", since=None, db=None) -> list:
+    """Span records (the event's data) from the JSONL log or, with `db`, the event store."""
+    if db:
+        from agent_tools.event_store import get_event_store
+        events = get_event_store(db).query(event_types=["span"], since=since, limit=None)
+    else:
+        from agent_tools.log_reader import iter_events
+        events = iter_events(log_path, event_types=["span"], since=since)
+    return [ev["data"] for ev in events if isinstance(ev.get("data"), dict) and ev["data"].get("trace_id")]
+
+def _traces(spans) -> dict:
+    traces: dict = {}
+    for s in spans:
+        traces.setdefault(s["trace_id"], []).append(s)
+    return traces
+
+def _root(spans) -> dict:
+    ids = {s["span_id"] for s in spans}
+    roots = [s for s in spans if s.get("parent_id") not in ids]
+    return max(roots or spans, key=lambda s: s["duration_ms"])
+
+def render_waterfall(spans, width=40) -> str:
+    """Indented span tree of one trace with start offsets and proportional bars."""
+    t0 = min(s["start"] for s in spans)
+    total_ms = max((s["start"] - t0) * 1000 + s["duration_ms"] for s in spans) or 1.0
+    children: dict = {}
+    ids = {s["span_id"] for s in spans}
+    for s in sorted(spans, key=lambda s: s["start"]):
+        children.setdefault(s.get("parent_id") if s.get("parent_id") in ids else None, []).append(s)
+    root = _root(spans)
+    lines = [f"trace {root['trace_id']}  {root['name']}  {total_ms:.1f} ms"
+             + (f"  session={root['session_id']}" if root.get("session_id") else "")]
+
+    def walk(parent_id, depth):
+        for s in children.get(parent_id, []):
+            offset = (s["start"] - t0) * 1000
+            lead = int(offset / total_ms * width)
+            bar = "█" * max(1, int(s["duration_ms"] / total_ms * width))
+            flag = "  ✗ " + (s.get("error") or "") if s.get("status") == "error" else ""
+            lines.append(f"{offset:>9.1f} {s['duration_ms']:>9.1f} ms  {' ' * lead}{bar:<{width - lead}}  "
+                         f"{'  ' * depth}{s['name']}{flag}")
+            walk(s["span_id"], depth + 1)
+    walk(None, 0)
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-turn span waterfalls and slowest spans from the event log.")
+    parser.add_argument("--log", default="ragis_events.log", help="JSONL log (rotated segments included)")
+    parser.add_argument("--db", help="Read spans from this event store instead of the log")
+    parser.add_argument("--since", help="ISO timestamp")
+    sub = parser.add_subparsers(dest="command")
+    wf = sub.add_parser("waterfall", help="Waterfall of one trace (default: the latest)")
+    wf.add_argument("trace_id", nargs="?", help="Trace id or prefix")
+    wf.add_argument("--session", help="Latest trace of this session")
+    top = sub.add_parser("top", help="Slowest spans")
+    top.add_argument("-n", type=int, default=20)
+    top.add_argument("--name", help="Only spans whose name starts with this")
+    sub.add_parser("list", help="Recent traces with their total time")
+    args = parser.parse_args(argv)
+
+    spans = load_spans(args.log, args.since, args.db)
+    if not spans:
+        print("No spans found.")
+        return
+    traces = _traces(spans)
+    command = args.command or "list"
+
+    if command == "list":
+        rows = sorted((_root(t) for t in traces.values()), key=lambda s: s["start"])[-30:]
+        for s in rows:
+            when = datetime.fromtimestamp(s["start"], timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{when}  {s['trace_id']}  {s['duration_ms']:>9.1f} ms  {len(traces[s['trace_id']]):>3} spans  {s['name']}")
+    elif command == "waterfall":
+        candidates = traces
+        if args.trace_id:
+            candidates = {t: v for t, v in traces.items() if t.startswith(args.trace_id)}
+        elif args.session:
+            candidates = {t: v for t, v in traces.items() if any(s.get("session_id") == args.session for s in v)}
+        if not candidates:
+            print("No matching trace.")
+            return
+        latest = max(candidates.values(), key=lambda v: max(s["start"] for s in v))
+        print(render_waterfall(latest))
+    elif command == "top":
+        chosen = [s for s in spans if not args.name or s["name"].startswith(args.name)]
+        for s in sorted(chosen, key=lambda s: -s["duration_ms"])[:args.n]:
+            print(f"{s['duration_ms']:>10.1f} ms  {s['name']:<32} trace {s['trace_id'][:12]}"
+                  + ("  ✗" if s.get("status") == "error" else ""))
+
+if __name__ == "__main__":
+    main()
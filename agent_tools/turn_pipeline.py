@@ -0,0 +1,165 @@
+import asyncio
+import contextvars
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from agent_tools.ragis_logger import RagisLogger
+from agent_tools.retry import RetryPolicy, CircuitOpenError, transient_http_error
+from agent_tools.rate_limiter import RateLimitTimeout
+from agent_tools.context_assembler import count_tokens
+from agent_tools.metrics import EMBEDDING_SECONDS
+from agent_tools.tracing import span
+
+# Central logger for per-turn pipeline timing
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['raw_text'])
+
+# Memory writes never block a turn; they drain on this small pool.
+_memory_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-writer")
+
+# Embedding calls: rate limits, 5xx and connection errors. A malformed
+# embedding (ValueError), a client-side limiter timeout or an open circuit
+# is not retried (and does not count against the endpoint's breaker).
+EMBED_RETRY = RetryPolicy(
+    name="embedding", max_attempts=3, base_delay=0.5, max_delay=8.0,
+    no_retry_on=(ValueError, RateLimitTimeout, CircuitOpenError),
+    retry_if_exception=transient_http_error, breaker=True,
+)
+
+def extract_context_metatags(history, window=25):
+    """Collect metatags attached to the last `window` history messages."""
+    tags = []
+    for m in (history or [])[-window:]:
+        if hasattr(m, "metatags"):
+            tags.extend(m.metatags)
+        elif isinstance(m, dict) and "metatags" in m:
+            tags.extend(m["metatags"])
+    return tags
+
+def _ms(start, end):
+    return round((end - start) * 1000, 1)
+
+class TurnContext:
+    """Everything the LLM call needs, plus how long it took to gather."""
+    def __init__(self, embedding, messages, recall_docs, metadatas, scores, timings):
+        self.embedding = embedding
+        self.messages = messages
+        self.recall_docs = recall_docs
+        self.metadatas = metadatas
+        self.scores = scores
+        self.timings = timings
+
+class TurnPipeline:
+    """
+    Concurrent pre-LLM stage of a chat turn.
+
+    - embedding and context tag statistics are fetched together,
+    - the memory write is handed to a background pool (off the critical path),
+    - retrieval runs in a worker thread while the prompt is assembled.
+    """
+    def __init__(self, embed_fn, memory_store, memory_retriever, major_category="general", metatags=None, limiter=None):
+        self.embed_fn = embed_fn
+        self.limiter = limiter
+        self.memory_store = memory_store
+        self.memory_retriever = memory_retriever
+        self.major_category = major_category
+        self.metatags = metatags or ["user"]
+
+    def run(self, message, history, session_id, build_prompt, finalize_prompt=None):
+        """
+        Run the pipeline from synchronous code (e.g. a Gradio generator).
+        `build_prompt(message, history)` runs while retrieval is in flight;
+        `finalize_prompt(prompt, recall_docs)`, if given, turns its result into
+        the final message list once memories are back.
+        """
+        coro = self.arun(message, history, session_id, build_prompt, finalize_prompt)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        # Already inside an event loop: run on a private loop in a helper thread.
+        box = {}
+        def runner():
+            try:
+                box["result"] = asyncio.run(coro)
+            except BaseException as e:
+                box["error"] = e
+        # copy_context: spans opened in the pipeline stay children of the caller's span
+        t = threading.Thread(target=contextvars.copy_context().run, args=(runner,), name="turn-pipeline")
+        t.start()
+        t.join()
+        if "error" in box:
+            raise box["error"]
+        return box["result"]
+
+    async def arun(self, message, history, session_id, build_prompt, finalize_prompt=None):
+        started = time.perf_counter()
+        context_tags = extract_context_metatags(history)
+
+        embedding, tag_counts = await asyncio.gather(
+            EMBED_RETRY.acall(lambda: asyncio.to_thread(self._embed, message, session_id), target="openai:embeddings"),
+            asyncio.to_thread(self.memory_retriever.get_tag_counts, context_tags),
+        )
+        embedded = time.perf_counter()
+
+        self._persist_in_background(message, embedding, session_id)
+
+        retrieval = asyncio.ensure_future(asyncio.to_thread(
+            self.memory_retriever.retrieve_memories,
+            query_embedding=embedding,
+            context_window_metatags=context_tags,
+            query_text=message,
+            tag_counts=tag_counts,
+        ))
+        prompt = await asyncio.to_thread(self._build_prompt, build_prompt, message, history)
+        prompt_ready = time.perf_counter()
+        recall_docs, metadatas, scores = await retrieval
+        messages = finalize_prompt(prompt, recall_docs) if finalize_prompt else prompt
+        finished = time.perf_counter()
+
+        timings = {
+            "embed_and_tags_ms": _ms(started, embedded),
+            "prompt_ms": _ms(embedded, prompt_ready),
+            "retrieval_ms": _ms(embedded, finished),
+            "pre_llm_ms": _ms(started, finished),
+        }
+        logger.log("turn_pipeline", {"session_id": session_id, "recalled": len(recall_docs), **timings})
+        return TurnContext(embedding, messages, recall_docs, metadatas, scores, timings)
+
+    @staticmethod
+    def _build_prompt(build_prompt, message, history):
+        with span("build_prompt", history_turns=len(history or [])):
+            return build_prompt(message, history)
+
+    def _embed(self, message, session_id="default"):
+        with span("embedding", source="turn"):
+            return self._embed_call(message, session_id)
+
+    def _embed_call(self, message, session_id):
+        if self.limiter is not None:
+            with self.limiter.acquire(session_id, count_tokens(message)), EMBEDDING_SECONDS.time(source="turn"):
+                embedding = self.embed_fn.embed_query(message)
+        else:
+            with EMBEDDING_SECONDS.time(source="turn"):
+                embedding = self.embed_fn.embed_query(message)
+        if not isinstance(embedding, (list, tuple)) or not all(isinstance(x, (float, int)) for x in embedding):
+            logger.log("embedding_error", {"input": message, "bad_embedding": str(embedding)})
+            raise ValueError("Embedding must be a list of floats/ints. Got: " + str(embedding))
+        return embedding
+
+    def _persist_in_background(self, message, embedding, session_id):
+        # Runs after the turn moves on; copy_context keeps it in the turn's trace.
+        future = _memory_writer.submit(
+            contextvars.copy_context().run,
+            self.memory_store.add_memory,
+            raw_text=message,
+            embedding=embedding,
+            major_category=self.major_category,
+            metatags=self.metatags,
+            session_id=session_id,
+        )
+        def report(f):
+            err = f.exception()
+            if err is not None:
+                logger.log("memory_store_error", {"session_id": session_id, "raw_text": message, "error": str(err)})
+        future.add_done_callback(report)
+        return future
@@ -2,6 +2,7 @@ import os
 import subprocess
 import datetime
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.pending import register_pending, set_pending, peek_pending, pop_pending
 
 MAX_STDOUT = 3000
 MAX_STDERR = 1000
@@ -28,16 +29,17 @@ def suggest_installer(args, session_state):
         "\n".join(f"- {f}" for f in entries) +
         ("\n\nI can combine these into a bash install script or Docker Compose for you." if entries else "\nNo installer files found.")
     )
-    session_state['pending_installer'] = project_path
+    set_pending(session_state, "installer", project_path)
     logger.log("suggest_installer", {
         "project_path": project_path,
         "detected_files": entries
     })
     return summary + "\nWould you like to build the universal installer? (yes/no)"
 
+@register_pending("installer")
 def handle_pending_installer(user_message, session_state):
-    if session_state.get('pending_installer'):
-        prj = session_state.pop('pending_installer')
+    if peek_pending(session_state, "installer"):
+        prj = pop_pending(session_state, "installer")
         if is_affirmative(user_message):
             install_lines = []
             if os.path.exists(os.path.join(prj, "requirements.txt")):
@@ -75,9 +77,10 @@ def handle_pending_installer(user_message, session_state):
             return "Universal installer script creation cancelled."
     return None
 
+@register_pending("installer_run")
 def handle_pending_installer_run(user_message, session_state):
-    if session_state.get('pending_installer_run'):
-        script_path = session_state.pop('pending_installer_run')
+    if peek_pending(session_state, "installer_run"):
+        script_path = pop_pending(session_state, "installer_run")
         if is_affirmative(user_message):
             try:
                 result = subprocess.run(
@@ -5,6 +5,7 @@ import subprocess
 import sys
 import datetime
 from agent_tools.ragis_logger import RagisLogger
+from agent_tools.pending import register_pending, set_pending, peek_pending, pop_pending
 
 # Central logger for all UI sandbox actions
 logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['abs_path', 'backup_path', 'temp_path', 'script_path', 'url', 'filename'])
@@ -30,7 +31,7 @@ def write_ui_file(args, session_state):
     with tempfile.NamedTemporaryFile(delete=False, mode='w', encoding='utf-8') as tmpf:
         tmpf.write(content)
         temp_path = tmpf.name
-    session_state['pending_ui_file'] = (abs_path, content, backup_path, temp_path)
+    set_pending(session_state, "ui_file", (abs_path, content, backup_path, temp_path))
     logger.log("ui_file_prepare", {
         "abs_path": abs_path,
         "backup_path": backup_path,
@@ -44,13 +45,14 @@ def write_ui_file(args, session_state):
         "Is this OK? (yes/ok/approve or no)"
     )
 
+@register_pending("ui_file")
 def handle_pending_ui_file(user_message, session_state):
     """Handle user approval or denial for a pending UI file write."""
     def is_affirmative(msg):
         affirm = ["yes", "ok", "allow", "approve", "go ahead"]
         return any(word in msg.lower() for word in affirm)
-    if session_state.get('pending_ui_file'):
-        abs_path, content, backup_path, temp_path = session_state['pending_ui_file']
+    if peek_pending(session_state, "ui_file"):
+        abs_path, content, backup_path, temp_path = peek_pending(session_state, "ui_file")
         if is_affirmative(user_message):
             try:
                 with open(abs_path, "w", encoding="utf-8") as f:
@@ -62,20 +64,20 @@ def handle_pending_ui_file(user_message, session_state):
                 logger.log("ui_file_write_fail", {
                     "abs_path": abs_path, "backup_path": backup_path, "error": str(e)
                 })
-                session_state.pop('pending_ui_file')
+                pop_pending(session_state, "ui_file")
                 try:
                     os.remove(temp_path)
                 except Exception as cleanup_err:
                     logger.log("tempfile_remove_fail", {"file": temp_path, "error": str(cleanup_err)})
                 return f"Error writing UI file: {e}"
-            session_state.pop('pending_ui_file')
+            pop_pending(session_state, "ui_file")
             try:
                 os.remove(temp_path)
             except Exception as cleanup_err:
                 logger.log("tempfile_remove_fail", {"file": temp_path, "error": str(cleanup_err)})
             return f"UI file '{abs_path}' saved. (Backup: {backup_path})"
         else:
-            session_state.pop('pending_ui_file')
+            pop_pending(session_state, "ui_file")
             try:
                 os.remove(temp_path)
             except Exception as cleanup_err:
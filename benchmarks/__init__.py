@@ -0,0 +1,5 @@
+"""
+Offline benchmarks for OmniThreads: memory store/retrieval, logging, the
+vault and the Action Timeline. Run with `python -m benchmarks`; no network
+or API keys are needed (embeddings come from FakeEmbeddings).
+"""
@@ -0,0 +1,127 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timezone
+from benchmarks.common import Results, compare, load_results, mismatches
+
+# Benchmarks write their own logs; keep the default file backend so runs are comparable.
+os.environ["RAGIS_LOG_BACKEND"] = "file"
+
+SUITES = ("memory", "logger", "vault", "timeline", "cache")
+# Arguments each suite's numbers depend on; recorded in the results and checked against the baseline
+SUITE_PARAMS = {
+    "memory": ("sizes", "dim", "samples", "query_samples", "min_tag_freq", "seed"),
+    "logger": ("log_events",),
+    "vault": ("vault_samples",),
+    "timeline": ("log_lines", "timeline_samples", "seed"),
+    "cache": ("query_samples", "dim", "seed"),
+}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+def _ints(value: str) -> list:
+    return [int(v.replace("_", "")) for v in value.split(",") if v]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Offline OmniThreads benchmarks (fake embeddings, no network).")
+    parser.add_argument("--suite", action="append", choices=SUITES, help="Suite to run (repeatable; default all)")
+    parser.add_argument("--sizes", type=_ints, default=[10_000, 100_000, 1_000_000],
+                        help="Memory store sizes, comma-separated (default 10000,100000,1000000)")
+    parser.add_argument("--dim", type=int, default=384, help="Fake embedding dimension")
+    parser.add_argument("--samples", type=int, default=200, help="add_memory calls per size")
+    parser.add_argument("--query-samples", type=int, default=50, help="Retrieval queries per size")
+    parser.add_argument("--min-tag-freq", type=int, default=10)
+    parser.add_argument("--log-events", type=int, default=50_000, help="Events per logger setup")
+    parser.add_argument("--log-lines", type=_ints, default=[100_000, 1_000_000], help="Action log sizes")
+    parser.add_argument("--timeline-samples", type=int, default=5)
+    parser.add_argument("--vault-samples", type=int, default=10)
+    parser.add_argument("--quick", action="store_true", help="Small sizes for a smoke run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Scratch directory (default: a temporary one, removed afterwards)")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before a regression (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.sizes, args.samples, args.query_samples = [1_000, 5_000], 50, 20
+        args.log_events, args.log_lines, args.vault_samples = 5_000, [10_000, 100_000], 3
+    return args
+
+def print_comparison(rows, tolerance):
+    print(f"\nvs baseline (tolerance {tolerance:.0%}):")
+    for name, old, new, change, regressed in rows:
+        print(f"  {'REGRESSION' if regressed else 'ok':<10} {name:<52} {old:>12.3f} -> {new:>12.3f}  {change:+.1%}")
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.baseline)
+    scratch = args.workdir is None
+    args.workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="omni_bench_"))
+    os.makedirs(args.workdir, exist_ok=True)
+    # Repo modules are imported lazily below; keep them importable after the chdir.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    cwd = os.getcwd()
+    os.chdir(args.workdir)  # ragis_events.log, the vault etc. land in the scratch dir
+
+    results = Results()
+    try:
+        for suite in args.suite or SUITES:
+            print(f"[{suite}] running...", file=sys.stderr)
+            try:
+                importlib.import_module(f"benchmarks.bench_{suite}").run(results, args)
+            except ImportError as e:
+                # Optional dependency (chromadb, cryptography, ...) not installed
+                results.skip(suite, e)
+                print(f"[{suite}] skipped: {e}", file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+        if scratch:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+    report = results.to_dict({
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {suite: {name: getattr(args, name) for name in SUITE_PARAMS[suite]}
+                   for suite in args.suite or SUITES},
+    })
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    for name, metric in results.metrics.items():
+        print(f"{name:<52} {metric['value']:>14.3f} {metric['unit']}")
+    for name, check in results.checks.items():
+        print(f"{'ok' if check['ok'] else 'FAILED':<10} {name:<42} {check['detail']}")
+    print(f"\nResults written to {output}")
+
+    regressions = 0
+    if os.path.isfile(baseline) and not args.save_baseline:
+        base = load_results(baseline)
+        problems, warnings = mismatches(report, base)
+        for message in warnings:
+            print(f"warning: {message}")
+        if problems:
+            # Different sizes/arguments: the numbers are not comparable
+            for message in problems:
+                print(f"MISMATCH: {message}")
+            print("Re-run with the baseline's arguments, or record a new baseline with --save-baseline.")
+            regressions = len(problems)
+        else:
+            rows = compare(report, base, args.tolerance)
+            print_comparison(rows, args.tolerance)
+            regressions = sum(1 for row in rows if row[-1])
+    if args.save_baseline:
+        with open(baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {baseline}")
+    return 1 if regressions or results.failed_checks() else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
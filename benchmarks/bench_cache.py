@@ -0,0 +1,39 @@
+import os
+from benchmarks.common import SyntheticCorpus, timed
+from benchmarks.fake_embeddings import FakeEmbeddings
+
+SYSTEM_PROMPT = "benchmark system prompt"
+TOOLS = ("read_file", "run_shell")
+
+def run(results, args):
+    """
+    SemanticCache lookup/store latency, plus checks that a question asked
+    again in the same session is served from the cache (with other questions
+    in between) and that another session never gets it.
+    """
+    import chromadb
+    from agent_tools.semantic_cache import SemanticCache, reply_context_hash
+
+    embedder = FakeEmbeddings(dim=args.dim, seed=args.seed)
+    corpus = SyntheticCorpus(seed=args.seed)
+    client = chromadb.PersistentClient(path=os.path.join(args.workdir, "cache_db"))
+    cache = SemanticCache(client, collection_name="bench_cache")
+    own = reply_context_hash("bench-model", SYSTEM_PROMPT, TOOLS, "session-a")
+    other = reply_context_hash("bench-model", SYSTEM_PROMPT, TOOLS, "session-b")
+
+    questions = [corpus.query(i)[1] for i in range(args.query_samples)]
+    embeddings = [embedder.embed_query(q) for q in questions]
+    lookups, stores = [], []
+    for question, embedding in zip(questions, embeddings):
+        lookups.append(timed(cache.lookup, embedding, own))
+        stores.append(timed(cache.store, embedding, own, question, f"answer to {question}"))
+    repeat_hits = sum(cache.lookup(e, own) is not None for e in embeddings)
+    other_hits = sum(cache.lookup(e, other) is not None for e in embeddings)
+
+    results.add_latency("cache.lookup", lookups)
+    results.add_latency("cache.store", stores)
+    results.add("cache.repeat_hit_rate", repeat_hits / len(questions), "ratio", "higher")
+    results.check("cache.repeat_question_hits", repeat_hits == len(questions),
+                  f"{repeat_hits}/{len(questions)} repeated questions answered from the cache")
+    results.check("cache.other_session_misses", other_hits == 0,
+                  f"{other_hits} replies served to another session")
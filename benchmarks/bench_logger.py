@@ -0,0 +1,32 @@
+import os
+import time
+from agent_tools.ragis_logger import RagisLogger
+
+# Logger setups compared: synchronous file sink, async file sink, SQLite event store
+CONFIGS = {
+    "file_sync": {"async_mode": False},
+    "file_async": {"async_mode": True},
+    "sqlite": {"backend": "sqlite"},
+}
+
+def run(results, args):
+    """RagisLogger events per second (log() until everything is on disk) for each setup in CONFIGS."""
+    data = {
+        "doc_id": "00000000-0000-0000-0000-000000000000",
+        "session_id": "bench",
+        "raw_text": "x" * 200,
+        "metatags": ["tag001", "tag017", "tag123"],
+        "elapsed_ms": 1.5,
+    }
+    for name, options in CONFIGS.items():
+        options = dict(options)
+        if options.get("backend") == "sqlite":
+            options["event_db"] = os.path.join(args.workdir, f"bench_{name}.db")
+        logger = RagisLogger(log_path=os.path.join(args.workdir, f"bench_{name}.log"),
+                             pii_mask_fields=["raw_text"], **options)
+        started = time.perf_counter()
+        for _ in range(args.log_events):
+            logger.log("bench_event", data)
+        logger.flush()
+        results.add(f"logger.{name}.events_per_s", args.log_events / (time.perf_counter() - started),
+                    "events/s", "higher")
@@ -0,0 +1,54 @@
+import os
+from benchmarks.common import SyntheticCorpus, timed
+from benchmarks.fake_embeddings import FakeEmbeddings
+
+# Rows per add_memories_batch call while populating (below Chroma's max batch size)
+POPULATE_BATCH = 5000
+
+def run(results, args):
+    """
+    MemoryStore.add_memories_batch throughput, add_memory latency and
+    MemoryRetriever.retrieve_memories / get_tag_counts latency. One store is
+    grown through each size in `args.sizes`, measuring at every step.
+    """
+    from agent_tools.memory_store import MemoryStore
+    from agent_tools.memory_retriever import MemoryRetriever
+
+    embedder = FakeEmbeddings(dim=args.dim, seed=args.seed)
+    corpus = SyntheticCorpus(seed=args.seed)
+    db_path = os.path.join(args.workdir, "memory_db")
+    store = MemoryStore(db_path=db_path, collection_name="bench", synonyms_path="")
+    retriever = MemoryRetriever(db_path=db_path, collection_name="bench", synonyms_path="")
+
+    populated = 0
+    next_index = 0
+    for size in sorted(args.sizes):
+        # Grow to `size`; embeddings are generated outside the timed call.
+        elapsed, added = 0.0, 0
+        while populated < size:
+            n = min(POPULATE_BATCH, size - populated)
+            entries = [corpus.entry(next_index + j, embedder) for j in range(n)]
+            elapsed += timed(store.add_memories_batch, entries)
+            populated += n
+            next_index += n
+            added += n
+        if elapsed:
+            results.add(f"memory.add_memories_batch.throughput@{size}", added / elapsed, "memories/s", "higher")
+
+        samples = []
+        for j in range(args.samples):
+            entry = corpus.entry(next_index, embedder)
+            next_index += 1
+            samples.append(timed(store.add_memory, entry["raw_text"], entry["embedding"], entry["major_category"],
+                                 entry["metatags"], entry["session_id"], timestamp=entry["timestamp"]))
+        populated += args.samples
+        results.add_latency(f"memory.add_memory@{size}", samples)
+
+        retrieve, tag_counts = [], []
+        for j in range(args.query_samples):
+            tags, text = corpus.query(j)
+            embedding = embedder.embed_query(text)
+            tag_counts.append(timed(retriever.get_tag_counts, tags))
+            retrieve.append(timed(retriever.retrieve_memories, embedding, tags, text, min_tag_freq=args.min_tag_freq))
+        results.add_latency(f"memory.get_tag_counts@{size}", tag_counts)
+        results.add_latency(f"memory.retrieve_memories@{size}", retrieve)
@@ -0,0 +1,66 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from benchmarks.common import timed
+from agent_tools.log_reader import TailReader
+
+# Event types the Action Timeline typically shows, cycled through the synthetic log
+_EVENTS = [
+    ("memory_store", {"doc_id": "d", "session_id": "bench"}),
+    ("file_read", {"abs_path": "/tmp/project/main.py", "summary": "read 120 lines"}),
+    ("shell_exec", {"cmd": "pytest -q", "status": "ok"}),
+    ("span", {"trace_id": "t", "span_id": "s", "name": "retrieval", "duration_ms": 12.5}),
+    ("retrieval", {"query_text": "[MASKED]", "result_count": 7}),
+]
+
+def write_log(path, n_lines, start_index=0):
+    """Append `n_lines` synthetic events (one JSON object per line)."""
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with open(path, "a", encoding="utf-8") as f:
+        for i in range(start_index, start_index + n_lines):
+            event_type, data = _EVENTS[i % len(_EVENTS)]
+            f.write(json.dumps({"ts": (t0 + timedelta(seconds=i)).isoformat(), "event_type": event_type,
+                                "system_version": "1.0.0", "tagging_version": "1.0.0", "data": data}) + "\n")
+
+def run(results, args):
+    """
+    Action Timeline reads on large logs: the first (cold) read and a refresh
+    after 100 new lines, through TailReader and, when pandas is installed,
+    omni_agent.read_action_log.
+    """
+    import omni_agent
+
+    try:
+        import pandas  # noqa: F401
+        has_pandas = True
+    except ImportError:
+        has_pandas = False
+        results.skip("timeline.read_action_log", "pandas is not installed")
+
+    for n_lines in sorted(args.log_lines):
+        path = os.path.join(args.workdir, f"timeline_{n_lines}.log")
+        write_log(path, n_lines)
+        written = n_lines
+        cold, warm = [], []
+        for _ in range(args.timeline_samples):
+            reader = TailReader(path, 100, transform=omni_agent.timeline_row)
+            cold.append(timed(lambda: (reader.poll(), reader.snapshot())))
+            write_log(path, 100, written)
+            written += 100
+            warm.append(timed(lambda: (reader.poll(), reader.snapshot())))
+            reader.close()
+        results.add_latency(f"timeline.tail_reader.cold@{n_lines}", cold)
+        results.add_latency(f"timeline.tail_reader.refresh@{n_lines}", warm)
+
+        if has_pandas:
+            cold, warm = [], []
+            for _ in range(args.timeline_samples):
+                for reader in omni_agent._timeline_readers.values():
+                    reader.close()
+                omni_agent._timeline_readers.clear()
+                cold.append(timed(omni_agent.read_action_log, path, 100))
+                write_log(path, 100, written)
+                written += 100
+                warm.append(timed(omni_agent.read_action_log, path, 100))
+            results.add_latency(f"timeline.read_action_log.cold@{n_lines}", cold)
+            results.add_latency(f"timeline.read_action_log.refresh@{n_lines}", warm)
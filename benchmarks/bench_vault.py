@@ -0,0 +1,19 @@
+import os
+from benchmarks.common import timed
+
+PIN = "24680"
+
+def run(results, args):
+    """secure_vault set_secret / get_secret / load_vault latency on a scratch vault (each pays the PBKDF2 key derivation)."""
+    import secure_vault
+
+    secure_vault.VAULT_FILE = os.path.join(args.workdir, "bench.vault")
+    secure_vault.VAULT_SALT_FILE = os.path.join(args.workdir, "bench.salt")
+    set_samples, get_samples, load_samples = [], [], []
+    for i in range(args.vault_samples):
+        set_samples.append(timed(secure_vault.set_secret, f"key{i % 5}", f"value-{i}", PIN))
+        get_samples.append(timed(secure_vault.get_secret, f"key{i % 5}", PIN))
+        load_samples.append(timed(secure_vault.load_vault, PIN))
+    results.add_latency("vault.set_secret", set_samples)
+    results.add_latency("vault.get_secret", get_samples)
+    results.add_latency("vault.load_vault", load_samples)
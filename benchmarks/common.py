@@ -0,0 +1,157 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+def percentile(values, p: float) -> Optional[float]:
+    """Nearest-rank percentile (p in 0..100) of unsorted values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(p / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def latency_stats(samples_s) -> dict:
+    """p50/p95/p99/mean in ms for a list of durations in seconds."""
+    ms = [s * 1000 for s in samples_s]
+    return {
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "mean_ms": sum(ms) / len(ms) if ms else None,
+        "n": len(ms),
+    }
+
+def timed(fn, *args, **kwargs) -> float:
+    """Seconds taken by one call."""
+    started = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - started
+
+class Results:
+    """
+    Flat benchmark results: name -> {value, unit, better}; suites that could
+    not run are listed under skipped, correctness checks under checks.
+    """
+    def __init__(self):
+        self.metrics: dict = {}
+        self.skipped: dict = {}
+        self.checks: dict = {}
+
+    def add(self, name, value, unit="ms", better="lower"):
+        if value is not None:
+            self.metrics[name] = {"value": round(value, 4), "unit": unit, "better": better}
+
+    def add_latency(self, name, samples_s):
+        stats = latency_stats(samples_s)
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            self.add(f"{name}.{key[:-3]}", stats[key])
+
+    def skip(self, suite, reason):
+        self.skipped[suite] = str(reason)
+
+    def check(self, name, ok: bool, detail=""):
+        """Record a pass/fail check (a failed one makes the run exit non-zero)."""
+        self.checks[name] = {"ok": bool(ok), "detail": detail}
+
+    def failed_checks(self) -> list:
+        return [name for name, check in self.checks.items() if not check["ok"]]
+
+    def to_dict(self, meta: dict) -> dict:
+        return {"meta": meta, "results": self.metrics, "skipped": self.skipped, "checks": self.checks}
+
+def load_results(path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.25) -> list:
+    """
+    Rows (name, baseline, current, relative change, regressed) for metrics in
+    both result sets (see mismatches() for what is left out). A metric regresses when it is worse than the baseline
+    by more than `tolerance` (0.25 = 25%).
+    """
+    rows = []
+    base = baseline.get("results", {})
+    for name, cur in sorted(current.get("results", {}).items()):
+        old = base.get(name)
+        if old is None or not old.get("value"):
+            continue
+        change = (cur["value"] - old["value"]) / old["value"]
+        worse = change if cur.get("better", "lower") == "lower" else -change
+        rows.append((name, old["value"], cur["value"], change, worse > tolerance))
+    return rows
+
+def mismatches(current: dict, baseline: dict) -> tuple:
+    """
+    (problems, warnings) that make compare() incomplete. Problems: a suite
+    run with different arguments (sizes, log lines, ...) than the baseline,
+    or missing from a baseline that has no record of its arguments.
+    Warnings: metrics only one side has (e.g. a suite skipped in one run).
+    """
+    problems, warnings = [], []
+    cur_params = current.get("meta", {}).get("params", {})
+    base_params = baseline.get("meta", {}).get("params")
+    if base_params is None:
+        problems.append("baseline does not record its arguments (recorded before meta.params existed)")
+        base_params = {}
+    for suite, params in sorted(cur_params.items()):
+        if suite in baseline.get("skipped", {}) or suite in current.get("skipped", {}):
+            continue
+        if suite not in base_params:
+            warnings.append(f"suite '{suite}' is not in the baseline")
+            continue
+        for name, value in sorted(params.items()):
+            if base_params[suite].get(name) != value:
+                problems.append(f"{suite}: {name}={value} (baseline {base_params[suite].get(name)})")
+    cur, base = set(current.get("results", {})), set(baseline.get("results", {}))
+    run_suites = set(cur_params)
+    missing = sorted(n for n in base - cur if n.split(".", 1)[0] in run_suites)
+    new = sorted(cur - base)
+    if missing:
+        warnings.append(f"{len(missing)} baseline metrics not measured: {', '.join(missing[:5])}{' ...' if len(missing) > 5 else ''}")
+    if new:
+        warnings.append(f"{len(new)} metrics not in the baseline (not compared): {', '.join(new[:5])}{' ...' if len(new) > 5 else ''}")
+    return problems, warnings
+
+class SyntheticCorpus:
+    """
+    Deterministic memories shaped like the agent's: Zipf-distributed tags
+    (a few common, a long rare tail), a dozen major categories, and
+    timestamps spread over `days` (some fall outside the 90-day window).
+    """
+    def __init__(self, n_tags=200, n_categories=12, days=120, seed=0):
+        self.tags = [f"tag{i:03d}" for i in range(n_tags)]
+        self.weights = [1.0 / (rank + 1) for rank in range(n_tags)]
+        self.categories = [f"category{i:02d}" for i in range(n_categories)]
+        self.days = days
+        self.seed = seed
+        self.now = datetime.now(timezone.utc)
+
+    def _rng(self, i, salt=""):
+        return random.Random(f"{self.seed}:{salt}:{i}")
+
+    def tags_for(self, i, k=3, salt="") -> list:
+        return sorted(set(self._rng(i, salt).choices(self.tags, self.weights, k=k)))
+
+    def text(self, i, tags) -> str:
+        return f"memory {i} about {' and '.join(tags)}"
+
+    def entry(self, i, embedder) -> dict:
+        """An add_memories_batch entry (add_memory takes the same fields)."""
+        rng = self._rng(i, "meta")
+        tags = self.tags_for(i)
+        text = self.text(i, tags)
+        return {
+            "raw_text": text,
+            "embedding": embedder.embed_query(text),
+            "major_category": rng.choice(self.categories),
+            "metatags": tags,
+            "session_id": f"bench-{i % 50}",
+            "timestamp": (self.now - timedelta(days=rng.uniform(0, self.days))).isoformat(),
+        }
+
+    def query(self, i) -> tuple:
+        """(context tags, query text) for the i-th retrieval query."""
+        tags = self.tags_for(i, k=4, salt="query")
+        return tags, f"what do I know about {' and '.join(tags)}"
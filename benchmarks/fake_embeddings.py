@@ -0,0 +1,36 @@
+import hashlib
+import math
+import random
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python vectors are slower but identical in shape
+    np = None
+
+class FakeEmbeddings:
+    """
+    Deterministic, offline stand-in for OpenAIEmbeddings: the same text always
+    maps to the same unit vector (seeded from its SHA-256). Implements
+    embed_query / embed_documents, so it can replace the real provider in
+    TurnPipeline or the Backend.
+    """
+    def __init__(self, dim: int = 384, seed: int = 0):
+        self.dim = dim
+        self.seed = seed
+
+    def _seed(self, text: str) -> int:
+        digest = hashlib.sha256(f"{self.seed}:{text}".encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "little")
+
+    def embed_query(self, text: str) -> list:
+        seed = self._seed(text)
+        if np is not None:
+            v = np.random.default_rng(seed).standard_normal(self.dim)
+            return (v / np.linalg.norm(v)).tolist()
+        rng = random.Random(seed)
+        v = [rng.gauss(0.0, 1.0) for _ in range(self.dim)]
+        norm = math.sqrt(sum(x * x for x in v)) or 1.0
+        return [x / norm for x in v]
+
+    def embed_documents(self, texts) -> list:
+        return [self.embed_query(t) for t in texts]
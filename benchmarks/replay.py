@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Replay against its own scratch log; keep the default file backend.
+os.environ["RAGIS_LOG_BACKEND"] = "file"
+
+from benchmarks.common import SyntheticCorpus, latency_stats
+from benchmarks.fake_embeddings import FakeEmbeddings
+from agent_tools.log_reader import iter_events
+
+# Logged events that become replay operations: agent memory writes/queries and the Backend's
+REPLAY_EVENTS = ("memory_store", "memory_retrieval", "backend_embed", "backend_query")
+
+class Op:
+    """One replayed operation: offset (seconds since the first event), kind ("store"/"retrieve") and its inputs."""
+    __slots__ = ("offset", "kind", "tags", "category", "session_id", "mode", "n_results")
+
+    def __init__(self, offset, kind, tags=(), category="general", session_id="replay", mode=None, n_results=3):
+        self.offset = offset
+        self.kind = kind
+        self.tags = list(tags)
+        self.category = category
+        self.session_id = session_id
+        self.mode = mode
+        self.n_results = n_results
+
+def _op(ev, offset) -> Op:
+    data = ev.get("data") if isinstance(ev.get("data"), dict) else {}
+    event_type = ev["event_type"]
+    if event_type == "memory_store":
+        meta = data.get("metadata") if isinstance(data.get("metadata"), dict) else {}
+        tags = meta.get("metatags") if isinstance(meta.get("metatags"), list) else []
+        return Op(offset, "store", tags, meta.get("major_category") or "general", str(data.get("session_id") or "replay"))
+    if event_type == "memory_retrieval":
+        mode = data.get("experiment_mode")
+        return Op(offset, "retrieve", data.get("context_tags") or [], mode=None if mode in (None, "standard") else mode)
+    if event_type == "backend_embed":
+        return Op(offset, "store")
+    return Op(offset, "retrieve", n_results=data.get("n_results") or 3)
+
+def load_workload(log_path, since=None, until=None, limit=None, max_gap=None) -> list:
+    """
+    Ops rebuilt from the event log (rotated segments included), in logged
+    order. Idle gaps longer than `max_gap` seconds are shortened to it.
+    """
+    ops, first, previous, shift = [], None, None, 0.0
+    for ev in iter_events(log_path, event_types=REPLAY_EVENTS, since=since, until=until):
+        try:
+            ts = datetime.fromisoformat(ev["ts"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            continue
+        if first is None:
+            first = previous = ts
+        if max_gap is not None and ts - previous > max_gap:
+            shift += ts - previous - max_gap
+        previous = ts
+        ops.append(_op(ev, max(0.0, ts - first - shift)))
+        if limit and len(ops) >= limit:
+            break
+    return ops
+
+class LocalTarget:
+    """MemoryStore / MemoryRetriever on a scratch store, with synthetic text and fake embeddings."""
+    def __init__(self, db_path, dim=384, seed=0, min_tag_freq=10):
+        from agent_tools.memory_store import MemoryStore
+        from agent_tools.memory_retriever import MemoryRetriever
+        log_path = os.path.join(os.path.dirname(db_path), "replay_events.log")
+        self.store = MemoryStore(db_path=db_path, collection_name="replay", synonyms_path="", log_path=log_path)
+        self.retriever = MemoryRetriever(db_path=db_path, collection_name="replay", synonyms_path="", log_path=log_path)
+        self.embedder = FakeEmbeddings(dim=dim, seed=seed)
+        self.min_tag_freq = min_tag_freq
+
+    def prefill(self, n, seed=0):
+        """Seed the store with `n` synthetic memories so early queries have something to find."""
+        corpus = SyntheticCorpus(seed=seed)
+        for start in range(0, n, 5000):
+            self.store.add_memories_batch([corpus.entry(i, self.embedder) for i in range(start, min(n, start + 5000))])
+
+    def store_memory(self, op, text):
+        self.store.add_memory(text, self.embedder.embed_query(text), op.category, op.tags or ["general"], op.session_id)
+
+    def retrieve(self, op, text):
+        self.retriever.retrieve_memories(self.embedder.embed_query(text), op.tags, text,
+                                         min_tag_freq=self.min_tag_freq, experiment_mode=op.mode)
+
+class BackendTarget:
+    """The Backend API (POST /embed and /query); the Backend computes its own embeddings."""
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path, body):
+        req = urllib.request.Request(self.url + path, data=json.dumps(body).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+
+    def store_memory(self, op, text):
+        self._post("/embed", {"text": text, "metadata": {"id": str(uuid.uuid4()), "major_category": op.category,
+                                                         "session_id": op.session_id}})
+
+    def retrieve(self, op, text):
+        self._post("/query", {"query_text": text, "n_results": op.n_results})
+
+def _text(op, i) -> str:
+    about = " and ".join(op.tags) or op.category
+    if op.kind == "store":
+        return f"replayed memory {i} about {about}"
+    return f"what do I know about {about}"
+
+def replay(ops, target, speed=1.0, workers=4) -> dict:
+    """
+    Run `ops` against `target` at `speed`x the logged pace (0 = as fast as
+    possible) on `workers` threads. Returns throughput and latency
+    percentiles per kind, plus how far behind schedule ops started.
+    """
+    latencies = {"store": [], "retrieve": []}
+    lag, errors = [], {}
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def run(i, op, due):
+        begin = time.perf_counter()
+        try:
+            (target.store_memory if op.kind == "store" else target.retrieve)(op, _text(op, i))
+            ok = True
+        except Exception as e:
+            ok = False
+            key = f"{op.kind}: {type(e).__name__}"
+        elapsed = time.perf_counter() - begin
+        with lock:
+            if ok:
+                latencies[op.kind].append(elapsed)
+            else:
+                errors[key] = errors.get(key, 0) + 1
+            if due is not None:
+                lag.append(begin - due)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, op in enumerate(ops):
+            due = None
+            if speed:
+                due = started + op.offset / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(run, i, op, due)
+    wall = time.perf_counter() - started
+
+    done = sum(len(v) for v in latencies.values())
+    report = {
+        "ops": len(ops),
+        "completed": done,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_ops_s": round(done / wall, 2) if wall else None,
+        "speed": speed or "max",
+        "workers": workers,
+        "latency": {kind: latency_stats(v) for kind, v in latencies.items() if v},
+        "latency_all": latency_stats([x for v in latencies.values() for x in v]),
+    }
+    if lag:
+        report["start_lag"] = latency_stats(lag)
+    return report
+
+def print_report(report):
+    print(f"{report['completed']}/{report['ops']} ops in {report['wall_s']} s "
+          f"({report['throughput_ops_s']} ops/s, speed {report['speed']}, {report['workers']} workers)")
+    rows = list(report["latency"].items()) + [("all", report["latency_all"])]
+    if "start_lag" in report:
+        rows.append(("start lag", report["start_lag"]))
+    for kind, stats in rows:
+        if stats["n"]:
+            print(f"  {kind:<10} n={stats['n']:<7} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms"
+                  f"  p99 {stats['p99_ms']:9.2f} ms")
+    for key, n in report["errors"].items():
+        print(f"  errors     {key}: {n}")
+
+def _speed(value: str) -> float:
+    return 0.0 if value.lower() in ("max", "0") else float(value.rstrip("x"))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.replay",
+                                     description="Replay memory writes and retrievals from ragis_events.log as a load test.")
+    parser.add_argument("--log", default="ragis_events.log", help="Event log to replay (rotated segments included)")
+    parser.add_argument("--since", help="ISO timestamp")
+    parser.add_argument("--until", help="ISO timestamp")
+    parser.add_argument("--limit", type=int, help="Replay at most this many ops")
+    parser.add_argument("--speed", type=_speed, default=1.0, help="1 (logged pace), 10x, or max")
+    parser.add_argument("--max-gap", type=float, default=60.0, help="Shorten idle gaps longer than this (seconds)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--target", choices=("local", "backend"), default="local")
+    parser.add_argument("--url", default="http://localhost:8000", help="Backend URL for --target backend")
+    parser.add_argument("--db", help="Scratch store for --target local (default: a temporary directory)")
+    parser.add_argument("--prefill", type=int, default=0, help="Synthetic memories to add before replaying")
+    parser.add_argument("--dim", type=int, default=384, help="Fake embedding dimension")
+    parser.add_argument("--min-tag-freq", type=int, default=10)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    ops = load_workload(args.log, args.since, args.until, args.limit, args.max_gap)
+    if not ops:
+        print(f"No memory_store / memory_retrieval events in {args.log}.")
+        return 1
+    stores = sum(1 for op in ops if op.kind == "store")
+    print(f"Loaded {len(ops)} ops ({stores} stores, {len(ops) - stores} retrievals) "
+          f"spanning {ops[-1].offset:.1f} s from {args.log}", file=sys.stderr)
+
+    output = os.path.abspath(args.output) if args.output else None
+    scratch = None
+    cwd = os.getcwd()
+    if args.target == "backend":
+        target = BackendTarget(args.url)
+    else:
+        scratch = None if args.db else tempfile.mkdtemp(prefix="omni_replay_")
+        db_path = os.path.abspath(args.db or os.path.join(scratch, "memory_db"))
+        # Spans and other module logs go to the scratch dir, never into the log being replayed.
+        os.chdir(os.path.dirname(db_path))
+        target = LocalTarget(db_path, dim=args.dim, min_tag_freq=args.min_tag_freq)
+        if args.prefill:
+            target.prefill(args.prefill)
+    try:
+        report = replay(ops, target, args.speed, args.workers)
+    finally:
+        os.chdir(cwd)
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    report.update({"log": os.path.abspath(args.log), "target": args.url if args.target == "backend" else "local"})
+    print_report(report)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
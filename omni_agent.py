@@ -1,16 +1,39 @@
 import os
-import gradio as gr
-import pandas as pd
-import json
+import sys
+import time
 import logging
-from dotenv import load_dotenv
+import argparse
+import importlib
+import threading
 from typing import Optional, List
 
+# Heavy dependencies (gradio, pandas, LangChain/LangGraph, chromadb, tool
+# modules, the vault's crypto stack) are imported on first use, not here, so
+# importing this module is cheap for tests and workers. Build the UI with
+# create_app(); run it with main().
+from agent_tools.ragis_logger import RagisLogger
+from agent_tools.log_reader import TailReader
+from agent_tools.event_store import configured_event_store
+from agent_tools.tracing import span, start_span, start_trace
+from agent_tools.profiling import TurnProfiler
+from agent_tools.metrics import (QUEUE_DEPTH, TOOL_SECONDS, EMBEDDING_SECONDS, LLM_SECONDS,
+                                 gauge as metrics_gauge, start_metrics_server)
+from agent_tools.session_store import open_session_store, current_state
+from agent_tools.pending import dispatch_pending
+from agent_tools.context_assembler import ContextAssembler, extractive_summary, count_tokens, message_tokens
+from agent_tools.utils import stream_progress_update
+from agent_tools.rate_limiter import RateLimiter, RateLimitTimeout
+
 # --- Constants ---
 EMBEDDING_MODEL = "text-embedding-3-small"
+CHAT_MODEL = "gpt-4.1-2025-04-14"
 MEMORY_COLLECTION = "memory"
 DEFAULT_SESSION_ID = "default"
 MAX_RETRIES = 3
+COMPLETION_TOKENS_ESTIMATE = 600  # reserved per reply until the real size is known
+RATE_LIMIT_BACKOFF_SECONDS = 10
+# Modules that register_action() background task actions
+TASK_ACTION_MODULES = ("agent_tools.pip_audit",)
 
 # --- Custom Exceptions ---
 class AgentError(Exception):
@@ -26,10 +49,37 @@ class MemoryError(AgentError):
 class Config:
     def __init__(self):
         self.embedding_model = EMBEDDING_MODEL
+        self.chat_model = CHAT_MODEL
         self.memory_collection = MEMORY_COLLECTION
+        self.memory_db_path = os.getenv("MEMORY_DB_PATH", "datastore")
         self.session_id = DEFAULT_SESSION_ID
         self.api_key = os.getenv("OPENAI_API_KEY")
-        
+        self.session_store = os.getenv("OMNI_SESSION_STORE", "memory")
+        self.session_ttl = int(os.getenv("OMNI_SESSION_TTL", "14400"))
+        self.session_db = os.getenv("OMNI_SESSION_DB", "sessions.db")
+        # Client-side OpenAI limits; set to (a little under) the account quota.
+        self.llm_rpm = int(os.getenv("OMNI_LLM_RPM", "500"))
+        self.llm_tpm = int(os.getenv("OMNI_LLM_TPM", "200000"))
+        self.llm_concurrency = int(os.getenv("OMNI_LLM_CONCURRENCY", "8"))
+        self.embed_rpm = int(os.getenv("OMNI_EMBED_RPM", "3000"))
+        self.embed_tpm = int(os.getenv("OMNI_EMBED_TPM", "1000000"))
+        self.embed_concurrency = int(os.getenv("OMNI_EMBED_CONCURRENCY", "16"))
+        # Opt-in semantic reply cache (OMNI_SEMANTIC_CACHE=1)
+        self.semantic_cache = os.getenv("OMNI_SEMANTIC_CACHE", "0").lower() in ("1", "true", "yes")
+        self.cache_threshold = float(os.getenv("OMNI_CACHE_THRESHOLD", "0.95"))
+        self.cache_ttl = int(os.getenv("OMNI_CACHE_TTL", "86400"))
+        # Seconds between Action Timeline updates (0 = manual refresh only)
+        self.timeline_refresh = float(os.getenv("OMNI_TIMELINE_REFRESH", "5"))
+        # Prometheus /metrics sidecar port (0 = off)
+        self.metrics_port = int(os.getenv("OMNI_METRICS_PORT", "0"))
+        # Turn profiler: OMNI_PROFILE=1 profiles the next OMNI_PROFILE_TURNS turns;
+        # OMNI_PROFILE_THRESHOLD_MS keeps any turn slower than that.
+        profile = os.getenv("OMNI_PROFILE", "0").lower() in ("1", "true", "yes")
+        self.profile_turns = int(os.getenv("OMNI_PROFILE_TURNS", "1")) if profile else 0
+        self.profile_threshold_ms = float(os.getenv("OMNI_PROFILE_THRESHOLD_MS", "0")) or None
+        self.profile_mode = os.getenv("OMNI_PROFILE_MODE", "sample")
+        self.profile_dir = os.getenv("OMNI_PROFILE_DIR")  # default: profiles/ next to ragis_events.log
+
     def validate(self):
         if not self.api_key:
             raise ValueError("API key is not set")
@@ -40,62 +90,268 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
-logger = logging.getLogger(__name__)
-
-# --- Load .env first (critical for API keys) ---
-load_dotenv()
-if not os.getenv("OPENAI_API_KEY"):
-    raise RuntimeError("OPENAI_API_KEY is not set! Add it to your .env file.")
-
-# --- LLM/Embedding imports (AFTER loading .env) ---
-from langchain_openai.embeddings import OpenAIEmbeddings
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AIMessage
-from langgraph.prebuilt import create_react_agent
-from langchain.tools import Tool
-
-# --- Agent Core Components ---
-from agent_tools.task_manager import TaskManager, with_retry
-from agent_tools.utils import stream_progress_update
-from agent_tools.memory_store import MemoryStore
-from agent_tools.memory_retriever import MemoryRetriever
-from agent_tools.ragis_logger import RagisLogger
+sys_logger = logging.getLogger(__name__)
 
-# --- File Operations Tools ---
-from agent_tools.files import read_any_file, edit_or_create_file, handle_pending_file_change, list_file_backups, restore_file_backup
-from agent_tools.code_exec import exec_python_code, exec_node_code
-from agent_tools.ux_sandbox import (
-    write_ui_file, handle_pending_ui_file, start_ui_sandbox_server, 
-    vivaldi_ui_screenshot, test_ui_button
-)
-from agent_tools.shell import (
-    run_shell_command, handle_pending_shell_cmd, run_pip_install, handle_pending_pip_install,
-    run_npm_install, handle_pending_npm_install
-)
-from agent_tools.github_tools import (
-    github_clone, handle_pending_github_clone, github_push, handle_pending_github_push
-)
-from agent_tools.api_requests import api_get, api_post, handle_pending_api_call
-from agent_tools.doc_gen import generate_docstrings, handle_pending_doc_gen
-from agent_tools.pip_audit import pip_audit, handle_pending_pip_audit
-from agent_tools.universal_installer import (
-    suggest_installer, handle_pending_installer, handle_pending_installer_run
-)
-from agent_tools.search import code_search_ripgrep, handle_pending_code_search, symbol_search_ctags
-from agent_tools.restore import list_file_backups as restore__list_file_backups, handle_pending_backup_restore
-from secure_vault import set_secret, get_secret, delete_secret, change_pin, load_vault
+# Central event logger for agent turns
+logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['raw_text', 'query_text'])
+
+# --- Lazy imports ---
+# module name -> first-import time in ms (reported by --startup-profile)
+IMPORT_TIMINGS = {}
+
+def lazy_import(module_name):
+    """Import a module on first use, recording how long the first import took."""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    IMPORT_TIMINGS.setdefault(module_name, round((time.perf_counter() - started) * 1000, 1))
+    return module
+
+def lazy_tool(module_name, func_name):
+    """Return a callable that imports `module_name` only when first invoked."""
+    def call(*args, **kwargs):
+        with span(f"tool:{func_name}"), TOOL_SECONDS.time(tool=func_name):
+            return getattr(lazy_import(module_name), func_name)(*args, **kwargs)
+    call.__name__ = func_name
+    return call
+
+def vault():
+    """The secure_vault module (cryptography is only loaded once a PIN is entered)."""
+    return lazy_import("secure_vault")
+
+# --- Agent Components ---
+class Components:
+    """
+    Agent components built on first use (thread-safe).
+    Init time per component is kept in `timings` (ms).
+    """
+    def __init__(self, config: Config):
+        self.config = config
+        self.timings = {}
+        self._built = {}
+        self._lock = threading.RLock()
+
+    def _get(self, name, factory):
+        with self._lock:
+            if name not in self._built:
+                started = time.perf_counter()
+                self._built[name] = factory()
+                self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+            return self._built[name]
+
+    @property
+    def embed_fn(self):
+        def build():
+            embeddings = lazy_import("langchain_openai.embeddings")
+            # Retries are handled by EMBED_RETRY (backoff + circuit breaker), not the client.
+            return embeddings.OpenAIEmbeddings(model=self.config.embedding_model, openai_api_key=self.config.api_key, max_retries=0)
+        return self._get("embed_fn", build)
+
+    @property
+    def llm(self):
+        def build():
+            return lazy_import("langchain_openai").ChatOpenAI(model=self.config.chat_model, temperature=0.4)
+        return self._get("llm", build)
+
+    @property
+    def agent(self):
+        def build():
+            return lazy_import("langgraph.prebuilt").create_react_agent(self.llm, [])
+        return self._get("agent", build)
+
+    @property
+    def tools(self):
+        return self._get("tools", build_tools)
+
+    @property
+    def memory_store(self):
+        def build():
+            return lazy_import("agent_tools.memory_store").MemoryStore(
+                db_path=self.config.memory_db_path,
+                collection_name=self.config.memory_collection,
+                synonyms_path="synonyms.json",
+                log_path="ragis_events.log"
+            )
+        return self._get("memory_store", build)
+
+    @property
+    def memory_retriever(self):
+        def build():
+            return lazy_import("agent_tools.memory_retriever").MemoryRetriever(
+                db_path=self.config.memory_db_path,
+                collection_name=self.config.memory_collection,
+                synonyms_path="synonyms.json",
+                log_path="ragis_events.log"
+            )
+        return self._get("memory_retriever", build)
+
+    @property
+    def turn_pipeline(self):
+        def build():
+            return lazy_import("agent_tools.turn_pipeline").TurnPipeline(
+                self.embed_fn, self.memory_store, self.memory_retriever, limiter=self.embedding_limiter
+            )
+        return self._get("turn_pipeline", build)
+
+    @property
+    def llm_limiter(self):
+        # Shared by every session: chat completions (agent replies and summaries).
+        return self._get("llm_limiter", lambda: RateLimiter(
+            "llm", rpm=self.config.llm_rpm, tpm=self.config.llm_tpm, max_concurrency=self.config.llm_concurrency))
+
+    @property
+    def embedding_limiter(self):
+        return self._get("embedding_limiter", lambda: RateLimiter(
+            "embedding", rpm=self.config.embed_rpm, tpm=self.config.embed_tpm, max_concurrency=self.config.embed_concurrency))
+
+    @property
+    def semantic_cache(self):
+        """The reply cache, or None unless OMNI_SEMANTIC_CACHE is set."""
+        def build():
+            if not self.config.semantic_cache:
+                return None
+            return lazy_import("agent_tools.semantic_cache").SemanticCache(
+                self.memory_store.client,
+                threshold=self.config.cache_threshold,
+                ttl_seconds=self.config.cache_ttl,
+            )
+        return self._get("semantic_cache", build)
+
+    @property
+    def context_assembler(self):
+        return self._get("context_assembler", lambda: ContextAssembler(summarize_fn=summarize_turns))
+
+    @property
+    def session_store(self):
+        # Keyed by Gradio's session hash, so concurrent users never share PIN state,
+        # pending approvals or task queues. OMNI_SESSION_STORE=sqlite persists sessions.
+        def build():
+            # Register task actions first: a durable store resumes queued tasks by name.
+            for module_name in TASK_ACTION_MODULES:
+                lazy_import(module_name)
+            return open_session_store(
+                backend=self.config.session_store,
+                ttl_seconds=self.config.session_ttl,
+                db_path=self.config.session_db,
+            )
+        return self._get("session_store", build)
+
+    @property
+    def profiler(self):
+        # Off unless armed (--profile, OMNI_PROFILE=1 or "profile next N turns" in chat)
+        return self._get("profiler", lambda: TurnProfiler(
+            mode=self.config.profile_mode,
+            turns=self.config.profile_turns,
+            threshold_ms=self.config.profile_threshold_ms,
+            out_dir=self.config.profile_dir,
+        ))
+
+_components = None
+_components_lock = threading.Lock()
+
+def configure(config: Config) -> Components:
+    """Replace the process-wide components with fresh ones built from `config`."""
+    global _components
+    with _components_lock:
+        _components = Components(config)
+        return _components
+
+def get_components() -> Components:
+    """Return the process-wide components, creating the (empty) container if needed."""
+    global _components
+    with _components_lock:
+        if _components is None:
+            _components = Components(Config())
+        return _components
+
+# --- Metrics gauges (read at scrape time; components not built yet report nothing) ---
+IN_FLIGHT = metrics_gauge("omni_in_flight", "Requests or tasks currently running.", ["kind"])
+
+def _built_components() -> dict:
+    components = _components
+    return dict(components._built) if components is not None else {}
+
+def _queue_depths() -> dict:
+    built, depths = _built_components(), {}
+    for name in ("llm_limiter", "embedding_limiter"):
+        if name in built:
+            depths[f"rate_limiter:{built[name].name}"] = built[name].snapshot()["waiting"]
+    if "session_store" in built:
+        depths["tasks"] = built["session_store"].task_counts()["queued"]
+    return depths
+
+def _in_flight() -> dict:
+    built, running = _built_components(), {}
+    for name in ("llm_limiter", "embedding_limiter"):
+        if name in built:
+            running[f"rate_limiter:{built[name].name}"] = built[name].snapshot()["in_flight"]
+    if "session_store" in built:
+        running["tasks"] = built["session_store"].task_counts()["running"]
+    return running
+
+QUEUE_DEPTH.add_callback(_queue_depths)
+IN_FLIGHT.add_callback(_in_flight)
+
+def build_tools():
+    """LangChain tools; each tool module is imported the first time the tool runs."""
+    Tool = lazy_import("langchain.tools").Tool
+    def t(module, func, with_secret=False):
+        fn = lazy_tool(f"agent_tools.{module}", func)
+        if with_secret:
+            return lambda args: fn(args, current_state(), vault().get_secret)
+        return lambda args: fn(args, current_state())
+    return [
+        Tool("ReadAnyFile", t("files", "read_any_file"), "Read any file under your user directory."),
+        Tool("EditOrCreateFile", t("files", "edit_or_create_file"), "Edit/create files in your user directory with approval."),
+        Tool("ExecPythonCode", t("code_exec", "exec_python_code"), "Execute Python code in a sandbox, with approval."),
+        Tool("ExecNodeCode", t("code_exec", "exec_node_code"), "Execute Node.js code with approval."),
+        Tool("WriteUIFile", t("ux_sandbox", "write_ui_file"), "Write or update HTML/CSS/JS in the UI sandbox."),
+        Tool("RunShell", t("shell", "run_shell_command"), "Run shell commands, approval and safety-gated."),
+        Tool("RunPipInstall", t("shell", "run_pip_install"), "Install Python packages via pip, approval required."),
+        Tool("RunNpmInstall", t("shell", "run_npm_install"), "Install Node packages via npm, approval required."),
+        Tool("GitHubClone", t("github_tools", "github_clone", with_secret=True), "Clone repo to your user directory, approval/vault required."),
+        Tool("GitHubPush", t("github_tools", "github_push", with_secret=True), "Push repo to GitHub, approval/vault required."),
+        Tool("APIGet", t("api_requests", "api_get"), "Approval-gated GET API call."),
+        Tool("APIPost", t("api_requests", "api_post"), "Approval-gated POST API call."),
+        Tool("CodeGenerateDocs", t("doc_gen", "generate_docstrings"), "Generate HTML docs (pdoc3), approval required."),
+        Tool("DocstringCoverage", t("doc_gen", "handle_pending_doc_gen"), "Check docstring coverage/project health."),
+        Tool("PipAudit", t("pip_audit", "pip_audit"), "Audit for vulnerable dependencies, approval required."),
+        Tool("SuggestInstaller", t("universal_installer", "suggest_installer"), "Suggest/generate a universal install script."),
+        Tool("CodeSearchRipgrep", t("search", "code_search_ripgrep"), "Fuzzy, regex, and symbol project search, approval required."),
+        Tool("ListFileBackups", t("files", "list_file_backups"), "List backups for a given file."),
+        Tool("RestoreFileBackup", t("files", "restore_file_backup"), "Restore a file from backup, approval required."),
+        Tool("VivaldiScreenshot", lambda args: lazy_tool("agent_tools.ux_sandbox", "vivaldi_ui_screenshot")(**args), "Snapshot the UI sandbox via Vivaldi/Selenium."),
+        Tool("TestUIButton", t("ux_sandbox", "test_ui_button"), "Test/interact with sandboxed UI, log output & screenshots."),
+    ]
+
+# Direct chat commands use the tools without going through the LLM.
+read_any_file = lazy_tool("agent_tools.files", "read_any_file")
+list_file_backups = lazy_tool("agent_tools.files", "list_file_backups")
+code_search_ripgrep = lazy_tool("agent_tools.search", "code_search_ripgrep")
 
 # --- Command Line Arguments ---
-def parse_args():
-    import argparse
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description='Omni Agent')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
     parser.add_argument('--test', action='store_true', help='Run tests only')
-    return parser.parse_args()
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='Build every component, report import/init time per component, then exit')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve Prometheus metrics on this port (default: OMNI_METRICS_PORT, 0 = off)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the next --profile-turns chat turns (also: OMNI_PROFILE=1, or "profile next N turns" in chat)')
+    parser.add_argument('--profile-turns', type=int, default=None, help='Turns to profile with --profile (default 1)')
+    parser.add_argument('--profile-threshold-ms', type=float, default=None,
+                        help='Keep a profile of every turn slower than this')
+    parser.add_argument('--profile-mode', choices=['sample', 'cprofile'], default=None,
+                        help='sample: low-overhead stack sampling (collapsed stacks); cprofile: .pstats')
+    return parser.parse_args(argv)
 
 # --- Environment Check ---
 def check_environment():
-    required_env_vars = ['OPENAI_API_KEY', 'MEMORY_DB_PATH']
+    required_env_vars = ['OPENAI_API_KEY']
     missing_vars = [var for var in required_env_vars if not os.getenv(var)]
     if missing_vars:
         raise EnvironmentError(f"Missing required environment variables: {', '.join(missing_vars)}")
@@ -103,236 +359,270 @@ def check_environment():
 # --- System Checks ---
 def check_system():
     """Run comprehensive system checks"""
-    logger.info("\n=== System Check ===")
-    logger.info(f"OpenAI API Key set: {'OPENAI_API_KEY' in os.environ}")
-    logger.info(f"Current directory: {os.getcwd()}")
-    
+    sys_logger.info("\n=== System Check ===")
+    sys_logger.info(f"OpenAI API Key set: {'OPENAI_API_KEY' in os.environ}")
+    sys_logger.info(f"Current directory: {os.getcwd()}")
+
     # Check required directories
     required_dirs = ['datastore', 'agent_tools']
     dir_status = {d: os.path.exists(d) for d in required_dirs}
-    logger.info("\n=== Directory Check ===")
+    sys_logger.info("\n=== Directory Check ===")
     for d, exists in dir_status.items():
-        logger.info(f"Directory {d} exists: {exists}")
-    
+        sys_logger.info(f"Directory {d} exists: {exists}")
+
     # Check required files
     required_files = ['synonyms.json', 'ragis_events.log']
     file_status = {f: os.path.exists(f) for f in required_files}
-    logger.info("\n=== File Check ===")
+    sys_logger.info("\n=== File Check ===")
     for f, exists in file_status.items():
-        logger.info(f"File {f} exists: {exists}")
+        sys_logger.info(f"File {f} exists: {exists}")
 
 def test_embeddings():
     """Test embedding generation with various cases"""
-    logger.info("\n=== Embedding System Test ===")
+    sys_logger.info("\n=== Embedding System Test ===")
     test_cases = [
         ("Short test", "This is a short test message"),
         ("Longer test", "This is a longer test message that should generate a proper embedding"),
         ("Empty test", ""),
         ("Special chars", "Test with special characters: !@#$%^&*()_+")
     ]
-    
+
     for name, text in test_cases:
-        logger.info(f"\nTesting {name}:")
+        sys_logger.info(f"\nTesting {name}:")
         embedding = get_embedding(text)
         if embedding:
-            logger.info(f"✅ Success - Embedding length: {len(embedding)}")
+            sys_logger.info(f"✅ Success - Embedding length: {len(embedding)}")
         else:
-            logger.error(f"❌ Failed for {name}")
+            sys_logger.error(f"❌ Failed for {name}")
 
 def get_embedding(text: str) -> Optional[List[float]]:
     """Generate an embedding for the given text.
-    
+
     Args:
         text (str): Input text to generate embedding for
-        
+
     Returns:
         Optional[List[float]]: The generated embedding or None if failed
     """
     try:
-        embedding = embed_fn.embed_query(text)
-        logger.info(f"Generated embedding of length: {len(embedding)}")
+        components = get_components()
+        embed_fn = components.embed_fn
+        retry = lazy_import("agent_tools.turn_pipeline").EMBED_RETRY
+        with components.embedding_limiter.acquire("system", count_tokens(text)):
+            with EMBEDDING_SECONDS.time(source="system"):
+                embedding = retry.call(lambda: embed_fn.embed_query(text), target="openai:embeddings")
+        sys_logger.info(f"Generated embedding of length: {len(embedding)}")
         return embedding
     except Exception as e:
-        logger.error(f"Error generating embedding: {e}")
+        sys_logger.error(f"Error generating embedding: {e}")
         return None
 
-# --- Main Execution ---
-def main():
-    """Main entry point for the Omni Agent"""
-    try:
-        # Parse command line arguments
-        args = parse_args()
-        
-        # Check environment
-        check_environment()
-        
-        # Run system checks
-        check_system()
-        
-        if args.test:
-            test_embeddings()
-            return
-            
-        # Initialize configuration
-        config = Config()
-        config.validate()
-        
-        # Initialize embeddings
-        embed_fn = OpenAIEmbeddings(
-            model=config.embedding_model,
-            openai_api_key=config.api_key
-        )
-        
-        # Initialize agent components
-        llm = ChatOpenAI(
-            model="gpt-4.1-2025-04-14",
-            temperature=0.4,
-        )
-        agent = create_react_agent(llm, [])
-        
-        # Initialize tools
-        tools = [
-            Tool(
-                name="read_file",
-                description="Read content from any file",
-                func=read_any_file
-            ),
-            Tool(
-                name="edit_file",
-                description="Edit or create a file",
-                func=edit_or_create_file
-            ),
-            Tool(
-                name="run_code",
-                description="Execute Python code",
-                func=exec_python_code
-            )
-        ]
-        
-        # Initialize memory system
-        memory_store = MemoryStore(
-            db_path='datastore',
-            collection_name=config.memory_collection,
-            synonyms_path="synonyms.json",
-            log_path="ragis_events.log"
-        )
-        
-        # Initialize task manager
-        from agent_tools.task_manager import TaskManager
-        task_manager = TaskManager()
-        
-        # Initialize session state
-        session_state = {
-            'global_approval': False,
-            'session_id': config.session_id
-        }
-        
-        # Start the Gradio interface
-        with gr.Blocks() as app:
-            # ... Gradio interface code ...
-            app.launch()
-            
-    except Exception as e:
-        logger.error(f"Failed to initialize: {e}")
-        raise
+def handle_pending_all(user_message, session_state, get_secret):
+    """Route the reply to the handler of the session's pending action (if any)."""
+    return dispatch_pending(user_message, session_state, get_secret)
 
-if __name__ == "__main__":
-    main()
-    
-
-# --- Session and agent state ---
-session_unlocked = False
-session_pin = None
-session_state = {}
-task_manager = TaskManager()
-
-# --- Memory, Retriever, Logger ---
-memory_store = MemoryStore(
-    db_path='datastore',
-    collection_name='memory',
-    synonyms_path="synonyms.json",
-    log_path="ragis_events.log"
-)
-memory_retriever = MemoryRetriever(
-    db_path='datastore',
-    collection_name='memory',
-    synonyms_path="synonyms.json",
-    log_path="ragis_events.log"
+SYSTEM_PROMPT = (
+    "You are Astrid, a witty, bold, clever AI dev/ops co-pilot. "
+    "Collaborate confidently and directly. Secrets must use vaults only. "
+    "Act decisively if authorized. Stream progress. Be transparent but upbeat on errors."
 )
-logger = RagisLogger(log_path="ragis_events.log", pii_mask_fields=['raw_text', 'query_text'])
 
-# --- Main agent brain ---
-llm = ChatOpenAI(
-    model="gpt-4.1-2025-04-14",
-    temperature=0.4,
-)
-agent = create_react_agent(llm, [])
-
-def split_text_chunks(text, chunk_size=500):
-    for i in range(0, len(text), chunk_size):
-        yield text[i:i+chunk_size]
-
-tools = [
-    Tool("ReadAnyFile", lambda args: read_any_file(args, session_state), "Read any file under your user directory."),
-    Tool("EditOrCreateFile", lambda args: edit_or_create_file(args, session_state), "Edit/create files in your user directory with approval."),
-    Tool("ExecPythonCode", lambda args: exec_python_code(args, session_state), "Execute Python code in a sandbox, with approval."),
-    Tool("ExecNodeCode", lambda args: exec_node_code(args, session_state), "Execute Node.js code with approval."),
-    Tool("WriteUIFile", lambda args: write_ui_file(args, session_state), "Write or update HTML/CSS/JS in the UI sandbox."),
-    Tool("RunShell", lambda args: run_shell_command(args, session_state), "Run shell commands, approval and safety-gated."),
-    Tool("RunPipInstall", lambda args: run_pip_install(args, session_state), "Install Python packages via pip, approval required."),
-    Tool("RunNpmInstall", lambda args: run_npm_install(args, session_state), "Install Node packages via npm, approval required."),
-    Tool("GitHubClone", lambda args: github_clone(args, session_state, get_secret), "Clone repo to your user directory, approval/vault required."),
-    Tool("GitHubPush", lambda args: github_push(args, session_state, get_secret), "Push repo to GitHub, approval/vault required."),
-    Tool("APIGet", lambda args: api_get(args, session_state), "Approval-gated GET API call."),
-    Tool("APIPost", lambda args: api_post(args, session_state), "Approval-gated POST API call."),
-    Tool("CodeGenerateDocs", lambda args: generate_docstrings(args, session_state), "Generate HTML docs (pdoc3), approval required."),
-    Tool("DocstringCoverage", lambda args: handle_pending_doc_gen(args, session_state), "Check docstring coverage/project health."),
-    Tool("PipAudit", lambda args: pip_audit(args, session_state), "Audit for vulnerable dependencies, approval required."),
-    Tool("SuggestInstaller", lambda args: suggest_installer(args, session_state), "Suggest/generate a universal install script."),
-    Tool("CodeSearchRipgrep", lambda args: code_search_ripgrep(args, session_state), "Fuzzy, regex, and symbol project search, approval required."),
-    Tool("ListFileBackups", lambda args: list_file_backups(args, session_state), "List backups for a given file."),
-    Tool("RestoreFileBackup", lambda args: restore_file_backup(args, session_state), "Restore a file from backup, approval required."),
-    Tool("VivaldiScreenshot", lambda args: vivaldi_ui_screenshot(**args), "Snapshot the UI sandbox via Vivaldi/Selenium."),
-    Tool("TestUIButton", lambda args: test_ui_button(args, session_state), "Test/interact with sandboxed UI, log output & screenshots."),
-]
+def summarize_turns(previous_summary, turns):
+    """Fold older chat turns into the rolling session summary using the LLM."""
+    transcript = extractive_summary("", turns, max_tokens=2000)
+    prompt = (
+        "Update this running summary of a conversation with the new turns below. "
+        "Keep decisions, file paths, commands and open questions; drop chit-chat. "
+        "Answer with the summary only, at most 250 words.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+    )
+    components = get_components()
+    session_id = current_state().get("session_id", DEFAULT_SESSION_ID)
+    with components.llm_limiter.acquire(session_id, count_tokens(prompt) + 400) as lease:
+        summary = components.llm.invoke(prompt).content
+        lease.settle(count_tokens(prompt) + count_tokens(summary))
+    return summary
+
+def build_prompt(message, history):
+    """Prepare the budgeted prompt (summary + recent turns) for this turn."""
+    return get_components().context_assembler.prepare(
+        current_state().get("session_id", DEFAULT_SESSION_ID), SYSTEM_PROMPT, message, history
+    )
 
-def handle_pending_all(user_message, session_state, get_secret):
-    auto_approve = session_state.get("global_approval", False)
-    for handler in [
-        handle_pending_file_change,
-        handle_pending_ui_file,
-        handle_pending_shell_cmd,
-        handle_pending_pip_install,
-        handle_pending_npm_install,
-        handle_pending_github_clone,
-        handle_pending_github_push,
-        handle_pending_api_call,
-        handle_pending_doc_gen,
-        handle_pending_pip_audit,
-        handle_pending_installer,
-        handle_pending_installer_run,
-        handle_pending_code_search,
-        handle_pending_backup_restore,
-    ]:
-        try:
-            result = handler(user_message, session_state)
-            if result:
-                return result
-        except Exception as e:
-            logger.log("handler_error", {"handler": handler.__name__, "error": str(e), "user_message": user_message})
-    return None
+def reply_context_hash(components, session_id):
+    """Cache key context for this turn: model, system prompt, tools and the session."""
+    return lazy_import("agent_tools.semantic_cache").reply_context_hash(
+        components.config.chat_model, SYSTEM_PROMPT, [t.name for t in components.tools], session_id,
+    )
 
-def agent_chat(message: str, history: list = []):
-    global session_unlocked, session_pin
+def stream_agent_reply(messages, message, turn_started=None, preface=None, on_complete=None):
+    """
+    Stream the agent's reply token by token.
+    Yields the accumulated reply (Gradio replaces the bubble on every yield),
+    with `preface` lines (task updates) and tool-call progress lines shown
+    above the text as they happen.
+    Logs time-to-first-token, LLM time and end-to-end turn time with the response.
+    `on_complete(reply, called_tools)` runs once the reply is finished.
+    """
+    lc_messages = lazy_import("langchain_core.messages")
+    AIMessage, AIMessageChunk, ToolMessage = lc_messages.AIMessage, lc_messages.AIMessageChunk, lc_messages.ToolMessage
+    components = get_components()
+    agent = components.agent
+    limiter = components.llm_limiter
+    session_id = current_state().get("session_id", DEFAULT_SESSION_ID)
+    prompt_tokens = sum(message_tokens(m) for m in messages)
+
+    started = time.perf_counter()
+    first_token_at = None
+    reply = ""
+    reply_message_id = None  # AI message the streamed text currently belongs to
+    message_ended = False  # an agent step finished since the last text chunk
+    progress = list(preface or [])
+    tool_calls = 0
+    called_tools = []
+
+    def render():
+        if not progress:
+            return reply
+        return "\n".join(progress) + ("\n\n" + reply if reply else "")
+
+    # Shared OpenAI limiter: fair per-session queueing; tell the user if they'll wait.
+    expected_wait = limiter.estimate_wait(session_id, prompt_tokens + COMPLETION_TOKENS_ESTIMATE)
+    if expected_wait >= 1:
+        progress.append(f"⏳ Queued for the model (~{expected_wait:.0f}s)...")
+        yield render()
+
+    # Not a `with span`: the generator yields (and may resume on another thread) while it is open.
+    llm_span = start_span("llm", model=components.config.chat_model, prompt_tokens=prompt_tokens)
+    queued_ms, error = None, None
+    try:
+        with limiter.acquire(session_id, prompt_tokens + COMPLETION_TOKENS_ESTIMATE) as lease:
+            queued_ms = round(lease.waited * 1000, 1)
+            for mode, payload in agent.stream({"messages": messages}, stream_mode=["messages", "updates"]):
+                if mode == "messages":
+                    chunk, meta = payload
+                    if not isinstance(chunk, AIMessageChunk) or not isinstance(chunk.content, str) or not chunk.content:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    if reply and (message_ended or chunk.id != reply_message_id):
+                        reply += "\n\n"  # text from the next AI message of this turn
+                    reply_message_id, message_ended = chunk.id, False
+                    reply += chunk.content
+                    yield render()
+                elif mode == "updates":
+                    message_ended = True
+                    for update in payload.values():
+                        for msg in (update or {}).get("messages", []):
+                            if isinstance(msg, AIMessage) and msg.tool_calls:
+                                for call in msg.tool_calls:
+                                    tool_calls += 1
+                                    called_tools.append(call["name"])
+                                    progress.append(f"🛠 Calling {call['name']}...")
+                            elif isinstance(msg, ToolMessage):
+                                progress.append(f"✅ {msg.name or 'tool'} finished.")
+                            else:
+                                continue
+                            yield render()
+
+            lease.settle(prompt_tokens + count_tokens(reply))
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        llm_span.set(queued_ms=queued_ms, tool_calls=tool_calls,
+                     ttft_ms=round((first_token_at - started) * 1000, 1) if first_token_at else None)
+        llm_span.end(error)
+
+    finished = time.perf_counter()
+    if first_token_at is not None:
+        LLM_SECONDS.observe(first_token_at - started, phase="first_token")
+    LLM_SECONDS.observe(finished - started, phase="total")
+    if not reply:
+        yield render() or "(no response)"
+    logger.log("agent_response", {
+        "input": message,
+        "output": reply,
+        "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+        "total_ms": round((finished - started) * 1000, 1),
+        "turn_ms": round((finished - turn_started) * 1000, 1) if turn_started else None,
+        "tool_calls": tool_calls,
+        "queued_ms": queued_ms,
+    })
+    if on_complete is not None:
+        on_complete(reply, called_tools)
+
+def format_task_event(event):
+    """One chat line for a TaskManager progress event."""
+    name = f"{event['action']} (#{event['task_id']})"
+    state = event["state"]
+    if state == "progress":
+        line = stream_progress_update(name, event.get("percent", 0))
+        return f"{line} {event['message']}" if event.get("message") else line
+    if state == "queued":
+        return f"🗂 Queued task {name}."
+    if state == "running":
+        return f"🛠 Executing task {name}..."
+    if state == "done":
+        result = event.get("result")
+        return f"✅ Task {name} finished." + (f"\n{result}" if isinstance(result, str) and result else "")
+    if state == "failed":
+        return f"⚠️ Task {name} failed: {event.get('error')}"
+    if state == "timeout":
+        return f"⏱ Task {name} timed out after {event.get('elapsed_ms')} ms."
+    return f"🛑 Task {name} {state}."
+
+def agent_chat(message: str, history: list = [], request=None):
+    """Gradio chat handler: runs one turn against the caller's session."""
+    components = get_components()
+    session_store = components.session_store
+    session_id = getattr(request, "session_hash", None) or DEFAULT_SESSION_ID
+    session = session_store.get(session_id)
+    # One trace per turn; its id lives in session_state so tools and tasks join it.
+    turn = start_trace("agent_turn", session.state, session_id=session_id)
+    error = None
+    try:
+        yield from components.profiler.profile_turn(
+            session_store.bound(agent_turn(message, history, session), session), turn.trace_id, session_id)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        turn.end(error)
+
+def profile_command(words: list) -> str:
+    """Chat toggle for the turn profiler: profile next N turns | over X ms | mode sample|cprofile | off | status."""
+    profiler = get_components().profiler
+    numbers = [w.rstrip("ms") for w in words if w.rstrip("ms").replace(".", "", 1).isdigit()]
+    try:
+        if words[:1] == ["off"]:
+            profiler.disable()
+        elif words[:1] == ["mode"] and len(words) > 1:
+            profiler.configure(mode=words[1])
+        elif "over" in words or "slow" in words:
+            if not numbers:
+                return "❓ Usage: profile turns over <ms>"
+            profiler.configure(threshold_ms=float(numbers[0]))
+        elif words[:1] == ["next"]:
+            profiler.arm(int(float(numbers[0])) if numbers else 1)
+        elif words[:1] != ["status"]:
+            return "❓ Usage: profile next <N> turns | profile turns over <ms> | profile mode sample|cprofile | profile off | profile status"
+    except ValueError as e:
+        return f"❌ {e}"
+    return f"🔬 Profiler: {profiler.status()}"
+
+def agent_turn(message, history, session):
+    session_state = session.state
+    task_manager = session.task_manager
 
     pin_entry = message.strip()
-    if not session_unlocked:
+    if not session.unlocked:
         if pin_entry.lower().startswith("pin:"):
             pin_entry = pin_entry[4:].strip()
         if pin_entry.isdigit() and 5 <= len(pin_entry) <= 6:
-            if load_vault(pin_entry) is not None:
-                session_unlocked = True
-                session_pin = pin_entry
+            if vault().load_vault(pin_entry) is not None:
+                session.unlocked = True
+                session.pin = pin_entry
                 session_state["pin"] = pin_entry
                 yield "🔓 PIN accepted! Vault unlocked. Ready to roll."
                 return
@@ -353,6 +643,9 @@ def agent_chat(message: str, history: list = []):
         session_state["global_approval"] = False
         yield "🔒 Global approval disabled. Manual approvals required again."
         return
+    if user_lc.startswith("profile "):
+        yield profile_command(user_lc[len("profile "):].split())
+        return
 
     if user_lc.startswith(('view file', 'show file', 'read file', 'cat ')):
         parts = message.split(' ', 2)
@@ -382,7 +675,7 @@ def agent_chat(message: str, history: list = []):
         yield list_file_backups({"target_path": target_file}, session_state)
         return
 
-    pending_result = handle_pending_all(message, session_state, lambda name, pin=None: get_secret(name, pin or session_pin))
+    pending_result = handle_pending_all(message, session_state, lambda name, pin=None: vault().get_secret(name, pin or session.pin))
     if pending_result:
         yield pending_result
         return
@@ -392,80 +685,106 @@ def agent_chat(message: str, history: list = []):
         yield secret_result
         return
 
-    while task_manager.has_tasks():
-        task = task_manager.next_task()
-        yield f"🛠 Executing queued task: {task['action']}..."
-        try:
-            task_func = task["action"]
-            task_args = task.get("params", {})
-            output = task_func(task_args, session_state)
-            yield output
-        except Exception as e:
-            logger.log("task_error", {"action": task['action'], "error": str(e), "params": task.get("params", {})})
-            yield f"⚠️ Task {task['action']} failed: {e}"
-
-    try:
-        # --- MemoryStore: add only real embedding
-        embedding = embed_fn.embed_query(message)
-        if not isinstance(embedding, (list, tuple)) or not all(isinstance(x, (float, int)) for x in embedding):
-            logger.log("embedding_error", {"input": message, "bad_embedding": str(embedding)})
-            raise ValueError("Embedding must be a list of floats/ints. Got: " + str(embedding))
-        memory_store.add_memory(
-            raw_text=message,
-            embedding=embedding,
-            major_category="general",
-            metatags=["user"],
-            session_id=session_state.get("session_id", "default"),
-        )
+    if user_lc in ("task status", "show tasks", "watch tasks"):
+        if not task_manager.is_busy():
+            yield "✅ No tasks queued or running."
+            return
+        lines = []
+        for event in task_manager.iter_events():
+            lines.append(format_task_event(event))
+            yield "\n".join(lines)
+        return
+    if user_lc in ("rate limits", "limiter status"):
+        components = get_components()
+        lines = []
+        for snap in (components.llm_limiter.snapshot(), components.embedding_limiter.snapshot()):
+            lines.append(
+                f"📊 {snap['limiter']}: {snap['in_flight']}/{snap['max_concurrency']} in flight, "
+                f"{snap['waiting']} waiting ({snap['waiting_sessions']} sessions), "
+                f"{snap['requests_available']}/{snap['rpm']} requests and "
+                f"{snap['tokens_available']}/{snap['tpm']} tokens available, "
+                f"{snap['waited']} of {snap['granted']} calls queued"
+            )
+        yield "\n".join(lines)
+        return
+    if user_lc in ("cache stats", "semantic cache"):
+        cache = get_components().semantic_cache
+        if cache is None:
+            yield "ℹ️ Semantic cache is off (set OMNI_SEMANTIC_CACHE=1 to enable)."
+            return
+        m = cache.metrics()
+        yield (f"📊 Semantic cache: {m['hits']} hits / {m['lookups']} lookups "
+               f"(hit rate {m['hit_rate']:.0%}), {m['stores']} stored, {m['bypassed']} bypassed, "
+               f"threshold {m['threshold']}, TTL {m['ttl_seconds']}s")
+        return
+    if user_lc.startswith(("audit deps", "audit dependencies")):
+        # Runs on the session's worker pool; progress shows up on the next turns.
+        parts = message.split(" ", 2)
+        path = os.path.expanduser(parts[2].strip() if len(parts) > 2 and parts[2].strip() else ".")
+        pip_audit = lazy_import("agent_tools.pip_audit")
+        task_id = task_manager.add_task("pip_audit", {"path": path, "timeout": pip_audit.BACKGROUND_TIMEOUT},
+                                        timeout=pip_audit.BACKGROUND_TIMEOUT + 30)
+        yield f"🗂 Queued pip-audit in `{path}` as task #{task_id} (\"task status\" to watch, \"cancel task {task_id}\" to drop it)."
+        return
+    if user_lc.startswith("cancel task "):
+        task_id = user_lc[len("cancel task "):].strip()
+        if task_id.isdigit() and task_manager.cancel(int(task_id)):
+            yield f"🛑 Task {task_id} cancelled (a running task stops at its next progress check)."
+        else:
+            yield f"❓ No queued or running task {task_id}."
+        return
 
-        context_metatags = []
-        if history:
-            for m in history[-25:]:
-                if hasattr(m, "metatags"):
-                    context_metatags.extend(m.metatags)
-                elif isinstance(m, dict) and "metatags" in m:
-                    context_metatags.extend(m["metatags"])
-
-        recall_docs, metadatas, scores = memory_retriever.retrieve_memories(
-            query_embedding=embedding,
-            context_window_metatags=context_metatags,
-            query_text=message,
-        )
+    # Background tasks run on the session's worker pool; show what happened
+    # since the last turn instead of blocking on them.
+    task_updates = [format_task_event(e) for e in task_manager.drain_events()]
+    if task_updates:
+        yield "\n".join(task_updates)
 
-        messages = [{
-            "role": "system",
-            "content": (
-                "You are Astrid, a witty, bold, clever AI dev/ops co-pilot. "
-                "Collaborate confidently and directly. Secrets must use vaults only. "
-                "Act decisively if authorized. Stream progress. Be transparent but upbeat on errors."
+    try:
+        components = get_components()
+        turn_started = time.perf_counter()
+        with span("turn_pipeline"):
+            turn = components.turn_pipeline.run(
+                message,
+                history,
+                session_id=session.session_id,
+                build_prompt=build_prompt,
+                finalize_prompt=components.context_assembler.finalize,
             )
-        }]
-        if history:
-            messages.extend(history[-20:])
-        messages.append({"role": "user", "content": message})
-
-        result = agent.invoke({"messages": messages, "input": message})
-        if isinstance(result, dict) and "messages" in result:
-            for msg in reversed(result["messages"]):
-                if isinstance(msg, AIMessage):
-                    for chunk in split_text_chunks(msg.content, chunk_size=500):
-                        yield chunk
-                    logger.log("agent_response", {"input": message, "output": msg.content})
-                    return
-                elif isinstance(msg, dict) and msg.get("role") == "assistant":
-                    for chunk in split_text_chunks(msg.get("content", ""), chunk_size=500):
-                        yield chunk
-                    logger.log("agent_response", {"input": message, "output": msg.get("content", "")})
-                    return
-        if isinstance(result, AIMessage):
-            for chunk in split_text_chunks(result.content, chunk_size=500):
-                yield chunk
-            logger.log("agent_response", {"input": message, "output": result.content})
-            return
-        logger.log("agent_response", {"input": message, "output": str(result)})
-        yield str(result)
+        messages = turn.messages
+
+        cache = components.semantic_cache
+        on_complete = None
+        if cache is not None and cache.cacheable(message):
+            ctx_hash = reply_context_hash(components, session.session_id)
+            with span("semantic_cache.lookup"):
+                hit = cache.lookup(turn.embedding, ctx_hash)
+            if hit is not None:
+                reply = hit["response"]
+                logger.log("agent_response", {
+                    "input": message,
+                    "output": reply,
+                    "cached": True,
+                    "similarity": round(hit["similarity"], 4),
+                    "turn_ms": round((time.perf_counter() - turn_started) * 1000, 1),
+                })
+                yield "\n".join(task_updates) + "\n\n" + reply if task_updates else reply
+                return
+            on_complete = lambda reply, called_tools: cache.store(
+                turn.embedding, ctx_hash, message, reply, called_tools)
+
+        yield from stream_agent_reply(messages, message, turn_started=turn_started,
+                                      preface=task_updates, on_complete=on_complete)
+    except RateLimitTimeout as e:
+        logger.log("agent_error", {"input": message, "error": str(e)})
+        yield "⏳ The model is busy right now; please try again in a moment."
     except Exception as e:
         logger.log("agent_error", {"input": message, "error": str(e)})
+        if getattr(e, "status_code", None) == 429 or "rate limit" in str(e).lower():
+            # Server-side 429 despite the client limiter: pause everyone briefly.
+            get_components().llm_limiter.backoff(RATE_LIMIT_BACKOFF_SECONDS)
+            yield f"⏳ The model is rate-limited right now; please try again in ~{RATE_LIMIT_BACKOFF_SECONDS}s."
+            return
         yield f"🔥 Agent error: {e}"
 
 def handle_pending_secret_workflow(message, session_state):
@@ -474,8 +793,8 @@ def handle_pending_secret_workflow(message, session_state):
         return "I'll store your GitHub PAT securely as 'GITHUB_PAT' in the vault. Is that ok?"
     if session_state.get('awaiting_secret_name') and is_affirmative(message):
         secret_name = session_state.pop('awaiting_secret_name')
-        pin = session_pin
-        if get_secret(secret_name, pin):
+        pin = session_state.get("pin")
+        if vault().get_secret(secret_name, pin):
             session_state['awaiting_secret_overwrite'] = secret_name
             return f"A secret named '{secret_name}' already exists. Overwrite/replace it? (yes/no)"
         else:
@@ -492,7 +811,7 @@ def handle_pending_secret_workflow(message, session_state):
     if session_state.get('pending_secret_pin') and session_state.get('pending_secret_store') and not message.isdigit():
         secret_name = session_state.pop('pending_secret_store')
         pin_code = session_state.pop('pending_secret_pin')
-        set_secret(secret_name, message.strip(), pin_code)
+        vault().set_secret(secret_name, message.strip(), pin_code)
         return f"🔐 Secret '{secret_name}' stored securely."
     return None
 
@@ -504,61 +823,165 @@ def is_affirmative(msg):
     msg_low = msg.lower()
     return any(word in msg_low for word in affirm)
 
-def read_action_log(log_file="agent_tools/ragis_events.log", max_rows=100):
-    if not os.path.exists(log_file):
-        return pd.DataFrame(columns=["Timestamp", "Action", "Target", "Summary"])
-    rows = []
-    with open(log_file, "r", encoding="utf-8") as f:
-        for line in f:
-            try:
-                ev = json.loads(line)
-                ts = ev.get("ts", "")
-                action = ev.get("event_type", "")
-                data = ev.get("data", {})
-                target = (
-                    data.get("abs_path") or data.get("file") or data.get("target") or
-                    data.get("script_path") or data.get("project_path") or data.get("backup_path") or ""
+TIMELINE_COLUMNS = ["Timestamp", "Action", "Target", "Summary"]
+
+def timeline_row(ev: dict) -> list:
+    """One Action Timeline row for a logged event."""
+    data = ev.get("data", {})
+    if not isinstance(data, dict):
+        data = {}
+    target = (
+        data.get("abs_path") or data.get("file") or data.get("target") or
+        data.get("script_path") or data.get("project_path") or data.get("backup_path") or ""
+    )
+    summary = (
+        data.get("summary") or data.get("action") or data.get("status") or
+        data.get("cmd") or data.get("commit_msg") or data.get("stdout_excerpt") or data.get("error") or ""
+    )
+    return [ev.get("ts", ""), ev.get("event_type", ""), target, summary]
+
+# (log path, max rows) -> TailReader, shared by page loads, refreshes and the timer
+_timeline_readers: dict = {}
+
+def read_action_log(log_file="ragis_events.log", max_rows=100):
+    """
+    Last `max_rows` events as a DataFrame. Uses the event store when
+    RAGIS_LOG_BACKEND enables it; otherwise the first call seeks back from
+    EOF and later calls parse only lines appended since (rotation is followed).
+    """
+    pd = lazy_import("pandas")
+    store = configured_event_store()
+    if store is not None:
+        # Indexed store: the newest rows come straight off the ts index.
+        return pd.DataFrame([timeline_row(ev) for ev in store.tail(max_rows)], columns=TIMELINE_COLUMNS)
+    key = (os.path.abspath(log_file), max_rows)
+    reader = _timeline_readers.get(key)
+    if reader is None:
+        reader = _timeline_readers.setdefault(key, TailReader(log_file, max_rows, transform=timeline_row))
+    reader.poll()
+    return pd.DataFrame(reader.snapshot(), columns=TIMELINE_COLUMNS)
+
+# --- App factory ---
+def create_app(config: Optional[Config] = None):
+    """
+    Build the Gradio app. Agent components are still created lazily, on the
+    first chat turn that needs them.
+    """
+    gr = lazy_import("gradio")
+    if config is not None:
+        configure(config)
+
+    def chat_fn(message: str, history: list, request: gr.Request):
+        yield from agent_chat(message, history, request)
+
+    with gr.Blocks() as app:
+        gr.Markdown("# Omni Agent (Pro Mode 🚀)")
+        gr.Markdown(
+            "🔒 PIN unlock required.\n\n"
+            "✅ Approvals conversationally managed (or globally trusted).\n\n"
+            "🛡 Secrets stored in vault only (no plaintext).\n\n"
+            "🧠 Omni Agent now streams outputs, manages tasks, and logs actions live."
+        )
+
+        with gr.Row():
+            with gr.Column(scale=3):
+                chat = gr.ChatInterface(
+                    chat_fn,
+                    title="Omni Agent",
+                    description="Conversational AI Dev/UX/DevOps copilot — powered by LangGraph + Astrid brain.",
+                    type="messages"
                 )
-                summary = (
-                    data.get("summary") or data.get("action") or data.get("status") or
-                    data.get("cmd") or data.get("commit_msg") or data.get("stdout_excerpt") or data.get("error") or ""
+            with gr.Column(scale=1):
+                action_log = gr.Dataframe(
+                    value=read_action_log,
+                    headers=TIMELINE_COLUMNS,
+                    datatype=["str", "str", "str", "str"],
+                    interactive=False,
+                    label="🕰 Action Timeline",
+                    visible=True,
                 )
-                rows.append([ts, action, target, summary])
-            except Exception:
-                continue
-    return pd.DataFrame(rows[-max_rows:], columns=["Timestamp", "Action", "Target", "Summary"])
-
-with gr.Blocks() as app:
-    gr.Markdown("# Omni Agent (Pro Mode 🚀)")
-    gr.Markdown(
-        "🔒 PIN unlock required.\n\n"
-        "✅ Approvals conversationally managed (or globally trusted).\n\n"
-        "🛡 Secrets stored in vault only (no plaintext).\n\n"
-        "🧠 Omni Agent now streams outputs, manages tasks, and logs actions live."
-    )
 
-    with gr.Row():
-        with gr.Column(scale=3):
-            chat = gr.ChatInterface(
-                agent_chat,
-                title="Omni Agent",
-                description="Conversational AI Dev/UX/DevOps copilot — powered by LangGraph + Astrid brain.",
-                type="messages"
-            )
-        with gr.Column(scale=1):
-            action_log = gr.Dataframe(
-                value=read_action_log(),
-                headers=["Timestamp", "Action", "Target", "Summary"],
-                datatype=["str", "str", "str", "str"],
-                interactive=False,
-                label="🕰 Action Timeline",
-                visible=True,
-            )
+                def refresh_log():
+                    return read_action_log()
+
+                refresh_btn = gr.Button("🔄 Refresh Action Log")
+                refresh_btn.click(fn=refresh_log, outputs=action_log)
+                # Live updates: each tick parses only the lines appended since the last one.
+                refresh_s = get_components().config.timeline_refresh
+                if refresh_s > 0:
+                    gr.Timer(refresh_s).tick(fn=refresh_log, outputs=action_log)
+
+    return app
+
+def startup_profile(config: Config):
+    """Build everything eagerly and report import/init time per component."""
+    started = time.perf_counter()
+    create_app(config)
+    components = get_components()
+    for name in ("embed_fn", "llm", "agent", "tools", "memory_store", "memory_retriever",
+                 "turn_pipeline", "context_assembler", "session_store"):
+        getattr(components, name)
+    for module in ("files", "code_exec", "ux_sandbox", "shell", "github_tools", "api_requests",
+                   "doc_gen", "pip_audit", "universal_installer", "search", "restore"):
+        lazy_import(f"agent_tools.{module}")
+    lazy_import("secure_vault")
+    total_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    print("=== Startup profile ===")
+    print("Imports (first import, ms):")
+    for name, ms in sorted(IMPORT_TIMINGS.items(), key=lambda kv: -kv[1]):
+        print(f"  {ms:>9.1f}  {name}")
+    print("Component init (ms, including the first imports each one triggers):")
+    for name, ms in sorted(components.timings.items(), key=lambda kv: -kv[1]):
+        print(f"  {ms:>9.1f}  {name}")
+    print(f"Total: {total_ms} ms")
+    logger.log("startup_profile", {
+        "imports_ms": IMPORT_TIMINGS,
+        "components_ms": components.timings,
+        "total_ms": total_ms,
+    })
 
-            def refresh_log():
-                return read_action_log()
+# --- Main Execution ---
+def main(argv=None):
+    """Main entry point for the Omni Agent"""
+    try:
+        args = parse_args(argv)
+        if args.debug:
+            sys_logger.setLevel(logging.DEBUG)
 
-            refresh_btn = gr.Button("🔄 Refresh Action Log")
-            refresh_btn.click(fn=refresh_log, outputs=action_log)
+        # Load .env first (critical for API keys)
+        lazy_import("dotenv").load_dotenv()
+        check_environment()
+        check_system()
 
-app.launch()
\ No newline at end of file
+        config = Config()
+        config.validate()
+
+        if args.startup_profile:
+            startup_profile(config)
+            return
+
+        if args.test:
+            configure(config)
+            test_embeddings()
+            return
+
+        if args.profile:
+            config.profile_turns = args.profile_turns or 1
+        if args.profile_threshold_ms is not None:
+            config.profile_threshold_ms = args.profile_threshold_ms or None
+        if args.profile_mode:
+            config.profile_mode = args.profile_mode
+        if args.metrics_port is not None:
+            config.metrics_port = args.metrics_port
+        if config.metrics_port:
+            start_metrics_server(config.metrics_port)
+            sys_logger.info(f"Metrics at http://127.0.0.1:{config.metrics_port}/metrics")
+
+        create_app(config).launch()
+    except Exception as e:
+        sys_logger.error(f"Failed to initialize: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()